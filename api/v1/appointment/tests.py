@@ -0,0 +1,340 @@
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+
+from entities.appointment.models import Appointment, ClinicCounter, DoctorCounter, DoctorSlot, Visit
+from entities.person.models import Doctor, DoctorHoliday, DoctorSetting
+from entities.review.models import Review
+from libs.availability import AvailabilityEngine, build_engines, find_earliest_slots
+from libs.booking import book_appointments, expand_recurrence, get_qid
+from libs.counters import get_counter, rebuild_counters, update_status
+from libs.custom_exceptions import DoctorUnavailableException, SlotAlreadyBookedException
+from libs.fixtures import ClinicFixtureMixin
+from libs.slot_inventory import _generate_slots
+
+
+class AvailabilityEngineTest(TestCase):
+    """
+    Slots of the availability engine against the schedule, leaves and appointments.
+    """
+    # a monday
+    DAY = date(2030, 1, 7)
+
+    def make_setting(self, doctor_id=1, clinic_id=1, breaks=""):
+        return DoctorSetting(physician_id=doctor_id, clinic_id=clinic_id, slot_time=30, monday_start=time(9),
+                             monday_end=time(12), breaks=breaks)
+
+    def at(self, hour, minute=0, second=0, days=0):
+        return datetime.combine(self.DAY + timedelta(days=days), time(hour, minute, second))
+
+    def get_free_starts(self, engine, day=None):
+        return [slot['start'] for slot in engine.get_day_slots(day or self.DAY) if slot['available']]
+
+    def test_appointments(self):
+        appointments = [
+            Appointment(doctor_id=1, start_datetime=self.at(9), end_datetime=self.at(9, 29)),
+            # overlaps two slots
+            Appointment(doctor_id=1, start_datetime=self.at(10, 15), end_datetime=self.at(10, 45)),
+        ]
+        engine = AvailabilityEngine(self.make_setting(), [], appointments)
+        self.assertEqual(len(engine.get_day_slots(self.DAY)), 6)
+        self.assertEqual(self.get_free_starts(engine), [self.at(9, 30), self.at(11), self.at(11, 30)])
+        self.assertEqual(engine.get_day_slots(self.DAY + timedelta(days=1)), [])
+
+    def test_leaves(self):
+        holidays = [
+            DoctorHoliday(physician_id=1, start_datetime=self.at(10), end_datetime=self.at(10, 59, 59)),
+            DoctorHoliday(physician_id=1, start_datetime=self.at(0, days=7), end_datetime=self.at(23, 59, 59, days=7)),
+        ]
+        engine = AvailabilityEngine(self.make_setting(), holidays, [])
+        self.assertEqual(self.get_free_starts(engine), [self.at(9), self.at(9, 30), self.at(11), self.at(11, 30)])
+        self.assertEqual(engine.get_day_slots(self.DAY + timedelta(days=7)), [])
+
+        days = engine.get_range_slots(self.DAY, self.DAY + timedelta(days=7))
+        self.assertEqual([len(day['slots']) for day in days], [6, 0, 0, 0, 0, 0, 0, 0])
+
+    def test_breaks(self):
+        engine = AvailabilityEngine(self.make_setting(breaks="0:09:30-10:15"), [], [])
+        self.assertEqual(self.get_free_starts(engine), [self.at(9), self.at(10, 15), self.at(10, 45), self.at(11, 15)])
+
+        # 9:00 to 11:40 fits five whole slots
+        engine = AvailabilityEngine(self.make_setting(), [], [])
+        engine.setting.monday_end = time(11, 40)
+        self.assertEqual(len(engine.get_day_slots(self.DAY)), 5)
+
+    def test_earliest_slots_of_duplicate_settings(self):
+        settings = [self.make_setting(), self.make_setting(), self.make_setting(doctor_id=2)]
+        slots = find_earliest_slots(build_engines(settings, [], []), self.DAY, self.DAY, 4)
+        self.assertEqual([(start, doctor_id) for start, doctor_id, clinic_id, slot in slots],
+                         [(self.at(9), 1), (self.at(9), 2), (self.at(9, 30), 1), (self.at(9, 30), 2)])
+
+        engines = [AvailabilityEngine(setting, [], []) for setting in settings[:2]]
+        slots = find_earliest_slots(engines, self.DAY, self.DAY, 2)
+        self.assertEqual([start for start, doctor_id, clinic_id, slot in slots], [self.at(9), self.at(9)])
+
+
+@mock.patch('entities.notification.models.OneSignalSdk')
+class SlotInventoryTest(ClinicFixtureMixin, TestCase):
+    """
+    Slots of the inventory follow the appointments booked, moved, canceled and deleted.
+    """
+    def setUp(self):
+        super(SlotInventoryTest, self).setUp()
+        self.setting = self.create_setting()
+        self.patient = self.create_patient()
+
+    def create_slots(self, holidays=()):
+        day = self.start.date()
+        slots = _generate_slots(AvailabilityEngine(self.setting, list(holidays), []), day, day)
+        DoctorSlot.objects.bulk_create(slots)
+        return slots
+
+    def get_states(self):
+        return dict(DoctorSlot.objects.filter(start_datetime__range=(self.start, self.start + timedelta(minutes=10))).
+                    values_list('start_datetime', 'state'))
+
+    def test_slots_follow_appointments(self, onesignal):
+        day = self.start.date()
+        self.create_slots([DoctorHoliday(physician=self.doctor, start_datetime=datetime.combine(day, time(16)),
+                                         end_datetime=datetime.combine(day, time(16, 59, 59)))])
+        self.assertEqual(DoctorSlot.objects.count(), 7 * 6)
+        self.assertEqual(DoctorSlot.objects.filter(state=DoctorSlot.State.BOOKED).count(), 6)
+
+        with mock.patch('libs.slot_inventory.SLOT_INVENTORY_ENABLED', True):
+            appointment = self.book_at(self.patient, self.start)
+            self.assertEqual(self.get_states(), {
+                self.start: DoctorSlot.State.BOOKED,
+                self.start + timedelta(minutes=10): DoctorSlot.State.AVAILABLE,
+            })
+
+            appointment.status = Appointment.Status.CANCEL
+            appointment.save()
+            self.assertEqual(set(self.get_states().values()), {DoctorSlot.State.AVAILABLE})
+
+    def test_moved_and_deleted_appointments(self, onesignal):
+        self.create_slots()
+        other = Doctor.objects.create(phone="+920000000009", first_name="Other", rating=0)
+        with mock.patch('libs.slot_inventory.SLOT_INVENTORY_ENABLED', True):
+            appointment = self.book_at(self.patient, self.start)
+            appointment.doctor = other
+            appointment.save()
+            self.assertEqual(set(self.get_states().values()), {DoctorSlot.State.AVAILABLE})
+
+            appointment.doctor = self.doctor
+            appointment.save()
+            self.assertEqual(self.get_states()[self.start], DoctorSlot.State.BOOKED)
+
+            # deleted along with its patient
+            self.patient.delete()
+            self.assertFalse(Appointment.objects.exists())
+            self.assertEqual(set(self.get_states().values()), {DoctorSlot.State.AVAILABLE})
+
+    def test_days_off(self, onesignal):
+        day = self.start.date()
+        holidays = [DoctorHoliday(physician=self.doctor, start_datetime=datetime.combine(day, time()),
+                                  end_datetime=datetime.combine(day, time(23, 59, 59)))]
+        slots = _generate_slots(AvailabilityEngine(self.setting, holidays, []), day, day)
+        self.assertEqual(set(slot.state for slot in slots), {DoctorSlot.State.HOLIDAY})
+
+
+class BookingValidationTest(ClinicFixtureMixin, TestCase):
+    """
+    A booking has to fit in the working hours of the doctor and the slot has to be free.
+    """
+    def setUp(self):
+        super(BookingValidationTest, self).setUp()
+        self.setting = self.create_setting()
+        self.patients = [self.create_patient(), self.create_patient()]
+
+    def test_double_booking(self):
+        self.book_at(self.patients[0], self.start)
+        with self.assertRaises(SlotAlreadyBookedException):
+            self.book_at(self.patients[1], self.start)
+        with self.assertRaises(SlotAlreadyBookedException):
+            self.book_at(self.patients[1], self.start + timedelta(minutes=5))
+        self.book_at(self.patients[1], self.start + timedelta(minutes=10))
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 2)
+
+    def test_working_hours(self):
+        day = datetime.combine(self.start.date(), time())
+        for start, minutes in ((timedelta(hours=12, minutes=55), 10), (timedelta(hours=16, minutes=55), 10),
+                               (timedelta(hours=13, minutes=30), 10), (timedelta(hours=8, minutes=55), 10),
+                               (timedelta(hours=9), 8 * 60 + 10)):
+            with self.assertRaises(DoctorUnavailableException):
+                self.book_at(self.patients[1], day + start, minutes)
+
+        self.book_at(self.patients[0], day + timedelta(hours=12, minutes=50))
+        self.book_at(self.patients[0], day + timedelta(hours=16, minutes=50))
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class BookingConcurrencyTest(ClinicFixtureMixin, TransactionTestCase):
+    """
+    Fire parallel bookings at one slot, exactly one of them has to win.
+
+    Needs a database with row locks, i.e. postgres.
+    """
+    BOOKINGS = 10
+
+    def setUp(self):
+        super(BookingConcurrencyTest, self).setUp()
+        self.setting = self.create_setting()
+        self.patients = [self.create_patient() for index in range(self.BOOKINGS)]
+
+    def book(self, patient, barrier, results):
+        try:
+            barrier.wait()
+            self.book_at(patient, self.start)
+            results.append("booked")
+        except SlotAlreadyBookedException:
+            results.append("rejected")
+        except Exception as e:
+            results.append(e)
+        finally:
+            connection.close()
+
+    def test_one_winner_per_slot(self):
+        barrier = threading.Barrier(self.BOOKINGS)
+        results = []
+        threads = [
+            threading.Thread(target=self.book, args=(patient, barrier, results))
+            for patient in self.patients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count("booked"), 1, results)
+        self.assertEqual(results.count("rejected"), self.BOOKINGS - 1, results)
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor, start_datetime=self.start).count(), 1)
+
+
+class RecurringBookingTest(ClinicFixtureMixin, TestCase):
+    """
+    A series of appointments is expanded from a recurrence and booked all or none.
+    """
+    def setUp(self):
+        super(RecurringBookingTest, self).setUp()
+        self.setting = self.create_setting()
+        self.patients = [self.create_patient(), self.create_patient()]
+
+    def get_fields(self):
+        return {'patient': self.patients[0], 'doctor': self.doctor, 'clinic': self.clinic, 'reason': self.reason,
+                'status': Appointment.Status.PENDING}
+
+    def test_expand_recurrence(self):
+        end = self.start + timedelta(minutes=10, seconds=-1)
+        windows = expand_recurrence(self.start, end, 7, count=3)
+        self.assertEqual([start for start, end in windows],
+                         [self.start, self.start + timedelta(days=7), self.start + timedelta(days=14)])
+        self.assertEqual(len(expand_recurrence(self.start, end, 1, until=self.start.date() + timedelta(days=4))), 5)
+        self.assertEqual(len(expand_recurrence(self.start, end, 1, count=10, limit=4)), 5)
+
+    def test_all_or_none(self):
+        windows = expand_recurrence(self.start, self.start + timedelta(minutes=10, seconds=-1), 7, count=3)
+        self.book_at(self.patients[1], windows[2][0])
+        with self.assertRaises(SlotAlreadyBookedException):
+            book_appointments(windows, **self.get_fields())
+        self.assertEqual(Appointment.objects.count(), 1)
+
+        appointments = book_appointments(windows[:2], **self.get_fields())
+        self.assertEqual([appointment.start_datetime for appointment in appointments], [windows[0][0], windows[1][0]])
+        self.assertEqual([appointment.qid for appointment in appointments], [
+            get_qid(self.patients[0].id, self.doctor.id, appointment.id) for appointment in appointments
+        ])
+
+    def test_overlapping_windows(self):
+        windows = [(self.start, self.start + timedelta(minutes=20)),
+                   (self.start + timedelta(minutes=10), self.start + timedelta(minutes=30))]
+        with self.assertRaises(SlotAlreadyBookedException):
+            book_appointments(windows, **self.get_fields())
+        self.assertFalse(Appointment.objects.exists())
+
+
+@mock.patch('entities.notification.models.OneSignalSdk')
+class ActivityCounterTest(ClinicFixtureMixin, TestCase):
+    """
+    Counters follow status changes, deletions and reviews, and match a rebuild.
+    """
+    def setUp(self):
+        super(ActivityCounterTest, self).setUp()
+        self.setting = self.create_setting()
+        self.patients = [self.create_patient(), self.create_patient()]
+
+    def get_counts(self):
+        counter = get_counter(DoctorCounter, self.doctor.id)
+        clinic_counter = get_counter(ClinicCounter, self.clinic.id)
+        counts = (counter.pending_count, counter.done_count, counter.cancel_count)
+        # the reviews are of the doctor only
+        self.assertEqual(counts, (clinic_counter.pending_count, clinic_counter.done_count,
+                                  clinic_counter.cancel_count))
+        return counts + (counter.review_count, counter.rating_sum)
+
+    def assert_counts(self, counts):
+        self.assertEqual(self.get_counts(), counts)
+        rebuild_counters()
+        self.assertEqual(self.get_counts(), counts)
+
+    def test_status_changes(self, onesignal):
+        appointment = self.book_at(self.patients[0], self.start)
+        other = self.book_at(self.patients[1], self.start + timedelta(minutes=10))
+        self.assert_counts((2, 0, 0, 0, 0))
+
+        appointment.status = Appointment.Status.DONE
+        appointment.save()
+        self.assert_counts((1, 1, 0, 0, 0))
+
+        self.assertEqual(update_status(Appointment.objects.filter(pk=other.pk), Appointment.Status.CANCEL), 1)
+        self.assertEqual(update_status(Appointment.objects.filter(pk=other.pk), Appointment.Status.CANCEL), 0)
+        self.assert_counts((0, 1, 1, 0, 0))
+
+        Appointment.objects.get(pk=other.pk).delete()
+        self.assert_counts((0, 1, 0, 0, 0))
+
+    def test_reviews(self, onesignal):
+        review = Review.objects.create(creator=self.patients[0], doctor=self.doctor, rating=4,
+                                       type=Review.Type.DOCTOR)
+        Review.objects.create(creator=self.patients[1], doctor=self.doctor, rating=2, type=Review.Type.DOCTOR)
+        self.assert_counts((0, 0, 0, 2, 6))
+
+        review.rating = 5
+        review.save()
+        self.assert_counts((0, 0, 0, 2, 7))
+        self.assertEqual(get_counter(DoctorCounter, self.doctor.id).rating, Decimal('3.5'))
+
+        review.delete()
+        self.assert_counts((0, 0, 0, 1, 2))
+
+
+class IdentityMapTest(ClinicFixtureMixin, TestCase):
+    """
+    Objects the permissions loaded are served to the view, each fetched once per request.
+    """
+    def setUp(self):
+        super(IdentityMapTest, self).setUp()
+        self.create_appointments(2, Appointment.Status.PENDING)
+        self.appointment, self.other = Appointment.objects.order_by('id')
+        self.visit = Visit.objects.get(appointment=self.appointment)
+
+    def get_visit(self, appointment_id, visit_id):
+        url = "/api/v1/appointment/{}/visit/{}".format(appointment_id, visit_id)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [query['sql'] for query in queries]
+
+    def test_visit(self):
+        response, queries = self.get_visit(self.appointment.id, self.visit.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.visit.id)
+        self.assertEqual(len([sql for sql in queries if 'FROM "appointment_appointment"' in sql]), 1)
+        self.assertEqual(len([sql for sql in queries if 'FROM "appointment_visit"' in sql]), 1)
+
+    def test_visit_of_other_appointment(self):
+        response, queries = self.get_visit(self.other.id, self.visit.id)
+        self.assertEqual(response.status_code, 403)
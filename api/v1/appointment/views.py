@@ -1,24 +1,24 @@
 from django.contrib.auth import get_user_model
+from rest_framework import status
 from rest_framework.generics import ListCreateAPIView, CreateAPIView, RetrieveUpdateAPIView
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from entities.appointment.models import Appointment, Visit
-from entities.person.models import DoctorHoliday
 from libs.authentication import UserAuthentication
-from libs.custom_exceptions import DoctorUnavailableException
-from libs.mixins import AtomicMixin
+from libs.mixins import AtomicMixin, CompactListMixin, IdentityMapMixin, QueryPlanMixin
 from libs.permission import (
     PatientDoctorPermission,
     DoctorPermission,
     PKAppointmentOwnerPermission,
     AppointmentOwnerPermission, AppointmentVisitPermission)
-from api.v1.serializers import AppointmentSerializer, VisitSerializer
-from libs.utils import get_start_datetime_from_date_string, get_datetime_by_datetime_string, \
-    get_datetime_by_datetime_string_with_tz
+from api.v1.serializers import AppointmentSerializer, AppointmentBatchSerializer, VisitSerializer
+from libs.utils import get_start_datetime_from_date_string
 
 User = get_user_model()
 
 
-class AppointmentView(ListCreateAPIView):
+class AppointmentView(CompactListMixin, ListCreateAPIView):
     """
     View for creating appointment and listing all.
 
@@ -31,13 +31,6 @@ class AppointmentView(ListCreateAPIView):
     permission_classes = (PatientDoctorPermission,)
     serializer_class = AppointmentSerializer
 
-    def post(self, request, *args, **kwargs):
-        data = request.data.copy()
-        day = get_datetime_by_datetime_string_with_tz(data['start_datetime'])
-        if DoctorHoliday.objects.filter(physician_id=data['doctor'], day=day.date()).exists():
-            raise DoctorUnavailableException()
-        return super(AppointmentView, self).post(request, *args, **kwargs)
-
     def get_queryset(self):
         start_date = self.request.query_params.get('start_date', None)
         if start_date:
@@ -46,7 +39,33 @@ class AppointmentView(ListCreateAPIView):
         return Appointment.objects.all().order_by('start_datetime')
 
 
-class AppointmentDetailView(RetrieveUpdateAPIView):
+class AppointmentBatchView(APIView):
+    """
+    View for booking a series of appointments at once, all of them are booked or none.
+
+    **Example requests**:
+        POST /appointment/batch/
+        {"patient": 1, "doctor": 2, "clinic": 3, "reason": 1,
+         "start_datetime": "2017-10-02T10:00:00", "end_datetime": "2017-10-02T10:29:59",
+         "recurrence": {"frequency": "weekly", "interval": 1, "count": 6}}
+
+        POST /appointment/batch/
+        {"patient": 1, "doctor": 2, "clinic": 3, "reason": 1,
+         "slots": [{"start_datetime": "2017-10-02T10:00:00", "end_datetime": "2017-10-02T10:29:59"}, ...]}
+    """
+
+    authentication_classes = (UserAuthentication,)
+    permission_classes = (PatientDoctorPermission,)
+
+    def post(self, request):
+        serializer = AppointmentBatchSerializer(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        appointments = serializer.save()
+        data = AppointmentSerializer(appointments, many=True, context={"request": request}).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class AppointmentDetailView(QueryPlanMixin, RetrieveUpdateAPIView):
     """
     View for getting and updating appointment.
 
@@ -74,7 +93,7 @@ class AppointmentVisitView(AtomicMixin, CreateAPIView):
     serializer_class = VisitSerializer
 
 
-class AppointmentVisitUpdateView(AtomicMixin, RetrieveUpdateAPIView):
+class AppointmentVisitUpdateView(AtomicMixin, IdentityMapMixin, RetrieveUpdateAPIView):
     """
     View for updating visit against appointment.
 
@@ -86,3 +105,7 @@ class AppointmentVisitUpdateView(AtomicMixin, RetrieveUpdateAPIView):
     permission_classes = (DoctorPermission, AppointmentOwnerPermission, AppointmentVisitPermission)
     serializer_class = VisitSerializer
     queryset = Visit.objects.all()
+    select_related_objects = {
+        Appointment: ('doctor', 'patient', 'clinic', 'reason'),
+        Visit: ('doctor', 'patient', 'clinic'),
+    }
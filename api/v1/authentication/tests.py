@@ -0,0 +1,79 @@
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
+
+from entities.person.models import Doctor, User
+from libs.authentication import principal_cache
+from libs.fixtures import ClinicFixtureMixin
+from libs.jwt_helper import JWTHelper
+from libs.revocation import BloomFilter
+from libs.roles import get_principal
+
+
+class TokenCacheTest(ClinicFixtureMixin, TransactionTestCase):
+    """
+    Users of tokens are cached until the user is saved or deleted and that is committed.
+    """
+    def test_saved_users(self):
+        patient = self.create_patient()
+        token = JWTHelper.encode_token(patient)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer {}".format(token))
+        self.assertEqual(client.get('/api/v1/notification/').status_code, 200)
+        self.assertIsNotNone(principal_cache.get(token))
+
+        patient.first_name = "Renamed"
+        patient.save()
+        self.assertIsNone(principal_cache.get(token))
+        self.assertEqual(client.get('/api/v1/notification/').status_code, 200)
+        self.assertIsNotNone(principal_cache.get(token))
+
+        patient.is_active = False
+        patient.save()
+        self.assertIsNone(principal_cache.get(token))
+        self.assertEqual(client.get('/api/v1/notification/').status_code, 403)
+
+
+class RoleResolutionTest(ClinicFixtureMixin, TestCase):
+    """
+    Roles are read from User.role and the typed user is loaded once per request.
+    """
+    def test_role_checks(self):
+        user = User.objects.get(pk=self.doctor.pk)
+        request = APIRequestFactory().get('/')
+        request.user = user
+        with self.assertNumQueries(1):
+            self.assertTrue(user.is_doctor())
+            self.assertFalse(user.is_patient() or user.is_admin())
+            self.assertEqual(get_principal(request), self.doctor)
+            self.assertIs(get_principal(request), request.principal)
+        self.assertIsInstance(request.principal, Doctor)
+
+
+class LogoutRevocationTest(ClinicFixtureMixin, TransactionTestCase):
+    """
+    Logout revokes the token of the request only, checked without a query until revoked.
+    """
+    def setUp(self):
+        super(LogoutRevocationTest, self).setUp()
+        self.patient = self.create_patient()
+
+    def test_logout(self):
+        client, other_client = self.get_client(self.patient), self.get_client(self.patient)
+        self.assertEqual(client.get('/api/v1/notification/').status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            client.get('/api/v1/notification/')
+        self.assertFalse([query for query in queries if 'revokedtoken' in query['sql']])
+
+        self.assertEqual(client.post('/api/v1/auth/logout/').status_code, 200)
+        self.assertEqual(client.get('/api/v1/notification/').status_code, 403)
+        self.assertEqual(other_client.get('/api/v1/notification/').status_code, 200)
+
+    def test_bloom_filter(self):
+        bloom_filter = BloomFilter(100, 0.01)
+        values = [str(index) for index in range(100)]
+        for value in values:
+            bloom_filter.add(value)
+        self.assertTrue(all(value in bloom_filter for value in values))
+        self.assertLess(sum(str(index) in bloom_filter for index in range(100, 1100)), 50)
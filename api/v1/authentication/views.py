@@ -17,9 +17,12 @@ from libs.custom_exceptions import (
     VerificationException
 )
 from libs.error_reports import send_manually_error_email
+from libs.jwt_helper import JWTHelper
 from libs.onesignal_sdk import OneSignalSdk
 from libs.twilio_helper import TwilioHelper
 from libs.permission import PatientPermission
+from libs.revocation import revoke_token
+from libs.roles import get_role_instance
 
 User = get_user_model()
 
@@ -81,10 +84,10 @@ class LoginView(APIView):
         if user:
             if user.verified:
                 user.update_device_information(device_id, device_type)
-                if hasattr(user, 'doctor'):
-                    serializer = DoctorTokenSerializer(user.doctor, context={"request": request})
-                elif hasattr(user, 'patient'):
-                    serializer = PatientTokenSerializer(user.patient, context={"request": request})
+                if user.is_doctor():
+                    serializer = DoctorTokenSerializer(get_role_instance(user), context={"request": request})
+                elif user.is_patient():
+                    serializer = PatientTokenSerializer(get_role_instance(user), context={"request": request})
                 else:
                     raise UserNotAllowedException()
                 return Response(serializer.data, status=status.HTTP_200_OK)
@@ -96,7 +99,7 @@ class LoginView(APIView):
 
 class LogoutView(APIView):
     """
-    View for logout a user to your system.
+    View for logout a user to your system, the token of the request is revoked.
 
     **Example requests**:
 
@@ -109,6 +112,10 @@ class LogoutView(APIView):
         user = request.user
         user.device_id = None
         user.save()
+
+        claims, message = JWTHelper.read_token(request.auth)
+        if claims is not None:
+            revoke_token(request.auth, claims, user.id)
         return Response({}, status=status.HTTP_200_OK)
 
 
@@ -207,6 +214,7 @@ class ChangePasswordView(APIView):
                     if user.verification_code.code == code:
                         user.set_password(password)
                         user.save()
+                        user.revoke_tokens()
                         return Response({}, status=status.HTTP_200_OK)
                     raise InvalidVerificationCodeException()
             raise VerificationException()
@@ -0,0 +1,46 @@
+from django.test import TestCase, TransactionTestCase
+
+from entities.person.models import Patient
+from libs.clinic_membership import get_clinic_ids
+from libs.fixtures import ClinicFixtureMixin
+
+
+class ClinicScheduleAccessTest(ClinicFixtureMixin, TestCase):
+    """
+    The schedule of a clinic is only shown to its doctors and patients.
+    """
+    def setUp(self):
+        super(ClinicScheduleAccessTest, self).setUp()
+        self.patient = Patient.objects.create(phone="+920000000001", first_name="Patient")
+        self.url = "/api/v1/clinic/{}/schedule".format(self.clinic.id)
+
+    def get_schedule(self, user):
+        return self.get_client(user).get(self.url, {'date': '2030-01-07'})
+
+    def test_members_only(self):
+        self.assertEqual(self.get_schedule(self.doctor).status_code, 200)
+        self.assertEqual(self.get_schedule(self.patient).status_code, 403)
+
+        self.patient.clinic.add(self.clinic)
+        self.assertEqual(self.get_schedule(self.patient).status_code, 200)
+
+
+class ClinicMembershipTest(ClinicFixtureMixin, TransactionTestCase):
+    """
+    Access through the membership index follows the clinics of users once committed.
+    """
+    def test_removed_members(self):
+        patient = self.create_patient()
+        url = "/api/v1/clinic/{}/schedule".format(self.clinic.id)
+        client = self.get_client(patient)
+        self.assertEqual(client.get(url, {'date': '2030-01-07'}).status_code, 200)
+        self.assertEqual(get_clinic_ids(patient.id), {self.clinic.id})
+
+        patient.clinic.remove(self.clinic)
+        self.assertEqual(get_clinic_ids(patient.id), set())
+        self.assertEqual(client.get(url, {'date': '2030-01-07'}).status_code, 403)
+
+        self.clinic.user.add(patient)
+        self.assertEqual(client.get(url, {'date': '2030-01-07'}).status_code, 200)
+        self.clinic.user.clear()
+        self.assertEqual(client.get(url, {'date': '2030-01-07'}).status_code, 403)
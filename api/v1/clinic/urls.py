@@ -5,4 +5,5 @@ urlpatterns = [
     url(r'^(?P<pk>[\d]+)$', views.ClinicView.as_view()),
     url(r'^(?P<pk>[\d]+)/test/$', views.TestView.as_view()),
     url(r'^(?P<pk>[\d]+)/review/$', views.ClinicReviewView.as_view()),
+    url(r'^(?P<pk>[\d]+)/schedule$', views.ClinicScheduleView.as_view()),
 ]
@@ -1,14 +1,24 @@
+from rest_framework import status
 from rest_framework.generics import RetrieveAPIView, ListAPIView
-from entities.clinic.models import Clinic
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from entities.appointment.models import Appointment
+from entities.clinic.models import City, Country, Clinic
+from entities.person.models import DoctorSetting
 from entities.test_menu.models import Test
 from libs.authentication import UserAuthentication
-from api.v1.serializers import ClinicSerializer, TestSerializer, ReviewSerializer
-from libs.custom_exceptions import ClinicDoesNotExistsException
-from libs.permission import PatientDoctorPermission
-from libs.utils import get_start_datetime_from_date_string, get_end_datetime_from_date_string
-
-
-class ClinicView(RetrieveAPIView):
+from libs.day_grid import DayGrid
+from libs.leave import build_leave_indexes, get_leaves, get_day_bounds
+from api.v1.serializers import ClinicSerializer, TestSerializer, ReviewSerializer, BasicDoctorSerializer
+from libs.custom_exceptions import ClinicDoesNotExistsException, InvalidInputDataException
+from libs.mixins import ConditionalGetMixin, FastListMixin, QueryPlanMixin
+from libs.pagination import KeysetPagination
+from libs.permission import ClinicMemberPermission, PatientDoctorPermission
+from libs.utils import get_start_datetime_from_date_string, get_end_datetime_from_date_string, \
+    get_date_from_date_string
+
+
+class ClinicView(ConditionalGetMixin, QueryPlanMixin, RetrieveAPIView):
     """
     View for getting Clinic.
 
@@ -20,9 +30,10 @@ class ClinicView(RetrieveAPIView):
     authentication_classes = (UserAuthentication,)
     serializer_class = ClinicSerializer
     queryset = Clinic.objects.all()
+    version_models = (City, Country, Clinic)
 
 
-class TestView(ListAPIView):
+class TestView(QueryPlanMixin, ListAPIView):
     """
     View for listing clinic's tests.
 
@@ -38,7 +49,7 @@ class TestView(ListAPIView):
         return Test.objects.filter(is_active=True, clinic_id=self.kwargs['pk']).order_by('id')
 
 
-class ClinicReviewView(ListAPIView):
+class ClinicReviewView(FastListMixin, ListAPIView):
     """
     View for getting clinic reviews
 
@@ -54,6 +65,8 @@ class ClinicReviewView(ListAPIView):
 
     authentication_classes = (UserAuthentication,)
     serializer_class = ReviewSerializer
+    pagination_class = KeysetPagination
+    ordering = ('created_at', 'id')
 
     def get_queryset(self):
         try:
@@ -76,5 +89,53 @@ class ClinicReviewView(ListAPIView):
             raise ClinicDoesNotExistsException()
 
 
+class ClinicScheduleView(APIView):
+    """
+    View for getting slots of all the clinic's doctors for a day
+
+    **Example requests**:
+
+        GET /clinic/{id}/schedule?date=2017-06-18
+
+    Only the doctors and patients of the clinic can see it.
+    """
+
+    authentication_classes = (UserAuthentication,)
+    permission_classes = (ClinicMemberPermission,)
 
+    def get(self, request, pk):
+        if not Clinic.objects.filter(pk=pk).exists():
+            raise ClinicDoesNotExistsException()
 
+        try:
+            day = get_date_from_date_string(request.query_params['date'])
+        except (KeyError, ValueError):
+            raise InvalidInputDataException()
+
+        settings = list(DoctorSetting.objects.filter(clinic_id=pk).select_related(
+            'physician', 'physician__specialization').order_by('physician__first_name', 'physician_id'))
+        doctor_ids = [setting.physician_id for setting in settings]
+
+        appointments = list(Appointment.objects.filter(
+            doctor_id__in=doctor_ids,
+            start_datetime__lte=get_end_datetime_from_date_string(str(day)),
+            end_datetime__gte=get_start_datetime_from_date_string(str(day)),
+        ).exclude(status=Appointment.Status.CANCEL).values_list('doctor_id', 'start_datetime', 'end_datetime'))
+
+        # doctors off the whole day have no slots, partial leaves occupy slots like appointments
+        holidays = []
+        for doctor_id, leaves in build_leave_indexes(get_leaves(doctor_ids, day, day)).items():
+            if leaves.is_day_off(day):
+                holidays.append(doctor_id)
+            else:
+                appointments.extend((doctor_id, start, end) for start, end in leaves.get_intervals(*get_day_bounds(day)))
+
+        doctor_slots = DayGrid(day, settings, holidays, appointments).get_doctor_slots()
+        data = {
+            "date": day,
+            "doctors": [{
+                "doctor": BasicDoctorSerializer(setting.physician, context={"request": request}).data,
+                "slots": doctor_slots[setting.physician_id],
+            } for setting in settings],
+        }
+        return Response(data, status=status.HTTP_200_OK)
@@ -0,0 +1,176 @@
+from datetime import date, datetime, time, timedelta
+
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from entities.appointment.models import Appointment
+from entities.person.models import DoctorSetting
+from libs import query_plan
+from libs.availability_cache import AVAILABILITY_CACHE_ALIAS, get_cached_days, invalidate_windows, set_cached_days
+from libs.fixtures import ClinicFixtureMixin
+
+
+class AppointmentSlotRangeTest(ClinicFixtureMixin, TestCase):
+    """
+    Dates of the slot endpoint are validated before any slot is computed.
+    """
+    def setUp(self):
+        super(AppointmentSlotRangeTest, self).setUp()
+        self.client = self.get_client(self.create_patient())
+        self.url = "/api/v1/doctor/{}/clinic/{}/appointment_slots/".format(self.doctor.id, self.clinic.id)
+
+    def test_invalid_ranges(self):
+        day = date(2030, 1, 7)
+        for start_date, end_date in ((day, day - timedelta(days=1)), (day, day + timedelta(days=62)), ('x', day)):
+            response = self.client.get(self.url, {'start_date': str(start_date), 'end_date': str(end_date)})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start_date': str(day)}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date': 'x'}).status_code, 400)
+
+
+class DoctorAvailableSlotTest(ClinicFixtureMixin, TestCase):
+    """
+    Filters of the earliest slot search are validated as input.
+    """
+    def test_invalid_filters(self):
+        self.client = self.get_client(self.create_patient())
+        for params in ({'services_ids': '1,x'}, {'clinic_id': 'x'}, {'limit': 'x'}, {'start_date': 'x'}):
+            self.assertEqual(self.client.get('/api/v1/doctor/available_slots/', params).status_code, 400, params)
+
+
+class AvailabilityCacheTest(ClinicFixtureMixin, TransactionTestCase):
+    """
+    Cached slots are dropped by the changes of the doctor's days and settings only, once
+    committed.
+    """
+    def setUp(self):
+        super(AvailabilityCacheTest, self).setUp()
+        caches[AVAILABILITY_CACHE_ALIAS].clear()
+        self.day = date(2030, 1, 7)
+        self.days = [self.day, self.day + timedelta(days=1)]
+
+    def cache_days(self):
+        cached, entry_keys = get_cached_days(self.doctor.id, self.clinic.id, self.days)
+        set_cached_days(entry_keys, {day: [str(day)] for day in self.days if day not in cached})
+
+    def get_cached(self):
+        return sorted(get_cached_days(self.doctor.id, self.clinic.id, self.days)[0])
+
+    def test_invalidation(self):
+        self.cache_days()
+        self.assertEqual(self.get_cached(), self.days)
+        self.assertEqual(get_cached_days(self.doctor.id, self.clinic.id + 1, self.days)[0], {})
+
+        start = datetime.combine(self.day, time(9))
+        appointment = Appointment.objects.create(qid="1", patient=self.create_patient(), doctor=self.doctor,
+                                                 clinic=self.clinic, reason=self.reason, start_datetime=start,
+                                                 end_datetime=start + timedelta(minutes=10))
+        self.assertEqual(self.get_cached(), self.days[1:])
+
+        self.cache_days()
+        appointment.patient.delete()
+        self.assertEqual(self.get_cached(), self.days[1:])
+
+        self.cache_days()
+        invalidate_windows(self.doctor.id, [(start + timedelta(days=1), start + timedelta(days=1, hours=1))])
+        self.assertEqual(self.get_cached(), self.days[:1])
+
+        self.cache_days()
+        DoctorSetting.objects.create(physician=self.doctor, clinic=self.clinic)
+        self.assertEqual(self.get_cached(), [])
+
+    def test_bumped_on_commit(self):
+        self.cache_days()
+        start = datetime.combine(self.day, time(9))
+        with transaction.atomic():
+            invalidate_windows(self.doctor.id, [(start, start)])
+            self.assertEqual(self.get_cached(), self.days)
+        self.assertEqual(self.get_cached(), self.days[1:])
+
+
+class DoctorAppointmentQueryCountTest(ClinicFixtureMixin, TestCase):
+    """
+    Appointment lists have to be served in a constant number of queries whatever the
+    page size.
+    """
+    MAX_QUERIES = 15
+
+    def count_queries(self, url):
+        # caches are filled by the first request, measure with warm caches
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['results']
+
+    def assert_constant_queries(self, url, status=Appointment.Status.DONE):
+        self.create_appointments(2, status)
+        few_queries, results = self.count_queries(url)
+        self.assertEqual(len(results), 2)
+
+        self.create_appointments(18, status)
+        many_queries, results = self.count_queries(url)
+        self.assertEqual(len(results), 20)
+
+        self.assertEqual(few_queries, many_queries)
+        self.assertLessEqual(many_queries, self.MAX_QUERIES)
+        return results
+
+    def test_appointment_list(self):
+        results = self.assert_constant_queries("/api/v1/doctor/{}/appointment/".format(self.doctor.id))
+        self.assertEqual(results[0]['doctor']['patients_seen'], 20)
+        self.assertEqual(len(results[0]['doctor']['services']), 2)
+        self.assertEqual(results[0]['patient']['occupation']['name'], "Job 0")
+
+        # the user of the token isn't loaded, the list is filtered by its id
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/v1/doctor/{}/appointment/".format(self.doctor.id))
+        self.assertFalse([query for query in queries if '"person_user"."password"' in query['sql']
+                          and 'FROM "appointment_appointment"' not in query['sql']])
+
+    def test_visit_list(self):
+        results = self.assert_constant_queries("/api/v1/doctor/{}/visit/".format(self.doctor.id),
+                                               Appointment.Status.PENDING)
+        self.assertEqual(results[0]['appointment']['reason']['name'], "Checkup")
+
+    def test_sparse_fields(self):
+        self.create_appointments(5, Appointment.Status.DONE)
+        url = "/api/v1/doctor/{}/appointment/".format(self.doctor.id)
+        full_queries, full_results = self.count_queries(url)
+        queries, results = self.count_queries(url + "?fields=id,start_datetime,status,doctor.first_name")
+
+        self.assertLess(queries, full_queries)
+        self.assertEqual(results[0], {
+            "id": full_results[0]['id'],
+            "start_datetime": full_results[0]['start_datetime'],
+            "status": Appointment.Status.DONE,
+            "doctor": {"first_name": "Doc"},
+        })
+
+        queries, results = self.count_queries(url + "?fields=id,patient&expand=doctor")
+        self.assertEqual(results[0]['patient'], full_results[0]['patient']['id'])
+        self.assertEqual(results[0]['doctor'], full_results[0]['doctor'])
+
+    def test_shaped_plans_bounded(self):
+        query_plan._shaped_plans.clear()
+        url = "/api/v1/doctor/{}/appointment/".format(self.doctor.id)
+        for index in range(query_plan.QUERY_PLAN_CACHE_SIZE + 10):
+            self.client.get(url + "?fields=id,unknown{}".format(index))
+        self.assertEqual(len(query_plan._shaped_plans), query_plan.QUERY_PLAN_CACHE_SIZE)
+
+    def test_compact_list(self):
+        self.create_appointments(4, Appointment.Status.DONE)
+        url = "/api/v1/doctor/{}/appointment/".format(self.doctor.id)
+        full_results = self.client.get(url).data['results']
+        response = self.client.get(url + "?compact=true")
+
+        self.assertEqual(response.status_code, 200)
+        included = response.data['included']
+        self.assertEqual(len(included['doctor']), 1)
+        self.assertEqual(len(included['patient']), 4)
+        for full, compact in zip(full_results, response.data['results']):
+            self.assertEqual(set(full), set(compact))
+            for name in ('doctor', 'patient', 'clinic', 'reason'):
+                self.assertEqual(included[name][str(compact[name])], full[name])
@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     url(r'^(?P<pk>[\d]+)$', views.DoctorView.as_view()),
     url(r'^$', views.DoctorListView.as_view()),
+    url(r'^available_slots/$', views.DoctorAvailableSlotView.as_view()),
     url(r'^(?P<pk>[\d]+)/clinic/$', views.DoctorClinicView.as_view()),
     url(r'^(?P<pk>[\d]+)/patients/$', views.DoctorPatientListView.as_view()),
     url(r'^(?P<pk>[\d]+)/appointment/$', views.DoctorAppointmentView.as_view()),
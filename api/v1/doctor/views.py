@@ -8,9 +8,20 @@ from django.db.models import Q
 from datetime import datetime, timedelta
 
 from entities.notification.models import Notification
-from entities.appointment.models import Appointment, Visit
-from entities.person.models import Doctor, Patient, DoctorHoliday
+from entities.appointment.models import Appointment, Visit, DoctorCounter
+from entities.clinic.models import City, Country, Clinic
+from entities.person.models import Doctor, Patient, DoctorSetting
+from entities.resources.models import Service, Specialization
+from libs.availability import AvailabilityEngine, build_engines, find_earliest_slots
+from libs.availability_cache import get_cached_days, set_cached_days
+from libs.leave import get_leaves
+from libs.slot_inventory import SLOT_INVENTORY_ENABLED, is_within_horizon, get_inventory_slots
 from libs.authentication import UserAuthentication
+from libs.clinic_membership import get_clinic_ids
+from libs.identity_map import get_request_object
+from libs.mixins import CompactListMixin, ConditionalGetMixin, FastListMixin, QueryPlanMixin
+from libs.pagination import KeysetPagination
+from libs.table_versions import row_key
 from libs.custom_exceptions import InvalidInputDataException, InvalidAppointmentStatusException, \
     DoctorDoesNotExistsException, InvalidDateTimeException
 from libs.permission import (
@@ -20,15 +31,15 @@ from libs.permission import (
     PatientBelongsDoctorPermission,
 )
 from libs.utils import str2bool, get_datetime_from_date_string, get_date_from_date_string, \
-    get_datetime_range_from_date_string, get_interval_between_time, get_start_datetime_from_date_string, \
+    get_start_datetime_from_date_string, \
     get_end_datetime_from_date_string, get_datetime_now_by_date
 from api.v1.serializers import DoctorSerializer, ClinicSerializer, AppointmentSerializer, VisitSerializer, \
-    ReviewSerializer, PatientSerializer
+    ReviewSerializer, PatientSerializer, BasicDoctorSerializer
 
 User = get_user_model()
 
 
-class DoctorView(RetrieveUpdateAPIView):
+class DoctorView(ConditionalGetMixin, QueryPlanMixin, RetrieveUpdateAPIView):
     """
     View for creating and getting doctor.
 
@@ -42,9 +53,42 @@ class DoctorView(RetrieveUpdateAPIView):
     permission_classes = (DoctorOwnerPermission,)
     serializer_class = DoctorSerializer
     queryset = Doctor.objects.all()
+    version_models = (City, Country, Clinic, Service, Specialization, DoctorCounter)
 
+    def get_version_keys(self):
+        keys = super(DoctorView, self).get_version_keys()
+        return keys + [row_key(User, self.kwargs['pk']), row_key(DoctorCounter, self.kwargs['pk'])]
 
-class DoctorListView(ListAPIView):
+
+def filter_doctors(doctors, query_params):
+    """
+    Apply doctor filters of the query params on the queryset.
+    """
+    if 'clinic_id' in query_params:
+        doctors = doctors.filter(clinic=query_params.get('clinic_id', None))
+
+    if 'country_id' in query_params:
+        doctors = doctors.filter(country_id=query_params.get('country_id'))
+
+    if 'city_id' in query_params:
+        doctors = doctors.filter(city_id=query_params.get('city_id'))
+
+    if 'specialization_id' in query_params:
+        doctors = doctors.filter(specialization_id=query_params.get('specialization_id'))
+
+    if 'services_ids' in query_params:
+        service_ids = [int(id) for id in query_params.get('services_ids').split(',')]
+        doctors = doctors.filter(services__in=service_ids)
+
+    if 'query' in query_params:
+        doctors = doctors.filter(Q(first_name__icontains=query_params.get('query')) | Q(last_name__icontains=query_params.get('query')))
+
+    doctors = doctors.filter(is_active=str2bool(query_params.get('active', 'true')))
+
+    return doctors
+
+
+class DoctorListView(QueryPlanMixin, ListAPIView):
     """
     View for getting all doctors.
 
@@ -67,33 +111,76 @@ class DoctorListView(ListAPIView):
     queryset = Doctor.objects.all().order_by('id')
 
     def get_queryset(self):
-        doctors = Doctor.objects.all().order_by('id')
+        return filter_doctors(Doctor.objects.all().order_by('id'), self.request.query_params)
 
-        if 'clinic_id' in self.request.query_params:
-            doctors = doctors.filter(clinic=self.request.query_params.get('clinic_id', None))
-
-        if 'country_id' in self.request.query_params:
-            doctors = doctors.filter(country_id=self.request.query_params.get('country_id'))
 
-        if 'city_id' in self.request.query_params:
-            doctors = doctors.filter(city_id=self.request.query_params.get('city_id'))
+class DoctorAvailableSlotView(APIView):
+    """
+    View for getting the earliest available slots across doctors
 
-        if 'specialization_id' in self.request.query_params:
-            doctors = doctors.filter(specialization_id=self.request.query_params.get('specialization_id'))
+    **Example requests**:
 
-        if 'services_ids' in self.request.query_params:
-            service_ids = [int(id) for id in self.request.query_params.get('services_ids').split(',')]
-            doctors = doctors.filter(services__in=service_ids)
+        GET /doctor/available_slots/?specialization_id=1&start_date=2017-06-18&end_date=2017-06-24&limit=10
 
-        if 'query' in self.request.query_params:
-            doctors = doctors.filter(Q(first_name__icontains=self.request.query_params.get('query')) | Q(last_name__icontains=self.request.query_params.get('query')))
+    **filters**:
+        - Same as DoctorListView
+        - start_date: defaults to today
+        - end_date: defaults to MAX_RANGE_DAYS after start_date
+        - limit: No. of slots, defaults to 10
 
-        doctors = doctors.filter(is_active=str2bool(self.request.query_params.get('active', 'true')))
+    Without clinic_id only the clinics of the user are searched.
+    """
 
-        return doctors
+    MAX_RANGE_DAYS = 31
+    DEFAULT_LIMIT = 10
+    MAX_LIMIT = 50
 
+    authentication_classes = (UserAuthentication,)
+    permission_classes = (PatientDoctorPermission,)
 
-class DoctorPatientListView(ListAPIView):
+    def get(self, request):
+        try:
+            start_day = get_date_from_date_string(request.query_params.get('start_date', str(datetime.now().date())))
+            end_day = start_day + timedelta(days=self.MAX_RANGE_DAYS - 1)
+            if 'end_date' in request.query_params:
+                end_day = get_date_from_date_string(request.query_params.get('end_date'))
+            limit = min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT)
+            doctors = filter_doctors(Doctor.objects.all(), request.query_params)
+            settings = DoctorSetting.objects.filter(physician__in=doctors)
+            if 'clinic_id' in request.query_params:
+                settings = settings.filter(clinic_id=request.query_params.get('clinic_id'))
+            else:
+                settings = settings.filter(clinic_id__in=get_clinic_ids(request.user.id))
+        except ValueError:
+            raise InvalidInputDataException()
+
+        if end_day < start_day or (end_day - start_day).days >= self.MAX_RANGE_DAYS:
+            raise InvalidDateTimeException()
+
+        settings = list(settings)
+
+        doctor_ids = set(setting.physician_id for setting in settings)
+        holidays = get_leaves(doctor_ids, start_day, end_day)
+        appointments = Appointment.objects.filter(
+            doctor_id__in=doctor_ids,
+            start_datetime__gte=get_start_datetime_from_date_string(str(start_day)),
+            end_datetime__lte=get_end_datetime_from_date_string(str(end_day)),
+        ).filter(~Q(status=Appointment.Status.CANCEL)).order_by('start_datetime')
+
+        engines = build_engines(settings, holidays, appointments)
+        earliest = find_earliest_slots(engines, start_day, end_day, limit, not_before=datetime.now())
+
+        doctors = Doctor.objects.select_related('specialization').in_bulk([doctor_id for _, doctor_id, _, _ in earliest])
+        data = [{
+            "doctor": BasicDoctorSerializer(doctors[doctor_id], context={"request": request}).data,
+            "clinic": clinic_id,
+            "start": slot['start'],
+            "end": slot['end'],
+        } for _, doctor_id, clinic_id, slot in earliest]
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class DoctorPatientListView(QueryPlanMixin, ListAPIView):
     """
     View for getting all patients.
 
@@ -107,12 +194,12 @@ class DoctorPatientListView(ListAPIView):
     queryset = Patient.objects.all().order_by('first_name')
 
     def get_queryset(self):
-        clinic_ids = self.request.user.doctor.clinic.all().values_list("id", flat=True)
+        clinic_ids = get_clinic_ids(self.request.user.id)
         patients = Patient.objects.filter(clinic__id__in=clinic_ids, is_active=True).order_by('first_name')
         return patients
 
 
-class DoctorClinicView(ListAPIView):
+class DoctorClinicView(QueryPlanMixin, ListAPIView):
     """
     View for getting doctor's clinics.
 
@@ -129,7 +216,7 @@ class DoctorClinicView(ListAPIView):
         return self.request.user.clinic.all().order_by('id')
 
 
-class DoctorAppointmentView(ListAPIView):
+class DoctorAppointmentView(CompactListMixin, ListAPIView):
     """
     View for getting doctor's appointments
 
@@ -148,9 +235,11 @@ class DoctorAppointmentView(ListAPIView):
     authentication_classes = (UserAuthentication,)
     permission_classes = (DoctorOwnerPermission,)
     serializer_class = AppointmentSerializer
+    pagination_class = KeysetPagination
+    ordering = ('start_datetime', 'id')
 
     def get_queryset(self):
-        appointments = self.request.user.doctor.appointments.all().order_by('start_datetime')
+        appointments = Appointment.objects.filter(doctor_id=self.request.user.id).all().order_by('start_datetime')
 
         if 'start_date' in self.request.query_params:
             start_datetime = get_start_datetime_from_date_string(self.request.query_params.get("start_date"))
@@ -173,7 +262,7 @@ class DoctorAppointmentView(ListAPIView):
         return appointments
 
 
-class DoctorAppointmentHistoryView(ListAPIView):
+class DoctorAppointmentHistoryView(CompactListMixin, ListAPIView):
     """
     View for getting doctor's historic appointments
 
@@ -190,9 +279,11 @@ class DoctorAppointmentHistoryView(ListAPIView):
     authentication_classes = (UserAuthentication,)
     permission_classes = (DoctorOwnerPermission,)
     serializer_class = AppointmentSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-start_datetime', '-id')
 
     def get_queryset(self):
-        appointments = self.request.user.doctor.appointments.\
+        appointments = Appointment.objects.filter(doctor_id=self.request.user.id).\
             filter(visit__isnull=False).order_by('-start_datetime')
 
         date_time_now = get_end_datetime_from_date_string(datetime.now().date())
@@ -211,7 +302,7 @@ class DoctorAppointmentHistoryView(ListAPIView):
         return appointments
 
 
-class DoctorAppointmentVisitView(ListAPIView):
+class DoctorAppointmentVisitView(CompactListMixin, ListAPIView):
     """
     View for getting doctor's appointments needed any action to be taken on
 
@@ -230,10 +321,12 @@ class DoctorAppointmentVisitView(ListAPIView):
     authentication_classes = (UserAuthentication,)
     permission_classes = (DoctorOwnerPermission,)
     serializer_class = AppointmentSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-start_datetime', '-id')
 
     def get_queryset(self):
         statuses = [Appointment.Status.PENDING, Appointment.Status.CONFIRM]
-        appointments = self.request.user.doctor.appointments.\
+        appointments = Appointment.objects.filter(doctor_id=self.request.user.id).\
             filter(status__in=statuses, visit__isnull=True).order_by('-start_datetime')
 
         date_time_now = get_end_datetime_from_date_string(datetime.now().date())
@@ -266,12 +359,13 @@ class DoctorStatusView(APIView):
 
     authentication_classes = (UserAuthentication,)
     permission_classes = (DoctorOwnerPermission, AppointmentOwnerPermission)
+    select_related_objects = {Appointment: ('doctor', 'patient', 'clinic')}
 
     def post(self, request, pk, appointment_id):
         status_code = request.data.get('status', None)
         if status_code:
             if status_code in [Appointment.Status.CONFIRM, Appointment.Status.DISCARD, Appointment.Status.NOSHOW]:
-                appointment = Appointment.objects.get(pk=appointment_id)
+                appointment = get_request_object(request, self, Appointment, appointment_id)
                 appointment.status = status_code
                 appointment.save()
 
@@ -310,46 +404,95 @@ class DoctorAppointmentSlotView(APIView):
 
     **Example requests**:
         GET /doctor/{id}/clinic/{clinic_id}/appointment_slots/?date=2017-06-18
+        GET /doctor/{id}/clinic/{clinic_id}/appointment_slots/?start_date=2017-06-18&end_date=2017-06-24
+
+    **range**:
+        With start_date and end_date the slots of every date of the range are returned
+        as [{"date": "2017-06-18", "slots": [...]}, ...]. Range is limited to MAX_RANGE_DAYS.
+
+    Slots are cached per date, on a miss they are read from the slot inventory when it
+    is enabled and covers the dates.
     """
 
+    MAX_RANGE_DAYS = 62
+
     authentication_classes = (UserAuthentication,)
     permission_classes = (PatientDoctorPermission, PatientBelongsDoctorPermission)
 
     def get(self, request, pk, clinic_id):
         date = request.query_params.get('date', None)
+        start_date = request.query_params.get('start_date', None)
+        end_date = request.query_params.get('end_date', None)
+
+        if start_date and end_date:
+            try:
+                start_day = get_date_from_date_string(start_date)
+                end_day = get_date_from_date_string(end_date)
+            except ValueError:
+                raise InvalidDateTimeException()
+
+            if end_day < start_day or (end_day - start_day).days >= self.MAX_RANGE_DAYS:
+                raise InvalidDateTimeException()
+
+            slots = self.get_slots(pk, clinic_id, start_day, end_day)
+            days = []
+            day = start_day
+            while day <= end_day:
+                days.append({
+                    "date": day,
+                    "slots": slots.get(day, []),
+                })
+                day += timedelta(days=1)
+            return Response(days, status=status.HTTP_200_OK)
+
         if date:
-            doctor = Doctor.objects.get(pk=pk)
-
-            if DoctorHoliday.objects.filter(physician_id=doctor.id, day=get_date_from_date_string(date)).exists():
-                return Response([], status=status.HTTP_200_OK)
-
-            setting = doctor.settings.filter(clinic_id=clinic_id).first()
-            if setting:
-                start_time, end_time = setting.get_day_timings(get_date_from_date_string(date).weekday())
-                if start_time and end_time:
-                    intervals = get_interval_between_time(start_time, end_time, setting.slot_time, date)
-                    day_start, day_end = get_datetime_range_from_date_string(date)
-
-                    appointments = doctor.appointments.filter(start_datetime__gte=day_start, end_datetime__lte=day_end)
-                    appointments = appointments.filter(~Q(status=Appointment.Status.CANCEL))
-                    appointments = [{
-                            "start": appointment.start_datetime,
-                            "end": appointment.end_datetime
-                        } for appointment in appointments]
-
-                    for interval in intervals:
-                        for appointment in appointments:
-                            is_overlap = (interval['start'] <= appointment['start'] <= interval['end']) or (appointment['start'] <= interval['start'] <= appointment['end'])
-                            if is_overlap:
-                                interval['available'] = False
-
-                    return Response(intervals, status=status.HTTP_200_OK)
-            return Response([], status=status.HTTP_200_OK)
+            try:
+                day = get_date_from_date_string(date)
+            except ValueError:
+                raise InvalidDateTimeException()
+            slots = self.get_slots(pk, clinic_id, day, day)
+            return Response(slots.get(day, []), status=status.HTTP_200_OK)
 
         raise InvalidInputDataException()
 
+    def get_slots(self, pk, clinic_id, start_day, end_day):
+        """
+        return {date: slots} of the range, dates missing from the cache are read from the
+        slot inventory when it covers them or computed otherwise.
+        """
+        days = [start_day + timedelta(days=n) for n in range((end_day - start_day).days + 1)]
+        slots, entry_keys = get_cached_days(pk, clinic_id, days)
+
+        missing_days = [day for day in days if day not in slots]
+        if missing_days:
+            computed = self.compute_slots(pk, clinic_id, missing_days[0], missing_days[-1])
+            computed = {day: computed.get(day, []) for day in missing_days}
+            set_cached_days(entry_keys, computed)
+            slots.update(computed)
+
+        return slots
+
+    def compute_slots(self, pk, clinic_id, start_day, end_day):
+        if SLOT_INVENTORY_ENABLED and is_within_horizon(start_day, end_day):
+            return get_inventory_slots(pk, clinic_id, start_day, end_day)
+
+        setting = DoctorSetting.objects.filter(physician_id=pk, clinic_id=clinic_id).first()
+        if not setting:
+            return {}
+
+        holidays = get_leaves([pk], start_day, end_day)
+        appointments = Appointment.objects.filter(
+            doctor_id=pk,
+            start_datetime__gte=get_start_datetime_from_date_string(str(start_day)),
+            end_datetime__lte=get_end_datetime_from_date_string(str(end_day)),
+        )
+        appointments = appointments.filter(~Q(status=Appointment.Status.CANCEL)).order_by('start_datetime')
+
+        engine = AvailabilityEngine(setting, holidays, appointments)
+        return {day["date"]: day["slots"] for day in engine.get_range_slots(start_day, end_day)}
+
 
-class DoctorVisitView(ListAPIView):
+class DoctorVisitView(CompactListMixin, ListAPIView):
     """
     View for getting doctor visits
 
@@ -369,7 +512,7 @@ class DoctorVisitView(ListAPIView):
     serializer_class = VisitSerializer
 
     def get_queryset(self):
-        appointments = self.request.user.doctor.appointments.filter(Q(status=Appointment.Status.PENDING) or Q(status=Appointment.Status.CONFIRM))
+        appointments = Appointment.objects.filter(doctor_id=self.request.user.id).filter(Q(status=Appointment.Status.PENDING) or Q(status=Appointment.Status.CONFIRM))
 
         if 'clinic_id' in self.request.query_params:
             appointments = appointments.filter(clinic=self.request.query_params.get('clinic_id'))
@@ -390,7 +533,7 @@ class DoctorVisitView(ListAPIView):
         return Visit.objects.filter(appointment_id__in=appointment_ids)
 
 
-class DoctorReviewView(ListAPIView):
+class DoctorReviewView(FastListMixin, ListAPIView):
     """
     View for getting doctor reviews
 
@@ -407,6 +550,8 @@ class DoctorReviewView(ListAPIView):
     authentication_classes = (UserAuthentication,)
     permission_classes = (PatientDoctorPermission,)
     serializer_class = ReviewSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         try:
@@ -2,14 +2,18 @@ from rest_framework.generics import ListAPIView, UpdateAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
+from django.utils import timezone
 from entities.notification.models import Notification
 from libs.authentication import UserAuthentication
 from api.v1.serializers import NotificationSerializer, BasicNotificationSerializer
 from libs.custom_exceptions import NotificationDoesNotExistsException
+from libs.identity_map import get_request_object
 from libs.permission import PKNotificationOwnerPermission, PatientDoctorPermission
+from libs.mixins import FastListMixin
+from libs.pagination import KeysetPagination
 
 
-class NotificationView(ListAPIView):
+class NotificationView(FastListMixin, ListAPIView):
     """
     View for getting notifications.
 
@@ -20,9 +24,11 @@ class NotificationView(ListAPIView):
 
     authentication_classes = (UserAuthentication,)
     serializer_class = NotificationSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-id',)
 
     def get_queryset(self):
-        return self.request.user.notifications.all().order_by('-id')
+        return Notification.objects.filter(user_id=self.request.user.id).order_by('-id')
 
 
 class NotificationUpdateView(APIView):
@@ -38,16 +44,16 @@ class NotificationUpdateView(APIView):
     permission_classes = (PKNotificationOwnerPermission,)
 
     def post(self, request, pk):
-        try:
-            notification = Notification.objects.get(pk=pk)
-            notification.is_read = True
-            notification.save(update_fields=['is_read'])
-
-            serializer = BasicNotificationSerializer(notification)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Notification.DoesNotExist:
+        notification = get_request_object(request, self, Notification, pk)
+        if notification is None:
             raise NotificationDoesNotExistsException()
 
+        notification.is_read = True
+        notification.save(update_fields=['is_read', 'updated_at'])
+
+        serializer = BasicNotificationSerializer(notification)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 class NotificationAllReadView(APIView):
     """
@@ -62,5 +68,5 @@ class NotificationAllReadView(APIView):
     permission_classes = (PatientDoctorPermission,)
 
     def post(self, request, user_id):
-        Notification.objects.filter(user_id=user_id).update(is_read=True)
+        Notification.objects.filter(user_id=user_id).update(is_read=True, updated_at=timezone.now())
         return Response({}, status=status.HTTP_200_OK)
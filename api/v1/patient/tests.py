@@ -0,0 +1,63 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+
+from entities.appointment.models import Appointment
+from libs.fixtures import ClinicFixtureMixin
+from libs.pagination import KeysetPagination
+
+
+@mock.patch.object(KeysetPagination, 'page_size', 4)
+class KeysetPaginationTest(ClinicFixtureMixin, TestCase):
+    """
+    Cursors walk the list both ways without skipping or repeating rows of the same start.
+    """
+    def setUp(self):
+        super(KeysetPaginationTest, self).setUp()
+        patient = self.create_patient()
+        self.create_appointments(11, Appointment.Status.PENDING, patient)
+        # three appointments per start, ties are broken by id
+        for index, appointment in enumerate(Appointment.objects.order_by('id')):
+            Appointment.objects.filter(pk=appointment.pk).update(
+                start_datetime=self.start + timedelta(minutes=10 * (index // 3)))
+        self.expected = list(Appointment.objects.order_by('start_datetime', 'id').values_list('id', flat=True))
+        self.client = self.get_client(patient)
+        self.url = "/api/v1/patient/{}/appointment/".format(patient.id)
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_round_trip(self):
+        pages, data = [], self.get_page(self.url)
+        self.assertEqual(data['count'], 11)
+        self.assertIsNone(data['previous'])
+        pages.append([result['id'] for result in data['results']])
+        while data['next']:
+            data = self.get_page(data['next'])
+            pages.append([result['id'] for result in data['results']])
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(page) for page in pages], [4, 4, 3])
+
+        while data['previous']:
+            data = self.get_page(data['previous'])
+            self.assertEqual([result['id'] for result in data['results']], pages.pop(-2))
+        self.assertEqual(len(pages), 1)
+        self.assertIsNotNone(data['next'])
+
+    def test_without_count(self):
+        data = self.get_page(self.url + "?count=false")
+        self.assertNotIn('count', data)
+        self.assertEqual([result['id'] for result in data['results']], self.expected[:4])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.url + "?cursor=invalid").status_code, 404)
+
+    def test_page_fallback(self):
+        data = self.get_page(self.url + "?page=1")
+        self.assertEqual(data['count'], 11)
+        self.assertEqual(len(data['results']), 11)
+        self.assertIsNone(data['next'])
+        self.assertEqual(self.client.get(self.url + "?page=2").status_code, 404)
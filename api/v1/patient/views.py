@@ -8,7 +8,12 @@ from entities.appointment.models import Appointment, Visit
 from entities.clinic.models import Clinic
 from entities.notification.models import Notification
 from entities.person.models import Patient, Doctor
+from entities.review.models import Review
 from libs.authentication import UserAuthentication
+from libs.identity_map import get_request_object
+from libs.mixins import CompactListMixin, FastListMixin, QueryPlanMixin
+from libs.pagination import KeysetPagination
+from libs.clinic_membership import get_clinic_ids, get_common_clinic_ids
 from libs.custom_exceptions import ClinicDoesNotExistsException, ClinicAlreadyAddedException
 from libs.permission import PatientOwnerPermission, AppointmentOwnerPermission
 from libs.utils import str2bool, get_datetime_from_date_string, get_start_datetime_from_date_string, \
@@ -22,7 +27,7 @@ from api.v1.serializers import (
     ReviewSerializer)
 
 
-class PatientView(RetrieveUpdateAPIView):
+class PatientView(QueryPlanMixin, RetrieveUpdateAPIView):
     """
     View for creating and getting patient.
 
@@ -39,7 +44,7 @@ class PatientView(RetrieveUpdateAPIView):
     queryset = Patient.objects.all()
 
 
-class PatientListView(ListAPIView):
+class PatientListView(QueryPlanMixin, ListAPIView):
     """
     View for getting all patients.
 
@@ -87,7 +92,7 @@ class PatientListView(ListAPIView):
         return patients
 
 
-class PatientClinicView(ListAPIView):
+class PatientClinicView(QueryPlanMixin, ListAPIView):
     """
     View for getting & creating patient's clinics.
 
@@ -110,7 +115,7 @@ class PatientClinicView(ListAPIView):
         code = request.data.get("code", None)
         try:
             clinic = Clinic.objects.get(code=code)
-            if request.user.clinic.filter(code=code).count() <= 0:
+            if clinic.id not in get_clinic_ids(request.user.id):
                 request.user.clinic.add(clinic)
                 return Response({}, status=status.HTTP_200_OK)
             else:
@@ -121,7 +126,7 @@ class PatientClinicView(ListAPIView):
     def delete(self, request, pk, clinic_id):
         try:
             clinic = Clinic.objects.get(id=clinic_id)
-            if request.user.clinic.filter(id=clinic_id).count() <= 0:
+            if clinic.id not in get_clinic_ids(request.user.id):
                 raise ClinicDoesNotExistsException()
             else:
                 request.user.clinic.remove(clinic)
@@ -131,7 +136,7 @@ class PatientClinicView(ListAPIView):
             raise ClinicDoesNotExistsException()
 
 
-class PatientDoctorClinicView(ListAPIView):
+class PatientDoctorClinicView(QueryPlanMixin, ListAPIView):
     """
     View for getting patient's and doctor's common clinics.
 
@@ -145,18 +150,11 @@ class PatientDoctorClinicView(ListAPIView):
     serializer_class = ClinicSerializer
 
     def get_queryset(self):
-        doctor = Doctor.objects.get(pk=self.kwargs['doctor_id'])
-        doctor_clinics = doctor.clinic.all()
-        patient_clinics = self.request.user.clinic.filter(is_active=True)
+        clinic_ids = get_common_clinic_ids(self.request.user.id, self.kwargs['doctor_id'])
+        return Clinic.objects.filter(is_active=True, id__in=clinic_ids).order_by('id')
 
-        common_clinics = []
-        for clinic in patient_clinics:
-            if clinic in doctor_clinics:
-                common_clinics.append(clinic)
-        return common_clinics
 
-
-class PatientAppointmentView(ListAPIView):
+class PatientAppointmentView(CompactListMixin, ListAPIView):
     """
     View for getting patient's appointments
 
@@ -175,9 +173,11 @@ class PatientAppointmentView(ListAPIView):
     authentication_classes = (UserAuthentication,)
     permission_classes = (PatientOwnerPermission,)
     serializer_class = AppointmentSerializer
+    pagination_class = KeysetPagination
+    ordering = ('start_datetime', 'id')
 
     def get_queryset(self):
-        appointments = self.request.user.patient.appointments.all().order_by('start_datetime')
+        appointments = Appointment.objects.filter(patient_id=self.request.user.id).order_by('start_datetime')
 
         if 'start_date' in self.request.query_params:
             start_datetime = get_start_datetime_from_date_string(self.request.query_params.get("start_date"))
@@ -200,7 +200,7 @@ class PatientAppointmentView(ListAPIView):
         return appointments
 
 
-class PatientAppointmentHistoryView(ListAPIView):
+class PatientAppointmentHistoryView(CompactListMixin, ListAPIView):
     """
     View for getting patient's historic appointments
 
@@ -217,9 +217,11 @@ class PatientAppointmentHistoryView(ListAPIView):
     authentication_classes = (UserAuthentication,)
     permission_classes = (PatientOwnerPermission,)
     serializer_class = AppointmentSerializer
+    pagination_class = KeysetPagination
+    ordering = ('-start_datetime', '-id')
 
     def get_queryset(self):
-        appointments = self.request.user.patient.appointments.all().order_by('-start_datetime')
+        appointments = Appointment.objects.filter(patient_id=self.request.user.id).order_by('-start_datetime')
 
         date_time_now = get_start_datetime_from_date_string(datetime.now().date())
         appointments = appointments.filter(start_datetime__lt=date_time_now)
@@ -248,9 +250,10 @@ class PatientAppointmentCancelView(APIView):
 
     authentication_classes = (UserAuthentication,)
     permission_classes = (PatientOwnerPermission, AppointmentOwnerPermission)
+    select_related_objects = {Appointment: ('doctor', 'patient', 'clinic')}
 
     def get(self, request, pk, appointment_id):
-        appointment = Appointment.objects.get(pk=appointment_id)
+        appointment = get_request_object(request, self, Appointment, appointment_id)
         appointment.status = Appointment.Status.CANCEL
         appointment.save()
 
@@ -270,7 +273,7 @@ class PatientAppointmentCancelView(APIView):
         return Response({}, status=status.HTTP_200_OK)
 
 
-class PatientDoctorsView(ListAPIView):
+class PatientDoctorsView(QueryPlanMixin, ListAPIView):
     """
     View for getting doctors related to patient
 
@@ -288,7 +291,7 @@ class PatientDoctorsView(ListAPIView):
         return Doctor.objects.filter(clinic__id__in=patient_clinics).distinct().order_by('rating')
 
 
-class PatientVisitView(ListAPIView):
+class PatientVisitView(CompactListMixin, ListAPIView):
     """
     View for getting patient visits
 
@@ -308,7 +311,7 @@ class PatientVisitView(ListAPIView):
     serializer_class = VisitSerializer
 
     def get_queryset(self):
-        appointments = self.request.user.patient.appointments.all().order_by('-start_datetime')
+        appointments = Appointment.objects.filter(patient_id=self.request.user.id).order_by('-start_datetime')
 
         if 'clinic_id' in self.request.query_params:
             appointments = appointments.filter(clinic=self.request.query_params.get('clinic_id'))
@@ -329,7 +332,7 @@ class PatientVisitView(ListAPIView):
         return Visit.objects.filter(appointment_id__in=appointment_ids)
 
 
-class PatientReviewView(ListAPIView):
+class PatientReviewView(FastListMixin, ListAPIView):
     """
     View for getting patient reviews
 
@@ -347,9 +350,11 @@ class PatientReviewView(ListAPIView):
     authentication_classes = (UserAuthentication,)
     permission_classes = (PatientOwnerPermission,)
     serializer_class = ReviewSerializer
+    pagination_class = KeysetPagination
+    ordering = ('created_at', 'id')
 
     def get_queryset(self):
-        reviews = self.request.user.patient.reviews.all().order_by('created_at')
+        reviews = Review.objects.filter(creator_id=self.request.user.id).order_by('created_at')
 
         if 'clinic_id' in self.request.query_params:
             reviews = reviews.filter(clinic=self.request.query_params.get('clinic_id'))
@@ -1,61 +1,66 @@
 from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
 from entities.clinic.models import City, Country, Clinic
 from entities.notification.models import Notification
 from entities.person.models import Doctor, Patient
 from entities.resources.models import Specialization, Service, Occupation, AppointmentReason
-from entities.appointment.models import Appointment, Visit
+from entities.appointment.models import Appointment, Visit, DoctorCounter
 from entities.review.models import Review
 from entities.test_menu.models import Test
-from libs.utils import get_qid_code
+from libs.booking import book_appointment, book_appointments, reschedule_appointment, expand_recurrence
+from libs.counters import get_counter
 from libs.jwt_helper import JWTHelper
+from libs.query_plan import RelatedRepresentationMixin
+from libs.roles import get_principal
 
 User = get_user_model()
 
 
-class CitySerializer(serializers.ModelSerializer):
+class CitySerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
 
     class Meta:
         model = City
         fields = ('id', 'name')
 
 
-class CountrySerializer(serializers.ModelSerializer):
+class CountrySerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Country
         fields = ('id', 'name')
 
 
-class SpecializationSerializer(serializers.ModelSerializer):
+class SpecializationSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Specialization
         fields = ('id', 'name')
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Service
         fields = ('id', 'name')
 
 
-class OccupationSerializer(serializers.ModelSerializer):
+class OccupationSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Occupation
         fields = ('id', 'name')
 
 
-class AppointmentReasonSerializer(serializers.ModelSerializer):
+class AppointmentReasonSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
 
     class Meta:
         model = AppointmentReason
         fields = ('id', 'name')
 
 
-class ClinicSerializer(serializers.ModelSerializer):
+class ClinicSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
     code = serializers.CharField(write_only=True)
     city = CitySerializer()
     country = CountrySerializer()
@@ -71,10 +76,12 @@ class ClinicSerializer(serializers.ModelSerializer):
         return "{}, {}, {}".format(obj.location, obj.city.name, obj.country.name)
 
 
-class BasicClinicSerializer(serializers.ModelSerializer):
+class BasicClinicSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
     rating = serializers.DecimalField(read_only=True, max_digits=5, decimal_places=2)
 
+    values_fields = {'image': 'image'}
+
     class Meta:
         model = Clinic
         fields = ('id', 'name', 'image', 'rating')
@@ -86,7 +93,7 @@ class BasicClinicSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(photo_url)
 
 
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
     role = serializers.IntegerField(read_only=True)
     password = serializers.CharField(write_only=True, required=False)
     city = serializers.CharField(required=False, allow_blank=True, allow_null=True)
@@ -98,24 +105,25 @@ class DoctorSerializer(serializers.ModelSerializer):
     rating = serializers.DecimalField(read_only=True, max_digits=5, decimal_places=2)
     patients_seen = serializers.SerializerMethodField()
 
+    related_serializers = {
+        'city': CitySerializer,
+        'country': CountrySerializer,
+        'specialization': SpecializationSerializer,
+        'services': ServiceSerializer,
+    }
+    query_annotations = {
+        'patients_seen': {'patients_seen_count': Coalesce(F('counter__done_count'), 0)},
+    }
+    values_fields = {'patients_seen': 'patients_seen_count'}
+
     def get_patients_seen(self, obj):
-        return obj.appointments.filter(status=Appointment.Status.DONE).count()
+        if not hasattr(obj, 'patients_seen_count'):
+            obj.patients_seen_count = get_counter(DoctorCounter, obj.id).patients_seen
+        return obj.patients_seen_count
 
     class Meta:
         model = Doctor
-        exclude = ('is_superuser', 'is_staff', 'groups', 'user_permissions', 'is_active')
-
-    def to_representation(self, instance):
-        data = super(DoctorSerializer, self).to_representation(instance)
-        if instance.city:
-            data['city'] = CitySerializer(instance.city).data
-        if instance.country:
-            data['country'] = CountrySerializer(instance.country).data
-        if instance.specialization:
-            data['specialization'] = SpecializationSerializer(instance.specialization).data
-        if instance.services:
-            data['services'] = ServiceSerializer(instance.services.all(), many=True).data
-        return data
+        exclude = ('is_superuser', 'is_staff', 'groups', 'user_permissions', 'is_active', 'token_version')
 
     def to_internal_value(self, data):
         data = super(DoctorSerializer, self).to_internal_value(data)
@@ -170,11 +178,13 @@ class DoctorSerializer(serializers.ModelSerializer):
         return instance
 
 
-class BasicDoctorSerializer(serializers.ModelSerializer):
+class BasicDoctorSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
     avatar = serializers.SerializerMethodField()
     specialization = SpecializationSerializer()
     rating = serializers.DecimalField(read_only=True, max_digits=5, decimal_places=2)
 
+    values_fields = {'avatar': 'avatar'}
+
     class Meta:
         model = Doctor
         fields = ('id', 'first_name', 'last_name', 'avatar', 'phone', 'specialization', 'rating')
@@ -195,7 +205,7 @@ class DoctorTokenSerializer(DoctorSerializer):
         return doctor
 
 
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
     role = serializers.IntegerField(read_only=True)
     password = serializers.CharField(write_only=True, required=False)
     city = serializers.CharField(required=False, allow_blank=True, allow_null=True)
@@ -204,19 +214,15 @@ class PatientSerializer(serializers.ModelSerializer):
     occupation = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     verified = serializers.BooleanField(read_only=True)
 
+    related_serializers = {
+        'city': CitySerializer,
+        'country': CountrySerializer,
+        'occupation': OccupationSerializer,
+    }
+
     class Meta:
         model = Patient
-        exclude = ('is_superuser', 'is_staff', 'groups', 'user_permissions', 'is_active')
-
-    def to_representation(self, instance):
-        data = super(PatientSerializer, self).to_representation(instance)
-        if instance.city:
-            data['city'] = CitySerializer(instance.city).data
-        if instance.country:
-            data['country'] = CountrySerializer(instance.country).data
-        if instance.occupation:
-            data['occupation'] = OccupationSerializer(instance.occupation).data
-        return data
+        exclude = ('is_superuser', 'is_staff', 'groups', 'user_permissions', 'is_active', 'token_version')
 
     def to_internal_value(self, data):
         data = super(PatientSerializer, self).to_internal_value(data)
@@ -268,9 +274,11 @@ class PatientSerializer(serializers.ModelSerializer):
         return instance
 
 
-class BasicPatientSerializer(serializers.ModelSerializer):
+class BasicPatientSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
     avatar = serializers.SerializerMethodField()
 
+    values_fields = {'avatar': 'avatar'}
+
     class Meta:
         model = Patient
         fields = ('id', 'first_name', 'last_name', 'avatar', 'phone')
@@ -291,42 +299,42 @@ class PatientTokenSerializer(PatientSerializer):
         return patient
 
 
-class BasicVisitSerializer(serializers.ModelSerializer):
+class BasicVisitSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Visit
         fields = '__all__'
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
     qid = serializers.CharField(read_only=True)
     status = serializers.IntegerField(read_only=True)
     visit = BasicVisitSerializer(read_only=True)
 
+    related_serializers = {
+        'reason': AppointmentReasonSerializer,
+        'clinic': BasicClinicSerializer,
+        'patient': PatientSerializer,
+        'doctor': DoctorSerializer,
+    }
+    included_serializers = related_serializers
+
     class Meta:
         model = Appointment
         fields = '__all__'
 
-    def to_representation(self, instance):
-        data = super(AppointmentSerializer, self).to_representation(instance)
-        if instance.reason:
-            data['reason'] = AppointmentReasonSerializer(instance.reason).data
-        if instance.clinic:
-            data['clinic'] = BasicClinicSerializer(instance.clinic, context={"request": self.context['request']}).data
-        if instance.patient:
-            data['patient'] = PatientSerializer(instance.patient, context={"request": self.context['request']}).data
-        if instance.doctor:
-            data['doctor'] = DoctorSerializer(instance.doctor, context={"request": self.context['request']}).data
-        return data
-
     def create(self, validated_data):
         validated_data['status'] = Appointment.Status.PENDING
 
-        validated_data['qid'] = "{}-{}-{}".format(validated_data['patient'].id, validated_data['doctor'].id, get_qid_code())
-
         reason, created = AppointmentReason.objects.get_or_create(name=validated_data['reason'])
         validated_data['reason'] = reason
 
-        appointment = super(AppointmentSerializer, self).create(validated_data)
+        return book_appointment(on_commit=self.notify_created, **validated_data)
+
+    def update(self, instance, validated_data):
+        return reschedule_appointment(instance, on_commit=self.notify_updated, **validated_data)
+
+    @staticmethod
+    def notify_created(appointment):
         Notification.create_notification(
             user=appointment.doctor,
             user_type=Notification.UserType.DOCTOR,
@@ -339,10 +347,9 @@ class AppointmentSerializer(serializers.ModelSerializer):
             doctor=appointment.doctor,
             clinic=appointment.clinic
         )
-        return appointment
 
-    def update(self, instance, validated_data):
-        appointment = super(AppointmentSerializer, self).update(instance, validated_data)
+    @staticmethod
+    def notify_updated(appointment):
         Notification.create_notification(
             user=appointment.doctor,
             user_type=Notification.UserType.DOCTOR,
@@ -355,10 +362,96 @@ class AppointmentSerializer(serializers.ModelSerializer):
             doctor=appointment.doctor,
             clinic=appointment.clinic
         )
-        return appointment
 
 
-class VisitSerializer(serializers.ModelSerializer):
+class AppointmentSlotSerializer(serializers.Serializer):
+    start_datetime = serializers.DateTimeField()
+    end_datetime = serializers.DateTimeField()
+
+
+class AppointmentRecurrenceSerializer(serializers.Serializer):
+    DAILY = 'daily'
+    WEEKLY = 'weekly'
+
+    frequency = serializers.ChoiceField(choices=(DAILY, WEEKLY))
+    interval = serializers.IntegerField(min_value=1, default=1)
+    count = serializers.IntegerField(min_value=1, required=False)
+    until = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if 'count' not in data and 'until' not in data:
+            raise serializers.ValidationError("count or until is required")
+        return data
+
+
+class AppointmentBatchSerializer(serializers.Serializer):
+    """
+    Books a series of appointments, either the explicit `slots` or the first
+    `start_datetime` and `end_datetime` repeated by the `recurrence` rule.
+    """
+    MAX_APPOINTMENTS = 52
+
+    patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all())
+    doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all())
+    clinic = serializers.PrimaryKeyRelatedField(queryset=Clinic.objects.all())
+    reason = serializers.PrimaryKeyRelatedField(queryset=AppointmentReason.objects.all())
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    slots = AppointmentSlotSerializer(many=True, required=False)
+    start_datetime = serializers.DateTimeField(required=False)
+    end_datetime = serializers.DateTimeField(required=False)
+    recurrence = AppointmentRecurrenceSerializer(required=False)
+
+    def validate(self, data):
+        if data.get('slots'):
+            windows = [(slot['start_datetime'], slot['end_datetime']) for slot in data.pop('slots')]
+        elif data.get('recurrence') and data.get('start_datetime') and data.get('end_datetime'):
+            recurrence = data.pop('recurrence')
+            days = recurrence['interval'] * (7 if recurrence['frequency'] == AppointmentRecurrenceSerializer.WEEKLY else 1)
+            windows = expand_recurrence(
+                data.pop('start_datetime'), data.pop('end_datetime'), days,
+                count=recurrence.get('count'), until=recurrence.get('until'), limit=self.MAX_APPOINTMENTS,
+            )
+        else:
+            raise serializers.ValidationError("slots or start_datetime, end_datetime and recurrence are required")
+
+        if not windows:
+            raise serializers.ValidationError("No appointments to book")
+        if len(windows) > self.MAX_APPOINTMENTS:
+            raise serializers.ValidationError("At most {} appointments can be booked at once".format(self.MAX_APPOINTMENTS))
+        data['windows'] = windows
+        return data
+
+    def create(self, validated_data):
+        validated_data['status'] = Appointment.Status.PENDING
+        return book_appointments(on_commit=self.notify_created, **validated_data)
+
+    @staticmethod
+    def notify_created(appointments):
+        appointment = appointments[0]
+        Notification.create_notification(
+            user=appointment.doctor,
+            user_type=Notification.UserType.DOCTOR,
+            heading=Notification.Message.APPOINTMENTS_CREATED["heading"],
+            content=Notification.Message.APPOINTMENTS_CREATED["contents"].format(
+                patient=appointment.patient.get_full_name(), count=len(appointments)),
+            type=Notification.Type.APPOINTMENT,
+            appointment_id=appointment.id,
+            patient=appointment.patient,
+            doctor=appointment.doctor,
+            clinic=appointment.clinic
+        )
+
+
+class VisitSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
+    related_serializers = {
+        'appointment': AppointmentSerializer,
+        'clinic': BasicClinicSerializer,
+        'patient': BasicPatientSerializer,
+        'doctor': BasicDoctorSerializer,
+    }
+    # side loaded with the serializers of the appointment, which has the same relations
+    included_serializers = AppointmentSerializer.related_serializers
+
     class Meta:
         model = Visit
         fields = '__all__'
@@ -369,53 +462,31 @@ class VisitSerializer(serializers.ModelSerializer):
         visit.appointment.save(update_fields=['status'])
         return visit
 
-    def to_representation(self, instance):
-        data = super(VisitSerializer, self).to_representation(instance)
-
-        if instance.appointment:
-            data['appointment'] = AppointmentSerializer(instance.appointment, context={"request": self.context['request']}).data
-        if instance.clinic:
-            data['clinic'] = BasicClinicSerializer(instance.clinic, context={"request": self.context['request']}).data
-        if instance.patient:
-            data['patient'] = BasicPatientSerializer(instance.patient, context={"request": self.context['request']}).data
-        if instance.doctor:
-            data['doctor'] = BasicDoctorSerializer(instance.doctor, context={"request": self.context['request']}).data
-        return data
 
+class TestSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
+    related_serializers = {
+        'clinic': BasicClinicSerializer,
+    }
 
-class TestSerializer(serializers.ModelSerializer):
     class Meta:
         model = Test
         fields = '__all__'
 
-    def to_representation(self, instance):
-        data = super(TestSerializer, self).to_representation(instance)
 
-        if instance.clinic:
-            data['clinic'] = BasicClinicSerializer(instance.clinic, context={"request": self.context['request']}).data
-        return data
-
-
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
     creator = BasicPatientSerializer(read_only=True)
 
+    related_serializers = {
+        'clinic': BasicClinicSerializer,
+        'doctor': BasicDoctorSerializer,
+    }
+
     class Meta:
         model = Review
         fields = '__all__'
 
-    def to_representation(self, instance):
-        data = super(ReviewSerializer, self).to_representation(instance)
-
-        if instance.clinic:
-            data['clinic'] = BasicClinicSerializer(instance.clinic, context={"request": self.context['request']}).data
-        if instance.creator:
-            data['creator'] = BasicPatientSerializer(instance.creator, context={"request": self.context['request']}).data
-        if instance.doctor:
-            data['doctor'] = BasicDoctorSerializer(instance.doctor, context={"request": self.context['request']}).data
-        return data
-
     def create(self, validated_data):
-        validated_data['creator'] = self.context['request'].user.patient
+        validated_data['creator'] = get_principal(self.context['request'])
         instance = super(ReviewSerializer, self).create(validated_data)
 
         if instance.type == Review.Type.DOCTOR:
@@ -426,21 +497,17 @@ class ReviewSerializer(serializers.ModelSerializer):
         return instance
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
+    related_serializers = {
+        'appointment': AppointmentSerializer,
+    }
 
     class Meta:
         model = Notification
         fields = '__all__'
 
-    def to_representation(self, instance):
-        data = super(NotificationSerializer, self).to_representation(instance)
-
-        if instance.appointment:
-            data['appointment'] = AppointmentSerializer(instance.appointment, context={"request": self.context['request']}).data
-        return data
-
 
-class BasicNotificationSerializer(serializers.ModelSerializer):
+class BasicNotificationSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Notification
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.test import TestCase
+
+from entities.appointment.models import Appointment, Visit
+from libs.fixtures import ClinicFixtureMixin
+
+
+@mock.patch('entities.notification.models.OneSignalSdk')
+class SyncTokenTest(ClinicFixtureMixin, TestCase):
+    """
+    Sync tokens return the rows changed and deleted after them, tokens out of the range
+    of dates are rejected as invalid input.
+    """
+    def setUp(self):
+        super(SyncTokenTest, self).setUp()
+        self.patient = self.create_patient()
+        self.client = self.get_client(self.patient)
+
+    def test_invalid_tokens(self, one_signal):
+        self.assertEqual(self.client.get('/api/v1/sync/').status_code, 200)
+        for token in ('abc', '99999999999999999', '-99999999999999999'):
+            self.assertEqual(self.client.get('/api/v1/sync/', {'since': token}).status_code, 400, token)
+
+    def test_changes(self, one_signal):
+        self.create_appointments(3, Appointment.Status.PENDING, patient=self.patient)
+        past = datetime.now() - timedelta(hours=1)
+        Appointment.objects.update(updated_at=past)
+        Visit.objects.update(updated_at=past)
+        token = self.client.get('/api/v1/sync/').data['token']
+
+        changed, deleted, moved = Appointment.objects.order_by('id')
+        deleted_ids = [deleted.id, moved.id]
+        changed.save()
+        deleted.delete()
+        moved.patient = self.create_patient()
+        moved.save()
+
+        response = self.client.get('/api/v1/sync/', {'since': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([appointment['id'] for appointment in response.data['appointments']], [changed.id])
+        self.assertEqual(sorted(response.data['deleted']['appointments']), deleted_ids)
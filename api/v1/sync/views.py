@@ -0,0 +1,31 @@
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from libs.authentication import UserAuthentication
+from libs.sync import get_changes
+from api.v1.serializers import AppointmentSerializer, VisitSerializer, NotificationSerializer
+
+
+class SyncView(APIView):
+    """
+    View for getting the user's appointments, visits and notifications changed or
+    deleted since a sync token, see libs.sync.
+
+    **Example requests**:
+
+        GET /sync/
+        GET /sync/?since={token}
+    """
+
+    authentication_classes = (UserAuthentication,)
+    serializer_classes = {
+        'appointments': AppointmentSerializer,
+        'visits': VisitSerializer,
+        'notifications': NotificationSerializer,
+    }
+
+    def get(self, request):
+        changes = get_changes(request.user, request.query_params.get('since'), self.serializer_classes,
+                              {'request': request, 'view': self})
+        return Response(changes, status=status.HTTP_200_OK)
@@ -4,10 +4,11 @@ from entities.clinic.models import Clinic
 from entities.test_menu.models import Test
 from libs.authentication import UserAuthentication
 from libs.permission import PatientDoctorPermission
+from libs.mixins import QueryPlanMixin
 from api.v1.serializers import TestSerializer, ClinicSerializer
 
 
-class TestLabView(ListAPIView):
+class TestLabView(QueryPlanMixin, ListAPIView):
     """
     View for listing test labs.
 
@@ -21,7 +22,7 @@ class TestLabView(ListAPIView):
     queryset = Clinic.objects.filter(is_active=True, is_lab=True).order_by('id')
 
 
-class TestView(ListAPIView):
+class TestView(QueryPlanMixin, ListAPIView):
     """
     View for listing featured tests.
 
@@ -35,7 +36,7 @@ class TestView(ListAPIView):
     queryset = Test.objects.filter(is_active=True, is_featured=True).order_by('id')
 
 
-class TestDetailView(RetrieveAPIView):
+class TestDetailView(QueryPlanMixin, RetrieveAPIView):
     """
     View for getting test details.
 
@@ -0,0 +1,96 @@
+import time
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.v1.serializers import AppointmentSerializer, BasicDoctorSerializer, BasicPatientSerializer, \
+    NotificationSerializer, ReviewSerializer, VisitSerializer
+from entities.appointment.models import Appointment, Visit
+from entities.clinic.models import City, Clinic
+from entities.notification.models import Notification
+from entities.person.models import Doctor, Patient
+from entities.review.models import Review
+from libs.fast_serializers import get_values_representation
+from libs.fixtures import ClinicFixtureMixin
+from libs.query_plan import optimize_queryset
+from libs.table_versions import get_last_modified
+
+
+class ConditionalGetTest(TransactionTestCase):
+    """
+    Reference lists are answered 304 until their table changes, versions are bumped on commit.
+    """
+    def test_etag(self):
+        city = City.objects.create(name="Lahore")
+        client = APIClient()
+        response = client.get('/api/v1/city/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.assertEqual(client.get('/api/v1/city/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        city.name = "Karachi"
+        city.save()
+        response = client.get('/api/v1/city/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['name'], "Karachi")
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified(self):
+        now = int(time.time() * 1000)
+        self.assertEqual(get_last_modified([now - 5000, now - 10500]), (now - 5000 + 999) // 1000)
+        # a change later in the current second would have the same Last-Modified
+        self.assertIsNone(get_last_modified([now - 5000, now + 1000]))
+
+
+class FastSerializerParityTest(ClinicFixtureMixin, TestCase):
+    """
+    Compiled serializers have to render the same JSON as the serializers.
+    """
+    def setUp(self):
+        super(FastSerializerParityTest, self).setUp()
+        self.create_appointments(3, Appointment.Status.DONE)
+        Appointment.objects.create(qid="no-visit", patient=Patient.objects.first(), doctor=self.doctor,
+                                   clinic=self.clinic, reason=self.reason, start_datetime=self.start,
+                                   end_datetime=self.start + timedelta(minutes=9))
+        Patient.objects.filter(pk=Patient.objects.first().pk).update(avatar="uploads/avatars/patient.png")
+        other = Clinic.objects.create(code="100002", name="Other", phone="2", location="DHA", city=self.city,
+                                      country=self.country, rating="4.50")
+        Clinic.objects.filter(pk=other.pk).update(image="uploads/clinics/other.png")
+        self.doctor.clinic.add(other)
+
+        for appointment in Appointment.objects.all():
+            Notification.objects.create(user=self.doctor, content="Content", heading="Heading",
+                                        type=Notification.Type.APPOINTMENT, appointment=appointment,
+                                        patient=appointment.patient, doctor=self.doctor, clinic=self.clinic)
+        Notification.objects.create(user=self.doctor, content="Announcement", heading="Heading")
+        Review.objects.create(creator=Patient.objects.first(), doctor=self.doctor, rating=4, comment="Good",
+                              type=Review.Type.DOCTOR)
+        Review.objects.create(creator=Patient.objects.last(), clinic=self.clinic, rating=3, comment="Fine",
+                              type=Review.Type.CLINIC)
+        self.context = {'request': APIRequestFactory().get('/')}
+
+    def assert_parity(self, serializer_class, queryset):
+        expected = serializer_class(optimize_queryset(queryset, serializer_class), many=True, context=self.context).data
+        actual = get_values_representation(serializer_class, queryset, self.context)
+        self.assertTrue(expected)
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_basic_doctor(self):
+        self.assert_parity(BasicDoctorSerializer, Doctor.objects.order_by('id'))
+
+    def test_basic_patient(self):
+        self.assert_parity(BasicPatientSerializer, Patient.objects.order_by('id'))
+
+    def test_appointment(self):
+        self.assert_parity(AppointmentSerializer, Appointment.objects.order_by('start_datetime', 'id'))
+
+    def test_visit(self):
+        self.assert_parity(VisitSerializer, Visit.objects.order_by('id'))
+
+    def test_notification(self):
+        self.assert_parity(NotificationSerializer, Notification.objects.order_by('-id'))
+
+    def test_review(self):
+        self.assert_parity(ReviewSerializer, Review.objects.order_by('id'))
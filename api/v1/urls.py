@@ -7,6 +7,7 @@ from api.v1.clinic import urls as clinic_urls
 from api.v1.test import urls as test_urls
 from api.v1.review import urls as review_urls
 from api.v1.notification import urls as notification_urls
+from api.v1.sync import urls as sync_urls
 from . import views
 
 urlpatterns = [
@@ -24,4 +25,5 @@ urlpatterns = [
     url(r'^test/', include(test_urls)),
     url(r'^review/', include(review_urls)),
     url(r'^notification/', include(notification_urls)),
+    url(r'^sync/', include(sync_urls)),
 ]
\ No newline at end of file
@@ -6,11 +6,28 @@ from entities.clinic.models import City, Country
 from entities.resources.models import Occupation, Service, Specialization
 from api.v1.serializers import OccupationSerializer, ServiceSerializer, SpecializationSerializer, CitySerializer, \
     CountrySerializer, AppointmentReasonSerializer
+from libs.mixins import ConditionalGetMixin
+from quicklic_backend import settings
 
 User = get_user_model()
 
+REFERENCE_CACHE_MAX_AGE = getattr(settings, 'REFERENCE_CACHE_MAX_AGE', 60 * 60)
 
-class CityView(ListAPIView):
+
+class ReferenceView(ConditionalGetMixin, ListAPIView):
+    """
+    Active rows of a reference table starting with ?query=, which clients may keep
+    for REFERENCE_CACHE_MAX_AGE seconds and revalidate with their ETag after.
+    """
+    pagination_class = None
+    cache_control = {'public': True, 'max_age': REFERENCE_CACHE_MAX_AGE}
+
+    @property
+    def version_models(self):
+        return (self.get_serializer_class().Meta.model,)
+
+
+class CityView(ReferenceView):
     """
     View for getting all cities.
 
@@ -19,14 +36,13 @@ class CityView(ListAPIView):
         GET /city/
     """
     serializer_class = CitySerializer
-    pagination_class = None
 
     def get_queryset(self):
         query = self.request.query_params.get("query", "")
         return City.objects.filter(is_active=True, name__istartswith=query).order_by('id')
 
 
-class CountryView(ListAPIView):
+class CountryView(ReferenceView):
     """
     View for getting all countries.
 
@@ -35,14 +51,13 @@ class CountryView(ListAPIView):
         GET /countries/
     """
     serializer_class = CountrySerializer
-    pagination_class = None
 
     def get_queryset(self):
         query = self.request.query_params.get("query", "")
         return Country.objects.filter(is_active=True, name__istartswith=query).order_by('id')
 
 
-class OccupationView(ListAPIView):
+class OccupationView(ReferenceView):
     """
     View for getting all occupations.
 
@@ -51,14 +66,13 @@ class OccupationView(ListAPIView):
         GET /occupation/
     """
     serializer_class = OccupationSerializer
-    pagination_class = None
 
     def get_queryset(self):
         query = self.request.query_params.get("query", "")
         return Occupation.objects.filter(is_active=True, name__istartswith=query).order_by('id')
 
 
-class ServiceView(ListAPIView):
+class ServiceView(ReferenceView):
     """
     View for getting all services.
 
@@ -67,14 +81,13 @@ class ServiceView(ListAPIView):
         GET /service/
     """
     serializer_class = ServiceSerializer
-    pagination_class = None
 
     def get_queryset(self):
         query = self.request.query_params.get("query", "")
         return Service.objects.filter(is_active=True, name__istartswith=query).order_by('id')
 
 
-class SpecializationView(ListAPIView):
+class SpecializationView(ReferenceView):
     """
     View for getting all specializations.
 
@@ -83,14 +96,13 @@ class SpecializationView(ListAPIView):
         GET /specialization/
     """
     serializer_class = SpecializationSerializer
-    pagination_class = None
 
     def get_queryset(self):
         query = self.request.query_params.get("query", "")
         return Specialization.objects.filter(is_active=True, name__istartswith=query).order_by('id')
 
 
-class AppointmentReasonView(ListAPIView):
+class AppointmentReasonView(ReferenceView):
     """
     View for getting all appointment reasons.
 
@@ -99,7 +111,6 @@ class AppointmentReasonView(ListAPIView):
         GET /reason/
     """
     serializer_class = AppointmentReasonSerializer
-    pagination_class = None
 
     def get_queryset(self):
         query = self.request.query_params.get("query", "")
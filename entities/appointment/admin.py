@@ -1,5 +1,5 @@
 from django.contrib import admin
-from entities.appointment.models import Appointment, AppointmentReason, Visit
+from entities.appointment.models import Appointment, AppointmentReason, Visit, DoctorSlot, DoctorCounter, ClinicCounter
 
 
 class AppointmentAdmin(admin.ModelAdmin):
@@ -18,3 +18,20 @@ class AppointmentVisitAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Visit, AppointmentVisitAdmin)
+
+
+class DoctorSlotAdmin(admin.ModelAdmin):
+    list_display = ['id', 'doctor', 'clinic', 'start_datetime', 'end_datetime', 'state']
+    list_filter = ('clinic__name', 'state')
+
+
+admin.site.register(DoctorSlot, DoctorSlotAdmin)
+
+
+class CounterAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'pending_count', 'confirm_count', 'done_count', 'noshow_count', 'cancel_count',
+                    'discard_count', 'review_count', 'rating_sum']
+
+
+admin.site.register(DoctorCounter, CounterAdmin)
+admin.site.register(ClinicCounter, CounterAdmin)
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 13:29
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('person', '0013_auto_20261018_1329'),
+        ('appointment', '0005_auto_20171227_1452'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='appointment',
+            index_together=set([('doctor', 'start_datetime')]),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 13:31
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0007_auto_20180315_1431'),
+        ('person', '0013_auto_20261018_1329'),
+        ('appointment', '0006_auto_20261018_1329'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorSlot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_datetime', models.DateTimeField()),
+                ('end_datetime', models.DateTimeField()),
+                ('state', models.IntegerField(choices=[(1, 'AVAILABLE'), (2, 'BOOKED'), (3, 'HOLIDAY')], default=1, verbose_name='state')),
+                ('clinic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='clinic.Clinic')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='person.Doctor')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='doctorslot',
+            unique_together=set([('doctor', 'clinic', 'start_datetime')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='doctorslot',
+            index_together=set([('doctor', 'start_datetime')]),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 13:51
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('person', '0015_doctorholiday_range'),
+        ('clinic', '0007_auto_20180315_1431'),
+        ('appointment', '0007_auto_20261018_1331'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClinicCounter',
+            fields=[
+                ('confirm_count', models.IntegerField(default=0)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('noshow_count', models.IntegerField(default=0)),
+                ('cancel_count', models.IntegerField(default=0)),
+                ('discard_count', models.IntegerField(default=0)),
+                ('done_count', models.IntegerField(default=0)),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('clinic', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to='clinic.Clinic')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DoctorCounter',
+            fields=[
+                ('confirm_count', models.IntegerField(default=0)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('noshow_count', models.IntegerField(default=0)),
+                ('cancel_count', models.IntegerField(default=0)),
+                ('discard_count', models.IntegerField(default=0)),
+                ('done_count', models.IntegerField(default=0)),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to='person.Doctor')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 14:04
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('person', '0015_doctorholiday_range'),
+        ('appointment', '0008_cliniccounter_doctorcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('kind', models.IntegerField(choices=[(1, 'APPOINTMENT'), (2, 'VISIT'), (3, 'NOTIFICATION')], verbose_name='kind')),
+                ('object_id', models.IntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='visit',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='appointment',
+            index_together=set([('doctor', 'start_datetime'), ('patient', 'updated_at'), ('doctor', 'updated_at')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='visit',
+            index_together=set([('patient', 'updated_at'), ('doctor', 'updated_at')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='tombstone',
+            index_together=set([('user_id', 'deleted_at')]),
+        ),
+    ]
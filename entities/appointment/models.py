@@ -1,9 +1,13 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.auth import get_user_model
 
 from entities.clinic.models import Clinic
-from entities.person.models import Patient, Doctor
+from entities.person.models import Patient, Doctor, DoctorSetting, DoctorHoliday
 from entities.resources.models import AppointmentReason
 
 User = get_user_model()
@@ -43,6 +47,10 @@ class Appointment(models.Model):
 
     is_active = models.BooleanField(default=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        index_together = (('doctor', 'start_datetime'), ('doctor', 'updated_at'), ('patient', 'updated_at'))
 
     def __str__(self):
         return self.qid
@@ -60,6 +68,241 @@ class Visit(models.Model):
     clinic = models.ForeignKey(Clinic, related_name='visits')
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        index_together = (('doctor', 'updated_at'), ('patient', 'updated_at'))
 
     def __str__(self):
         return self.appointment.qid
+
+
+class DoctorSlot(models.Model):
+    """
+    Materialized appointment slot of a doctor at a clinic.
+
+    Slots are generated from DoctorSetting for a rolling horizon and kept in sync
+    with appointments and holidays by libs.slot_inventory.
+    """
+
+    class State:
+        AVAILABLE = 1
+        BOOKED = 2
+        HOLIDAY = 3
+
+        Choices = (
+            (AVAILABLE, 'AVAILABLE'),
+            (BOOKED, 'BOOKED'),
+            (HOLIDAY, 'HOLIDAY'),
+        )
+
+    doctor = models.ForeignKey(Doctor, related_name='slots')
+    clinic = models.ForeignKey(Clinic, related_name='slots')
+
+    start_datetime = models.DateTimeField()
+    end_datetime = models.DateTimeField()
+
+    state = models.IntegerField(_('state'), choices=State.Choices, default=State.AVAILABLE)
+
+    class Meta:
+        unique_together = (('doctor', 'clinic', 'start_datetime'),)
+        index_together = (('doctor', 'start_datetime'),)
+
+    def __str__(self):
+        return "{} {}".format(self.doctor_id, self.start_datetime)
+
+
+class ActivityCounter(models.Model):
+    """
+    Denormalized activity counts, kept up to date by libs.counters and rebuilt from
+    scratch with the rebuild_counters command.
+    """
+    confirm_count = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+    noshow_count = models.IntegerField(default=0)
+    cancel_count = models.IntegerField(default=0)
+    discard_count = models.IntegerField(default=0)
+    done_count = models.IntegerField(default=0)
+
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def patients_seen(self):
+        return self.done_count
+
+    @property
+    def rating(self):
+        return Decimal(self.rating_sum) / self.review_count if self.review_count else None
+
+
+class DoctorCounter(ActivityCounter):
+    doctor = models.OneToOneField(Doctor, related_name='counter', primary_key=True)
+
+    def __str__(self):
+        return str(self.doctor_id)
+
+
+class ClinicCounter(ActivityCounter):
+    clinic = models.OneToOneField(Clinic, related_name='counter', primary_key=True)
+
+    def __str__(self):
+        return str(self.clinic_id)
+
+
+class Tombstone(models.Model):
+    """
+    Deleted appointment, visit or notification of a user, see libs.sync.
+    """
+
+    class Kind:
+        APPOINTMENT = 1
+        VISIT = 2
+        NOTIFICATION = 3
+
+        Choices = (
+            (APPOINTMENT, 'APPOINTMENT'),
+            (VISIT, 'VISIT'),
+            (NOTIFICATION, 'NOTIFICATION'),
+        )
+
+    user_id = models.IntegerField()
+    kind = models.IntegerField(_('kind'), choices=Kind.Choices)
+    object_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        index_together = (('user_id', 'deleted_at'),)
+
+    def __str__(self):
+        return "{} {}".format(self.get_kind_display(), self.object_id)
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_appointment_window(sender, instance, update_fields=None, **kwargs):
+    instance._previous_window = None
+    instance._previous_doctor_id = None
+    instance._previous_status = None
+    instance._previous_owners = None
+    if instance.pk:
+        fields = {'start_datetime', 'end_datetime', 'status', 'doctor', 'clinic', 'patient'}
+        if update_fields and not fields & set(update_fields):
+            return
+        previous = Appointment.objects.filter(pk=instance.pk).\
+            values_list('start_datetime', 'end_datetime', 'doctor_id', 'clinic_id', 'status', 'patient_id').first()
+        if previous:
+            instance._previous_window = previous[:2]
+            instance._previous_doctor_id = previous[2]
+            instance._previous_status = previous[2:5]
+            instance._previous_owners = (previous[2], previous[5])
+
+
+def _get_changed_windows(instance):
+    """
+    return {doctor_id: windows} the saved appointment occupied before and after the change.
+    """
+    window = (instance.start_datetime, instance.end_datetime)
+    windows = {instance.doctor_id: [window]}
+    previous_window = getattr(instance, '_previous_window', None)
+    previous_doctor_id = getattr(instance, '_previous_doctor_id', None)
+    if previous_window and (previous_doctor_id, previous_window) != (instance.doctor_id, window):
+        windows.setdefault(previous_doctor_id, []).append(previous_window)
+    return windows
+
+
+@receiver(post_save, sender=Appointment)
+def update_availability_on_appointment_change(sender, instance, **kwargs):
+    from libs.availability_cache import invalidate_windows
+    from libs.slot_inventory import on_appointment_changed
+    for doctor_id, windows in _get_changed_windows(instance).items():
+        on_appointment_changed(doctor_id, windows)
+        invalidate_windows(doctor_id, windows)
+
+
+@receiver(post_delete, sender=Appointment)
+def update_availability_on_appointment_removed(sender, instance, **kwargs):
+    from libs.availability_cache import invalidate_windows
+    from libs.slot_inventory import on_appointment_changed
+    windows = [(instance.start_datetime, instance.end_datetime)]
+    on_appointment_changed(instance.doctor_id, windows)
+    invalidate_windows(instance.doctor_id, windows)
+
+
+@receiver(post_save, sender=Appointment)
+def update_counters_on_appointment_change(sender, instance, created, **kwargs):
+    from libs.counters import count_status_changes
+    previous_status = getattr(instance, '_previous_status', None)
+    if not created and not previous_status:
+        return
+    count_status_changes([(previous_status, (instance.doctor_id, instance.clinic_id, instance.status))])
+
+
+@receiver(pre_delete, sender=Appointment)
+def update_counters_on_appointment_removed(sender, instance, **kwargs):
+    from libs.counters import count_status_changes
+    # the instance can be stale after bulk updates, count what is stored
+    previous = Appointment.objects.filter(pk=instance.pk).values_list('doctor_id', 'clinic_id', 'status').first()
+    if previous:
+        count_status_changes([(previous, None)])
+
+
+@receiver(post_delete, sender=Appointment)
+def record_appointment_deletion(sender, instance, **kwargs):
+    from libs.sync import record_deletion
+    record_deletion(Tombstone.Kind.APPOINTMENT, instance.pk, [instance.doctor_id, instance.patient_id])
+
+
+@receiver(post_save, sender=Appointment)
+def record_appointment_move(sender, instance, **kwargs):
+    from libs.sync import record_deletion
+    # the users the appointment was moved away from see it deleted
+    previous_owners = getattr(instance, '_previous_owners', None)
+    if previous_owners:
+        record_deletion(Tombstone.Kind.APPOINTMENT, instance.pk,
+                        set(previous_owners) - {instance.doctor_id, instance.patient_id})
+
+
+@receiver(post_delete, sender=Visit)
+def record_visit_deletion(sender, instance, **kwargs):
+    from libs.sync import record_deletion
+    record_deletion(Tombstone.Kind.VISIT, instance.pk, [instance.doctor_id, instance.patient_id])
+
+
+@receiver(post_save, sender=DoctorSetting)
+def update_availability_on_setting_change(sender, instance, **kwargs):
+    from libs.availability_cache import invalidate_doctor
+    from libs.slot_inventory import on_setting_changed
+    on_setting_changed(instance)
+    invalidate_doctor(instance.physician_id)
+
+
+@receiver(pre_save, sender=DoctorHoliday)
+def remember_holiday_window(sender, instance, **kwargs):
+    instance._previous_window = None
+    if instance.pk:
+        instance._previous_window = DoctorHoliday.objects.filter(pk=instance.pk).\
+            values_list('start_datetime', 'end_datetime').first()
+
+
+@receiver(post_save, sender=DoctorHoliday)
+def update_availability_on_holiday_saved(sender, instance, **kwargs):
+    from libs.availability_cache import invalidate_windows
+    from libs.slot_inventory import on_leave_changed
+    windows = [(instance.start_datetime, instance.end_datetime)]
+    previous_window = getattr(instance, '_previous_window', None)
+    if previous_window and previous_window != windows[0]:
+        windows.append(previous_window)
+    on_leave_changed(instance.physician_id, windows)
+    invalidate_windows(instance.physician_id, windows)
+
+
+@receiver(post_delete, sender=DoctorHoliday)
+def update_availability_on_holiday_removed(sender, instance, **kwargs):
+    from libs.availability_cache import invalidate_windows
+    from libs.slot_inventory import on_leave_changed
+    windows = [(instance.start_datetime, instance.end_datetime)]
+    on_leave_changed(instance.physician_id, windows)
+    invalidate_windows(instance.physician_id, windows)
@@ -1,5 +1,6 @@
 from django.db import models
-from django.db.models import Avg
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
 
@@ -50,8 +51,9 @@ class Clinic(models.Model):
         return self.name
 
     def calculate_rating(self):
-        rating = self.reviews.aggregate(Avg('rating'))
-        self.rating = rating['rating__avg']
+        from entities.appointment.models import ClinicCounter
+        from libs.counters import get_counter
+        self.rating = get_counter(ClinicCounter, self.id).rating
         self.save(update_fields=["rating"])
 
     def create_thumbnail(self):
@@ -91,3 +93,20 @@ class Clinic(models.Model):
     def save(self, *args, **kwargs):
         self.create_thumbnail()
         return super(Clinic, self).save(*args, **kwargs)
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+@receiver(post_save, sender=Clinic)
+@receiver(post_delete, sender=Clinic)
+def update_version_on_change(sender, **kwargs):
+    from libs.table_versions import bump_table
+    bump_table(sender)
+
+
+@receiver(pre_delete, sender=Clinic)
+def update_clinic_membership_on_delete(sender, instance, **kwargs):
+    from libs.clinic_membership import invalidate_users
+    invalidate_users(instance.user.values_list('id', flat=True))
@@ -1,7 +1,9 @@
 from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
-from entities.appointment.models import Appointment
+from entities.appointment.models import Appointment, Tombstone
 from entities.clinic.models import Clinic
 from entities.person.models import Patient, Doctor, User, Moderator
 from libs.onesignal_sdk import OneSignalSdk
@@ -17,6 +19,10 @@ class Notification(models.Model):
             "contents": "{patient} has scheduled a new appointment with you.",
             "heading": "New appointment scheduled!",
         }
+        APPOINTMENTS_CREATED = {
+            "contents": "{patient} has scheduled {count} appointments with you.",
+            "heading": "New appointments scheduled!",
+        }
         APPOINTMENT_CANCELED = {
             "contents": "{patient} has canceled an appointment with you.",
             "heading": "Appointment Canceled!",
@@ -72,6 +78,10 @@ class Notification(models.Model):
 
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        index_together = (('user', 'id'), ('user', 'updated_at'))
 
     def __str__(self):
         return self.heading
@@ -90,9 +100,10 @@ class Notification(models.Model):
     @staticmethod
     def create_batch_notification_for_discard(appointments):
         heading = "Your appointment has been discarded by the doctor."
+        notifications = []
         player_ids = []
         for appointment in appointments:
-            Notification.objects.create(
+            notifications.append(Notification(
                 user=appointment.patient,
                 user_type=Notification.UserType.PATIENT,
                 type=Notification.Type.APPOINTMENT,
@@ -103,8 +114,10 @@ class Notification(models.Model):
                 patient=appointment.patient,
                 doctor=appointment.doctor,
                 clinic=appointment.clinic,
-            )
-            player_ids.append(appointment.patient.device_id)
+            ))
+            if appointment.patient.device_id:
+                player_ids.append(appointment.patient.device_id)
+        Notification.objects.bulk_create(notifications)
 
         one_signal_sdk = OneSignalSdk()
         one_signal_sdk.create_notification(contents=heading, heading=heading, player_ids=player_ids)
@@ -123,3 +136,9 @@ class Notification(models.Model):
 
         one_signal_sdk = OneSignalSdk()
         one_signal_sdk.create_notification(contents=message, heading=Notification.Message.ANNOUNCEMENT_HEADING, player_ids=player_ids)
+
+
+@receiver(post_delete, sender=Notification)
+def record_notification_deletion(sender, instance, **kwargs):
+    from libs.sync import record_deletion
+    record_deletion(Tombstone.Kind.NOTIFICATION, instance.pk, [instance.user_id])
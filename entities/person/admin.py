@@ -122,7 +122,7 @@ admin.site.register(DoctorSetting, DoctorSettingAdmin)
 
 
 class DoctorHolidaysAdmin(admin.ModelAdmin):
-    list_display = ('id', 'day')
+    list_display = ('id', 'day', 'start_datetime', 'end_datetime')
     search_fields = ('physician__phone',)
 
 admin.site.register(DoctorHoliday, DoctorHolidaysAdmin)
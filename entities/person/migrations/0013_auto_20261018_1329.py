@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 13:29
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('person', '0012_auto_20180316_1655'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='doctorholiday',
+            index_together=set([('physician', 'day')]),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 13:34
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import entities.person.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('person', '0013_auto_20261018_1329'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorsetting',
+            name='breaks',
+            field=models.CharField(blank=True, default='', help_text='Breaks as day:HH:MM-HH:MM separated by commas, e.g. 0:13:00-14:00', max_length=255, validators=[entities.person.models.validate_breaks]),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 15:02
+from __future__ import unicode_literals
+
+import datetime
+
+from django.db import migrations, models
+
+
+def fill_holiday_range(apps, schema_editor):
+    DoctorHoliday = apps.get_model('person', 'DoctorHoliday')
+    for holiday in DoctorHoliday.objects.all():
+        holiday.start_datetime = datetime.datetime.combine(holiday.day, datetime.time.min)
+        holiday.end_datetime = datetime.datetime.combine(holiday.day, datetime.time(23, 59, 59))
+        holiday.save(update_fields=['start_datetime', 'end_datetime'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('person', '0014_doctorsetting_breaks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorholiday',
+            name='start_datetime',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='doctorholiday',
+            name='end_datetime',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(fill_holiday_range, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='doctorholiday',
+            name='start_datetime',
+            field=models.DateTimeField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='doctorholiday',
+            name='end_datetime',
+            field=models.DateTimeField(blank=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='doctorholiday',
+            index_together=set([('physician', 'start_datetime', 'end_datetime')]),
+        ),
+    ]
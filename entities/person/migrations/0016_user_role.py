@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 14:17
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_user_role(apps, schema_editor):
+    User = apps.get_model('person', 'User')
+    # the role checks tried doctor first, then patient and moderator
+    for model_name, role in (('Moderator', 3), ('Patient', 2), ('Doctor', 1)):
+        model = apps.get_model('person', model_name)
+        User.objects.filter(pk__in=model.objects.values('pk')).update(role=role)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('person', '0015_doctorholiday_range'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='doctor',
+            name='role',
+        ),
+        migrations.RemoveField(
+            model_name='moderator',
+            name='role',
+        ),
+        migrations.RemoveField(
+            model_name='patient',
+            name='role',
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='role',
+            field=models.IntegerField(blank=True, choices=[(1, 'Doctor'), (2, 'Patient'), (3, 'ADMIN')], db_index=True, help_text='Designates the Doctor, Patient or Moderator the user is.', null=True, verbose_name='role'),
+        ),
+        migrations.RunPython(fill_user_role, migrations.RunPython.noop),
+    ]
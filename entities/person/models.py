@@ -1,17 +1,19 @@
 import datetime
 from datetime import timedelta
 from django.db import models
+from django.core.exceptions import ValidationError
 from django.core.mail import send_mail
 from django.contrib.auth.models import PermissionsMixin
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.utils.translation import ugettext_lazy as _
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.utils.functional import cached_property
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
-from django.db.models import Avg
 from entities.clinic.models import Country, City, Clinic
 from entities.resources.models import Service, Specialization, Occupation
 from libs.managers import QueryManager
+from libs.schedule import WeeklySchedule, DAYS, format_minutes, parse_breaks, to_minutes
 from libs.utils import get_verification_code, next_weekday, get_start_datetime_from_date_string, \
     get_end_datetime_from_date_string
 from quicklic_backend.settings import MEDIA_URL, MEDIA_ROOT
@@ -96,12 +98,17 @@ class User(AbstractBaseUser, PermissionsMixin):
     city = models.ForeignKey(City, related_name="user", blank=True, null=True)
     clinic = models.ManyToManyField(Clinic, related_name="user", blank=True)
     verified = models.BooleanField(default=False)
+    role = models.IntegerField(_('role'), choices=Role.Choices, blank=True, null=True, db_index=True,
+                               help_text=_('Designates the Doctor, Patient or Moderator the user is.'))
+    token_version = models.PositiveIntegerField(_('token version'), default=0,
+                                                help_text=_('Tokens issued with an older version are invalid.'))
 
     device_id = models.CharField(max_length=255, blank=True, null=True)
     device_type = models.IntegerField(blank=True, null=True)
 
     objects = UserManager()
 
+    ROLE = None
     USERNAME_FIELD = 'phone'
     REQUIRED_FIELDS = []
 
@@ -144,14 +151,25 @@ class User(AbstractBaseUser, PermissionsMixin):
         self.device_id = device_id
         self.save()
 
+    def revoke_tokens(self):
+        '''
+        Invalidates every token issued to the user so far.
+        '''
+        from django.db import transaction
+        from libs.authentication import invalidate_user
+        User.objects.filter(pk=self.pk).update(token_version=models.F('token_version') + 1)
+        self.refresh_from_db(fields=['token_version'])
+        user_id = self.pk
+        transaction.on_commit(lambda: invalidate_user(user_id))
+
     def is_doctor(self):
-        return hasattr(self, 'doctor')
+        return self.role == User.Role.DOCTOR
 
     def is_patient(self):
-        return hasattr(self, 'patient')
+        return self.role == User.Role.PATIENT
 
     def is_admin(self):
-        return hasattr(self, 'moderator')
+        return self.role == User.Role.ADMIN
 
     @staticmethod
     def is_exists(phone):
@@ -199,24 +217,27 @@ class User(AbstractBaseUser, PermissionsMixin):
         self.thumb.save('%s_thumbnail.%s'%(os.path.splitext(suf.name)[0], FILE_EXTENSION), suf, save=False)
 
     def save(self, *args, **kwargs):
+        if self.role is None:
+            self.role = self.ROLE
         self.create_thumbnail()
         return super(User, self).save(*args, **kwargs)
 
 
 class Moderator(User):
-    role = models.IntegerField(default=User.Role.ADMIN)
+    ROLE = User.Role.ADMIN
 
 
 class Doctor(User):
-    role = models.IntegerField(default=User.Role.DOCTOR)
+    ROLE = User.Role.DOCTOR
     services = models.ManyToManyField(Service, related_name="doctor")
     specialization = models.ForeignKey(Specialization, related_name="doctor", blank=True, null=True)
     degree = models.CharField(_('degree'), max_length=50, blank=True, null=True)
     rating = models.DecimalField(max_digits=5, decimal_places=2)
 
     def calculate_rating(self):
-        rating = self.reviews.aggregate(Avg('rating'))
-        self.rating = rating['rating__avg']
+        from entities.appointment.models import DoctorCounter
+        from libs.counters import get_counter
+        self.rating = get_counter(DoctorCounter, self.id).rating
         self.save(update_fields=["rating"])
 
     def cancel_appointment_due_to_time_changed(self, day_number):
@@ -233,9 +254,9 @@ class Doctor(User):
             cancel_appointments_of_day_and_send_notify(date_to_cancel.date(), self.id)
             date_to_cancel = next_weekday(date_to_cancel, day_number)
 
-    def cancel_appointment_on_holiday(self, day):
-        from libs.quicklic_utils import cancel_appointments_of_day_and_send_notify
-        cancel_appointments_of_day_and_send_notify(day, self.id)
+    def cancel_appointments_on_leave(self, holiday):
+        from libs.quicklic_utils import discard_appointments_and_send_notify
+        discard_appointments_and_send_notify(self.id, holiday.start_datetime, holiday.end_datetime)
 
     @property
     def formatted_address(self):
@@ -253,6 +274,13 @@ class Doctor(User):
         return ",".join(self.clinic.all().values_list('name', flat=True))
 
 
+def validate_breaks(value):
+    try:
+        parse_breaks(value)
+    except ValueError:
+        raise ValidationError(_('Breaks should be day:HH:MM-HH:MM separated by commas, e.g. 0:13:00-14:00'))
+
+
 class DoctorSetting(models.Model):
     physician = models.ForeignKey(Doctor, related_name='settings')
     slot_time = models.IntegerField(db_index=True, default=10)
@@ -272,119 +300,87 @@ class DoctorSetting(models.Model):
     sunday_start = models.TimeField(blank=True, null=True)
     sunday_end = models.TimeField(blank=True, null=True)
 
+    breaks = models.CharField(max_length=255, blank=True, default="", validators=[validate_breaks],
+                              help_text=_('Breaks as day:HH:MM-HH:MM separated by commas, e.g. 0:13:00-14:00'))
+
     def __str__(self):
         return self.physician.get_full_name()
 
+    def save(self, *args, **kwargs):
+        self.__dict__.pop('schedule', None)
+        return super(DoctorSetting, self).save(*args, **kwargs)
+
+    @cached_property
+    def schedule(self):
+        """
+        Compact weekly schedule, built once per setting instance.
+        """
+        return WeeklySchedule.from_setting(self)
+
     def get_day_timings(self, day_number):
         """
         method will return day timings by getting a number
 
         MONDAY 0, TUESDAY 1, WEDNESDAY 2, THURSDAY 3, FRIDAY 4, SATURDAY 5, SUNDAY 6
         """
-
-        if day_number == 0:
-            return self.monday_start, self.monday_end
-        elif day_number == 1:
-            return self.tuesday_start, self.tuesday_end
-        elif day_number == 2:
-            return self.wednesday_start, self.wednesday_end
-        elif day_number == 3:
-            return self.thursday_start, self.thursday_end
-        elif day_number == 4:
-            return self.friday_start, self.friday_end
-        elif day_number == 5:
-            return self.saturday_start, self.saturday_end
-        elif day_number == 6:
-            return self.sunday_start, self.sunday_end
+        return self.schedule.get_day_timings(day_number)
 
     def get_timings_with_switch(self):
-        return {
-            "monday": {
-                "switch": True if self.monday_start and self.monday_end else False,
-                "start": "{:02d}:{:02d}".format(self.monday_start.hour, self.monday_start.minute) if self.monday_start else "00:00",
-                "end": "{:02d}:{:02d}".format(self.monday_end.hour, self.monday_end.minute) if self.monday_end else "00:00",
-            },
-            "tuesday": {
-                "switch": True if self.tuesday_start and self.tuesday_end else False,
-                "start": "{:02d}:{:02d}".format(self.tuesday_start.hour, self.tuesday_start.minute) if self.tuesday_start else "00:00",
-                "end": "{:02d}:{:02d}".format(self.tuesday_end.hour, self.tuesday_end.minute) if self.tuesday_end else "00:00",
-            },
-            "wednesday": {
-                "switch": True if self.wednesday_start and self.wednesday_end else False,
-                "start": "{:02d}:{:02d}".format(self.wednesday_start.hour, self.wednesday_start.minute) if self.wednesday_start else "00:00",
-                "end": "{:02d}:{:02d}".format(self.wednesday_end.hour, self.wednesday_end.minute) if self.wednesday_end else "00:00",
-            },
-            "thursday": {
-                "switch": True if self.thursday_start and self.thursday_end else False,
-                "start": "{:02d}:{:02d}".format(self.thursday_start.hour, self.thursday_start.minute) if self.thursday_start else "00:00",
-                "end": "{:02d}:{:02d}".format(self.thursday_end.hour, self.thursday_end.minute) if self.thursday_end else "00:00",
-            },
-            "friday": {
-                "switch": True if self.friday_start and self.friday_end else False,
-                "start": "{:02d}:{:02d}".format(self.friday_start.hour, self.friday_start.minute) if self.friday_start else "00:00",
-                "end": "{:02d}:{:02d}".format(self.friday_end.hour, self.friday_end.minute) if self.friday_end else "00:00",
-            },
-            "saturday": {
-                "switch": True if self.saturday_start and self.saturday_end else False,
-                "start": "{:02d}:{:02d}".format(self.saturday_start.hour, self.saturday_start.minute) if self.saturday_start else "00:00",
-                "end": "{:02d}:{:02d}".format(self.saturday_end.hour, self.saturday_end.minute) if self.saturday_end else "00:00",
-            },
-            "sunday": {
-                "switch": True if self.sunday_start and self.sunday_end else False,
-                "start": "{:02d}:{:02d}".format(self.sunday_start.hour, self.sunday_start.minute) if self.sunday_start else "00:00",
-                "end": "{:02d}:{:02d}".format(self.sunday_end.hour, self.sunday_end.minute) if self.sunday_end else "00:00",
+        """
+        Stored working hours of the days for the form, the breaks are given on their own.
+        """
+        timings = {}
+        for day in DAYS:
+            start = to_minutes(getattr(self, "{}_start".format(day)))
+            end = to_minutes(getattr(self, "{}_end".format(day)))
+            switch = start is not None and end is not None and start < end
+            timings[day] = {
+                "switch": switch,
+                "start": format_minutes(start) if switch else "00:00",
+                "end": format_minutes(end) if switch else "00:00",
             }
-        }
+        timings["breaks"] = self.schedule.get_breaks()
+        return timings
 
     def get_timings_list(self):
-        return [
-            {
-                "day": "Monday",
-                "start": self.monday_start,
-                "end": self.monday_end,
-            },
-            {
-                "day": "Tuesday",
-                "start": self.tuesday_start,
-                "end": self.tuesday_end,
-            },
-            {
-                "day": "Wednesday",
-                "start": self.wednesday_start,
-                "end": self.wednesday_end,
-            },
-            {
-                "day": "Thursday",
-                "start": self.thursday_start,
-                "end": self.thursday_end,
-            },
-            {
-                "day": "Friday",
-                "start": self.friday_start,
-                "end": self.friday_end,
-            },
-            {
-                "day": "Saturday",
-                "start": self.saturday_start,
-                "end": self.saturday_end,
-            },
-            {
-                "day": "Sunday",
-                "start": self.sunday_start,
-                "end": self.sunday_end,
-            },
-
-        ]
+        timings = []
+        for day_number, day in enumerate(DAYS):
+            start, end = self.schedule.get_day_timings(day_number)
+            timings.append({
+                "day": day.capitalize(),
+                "start": start,
+                "end": end,
+            })
+        return timings
 
 
 class DoctorHoliday(models.Model):
+    """
+    Leave of a doctor from start_datetime to end_datetime, both inclusive. A leave can
+    span multiple days or part of a day, day is the first day of the leave.
+
+    Without start_datetime and end_datetime the whole day is off.
+    """
     physician = models.ForeignKey(Doctor, related_name='holidays')
     day = models.DateField()
+    start_datetime = models.DateTimeField(blank=True)
+    end_datetime = models.DateTimeField(blank=True)
     notes = models.TextField(default="")
 
+    class Meta:
+        index_together = (('physician', 'start_datetime', 'end_datetime'),)
+
     def __str__(self):
         return self.physician.get_full_name()
 
+    def save(self, *args, **kwargs):
+        if self.start_datetime is None:
+            self.start_datetime = datetime.datetime.combine(self.day, datetime.time.min)
+        if self.end_datetime is None:
+            self.end_datetime = datetime.datetime.combine(self.start_datetime.date(), datetime.time(23, 59, 59))
+        self.day = self.start_datetime.date()
+        return super(DoctorHoliday, self).save(*args, **kwargs)
+
 
 class Patient(User):
     class MaritalStatus:
@@ -396,7 +392,8 @@ class Patient(User):
             (SINGLE, 'SINGLE'),
         )
 
-    role = models.IntegerField(default=User.Role.PATIENT)
+    ROLE = User.Role.PATIENT
+
     height = models.FloatField(_('height'), blank=True, null=True)
     weight = models.FloatField(_('weight'), blank=True, null=True)
     occupation = models.ForeignKey(Occupation, related_name="patient", blank=True, null=True)
@@ -434,3 +431,81 @@ class VerificationCode(models.Model):
         else:
             verification_code = VerificationCode.objects.create(user=user, code=get_verification_code())
             return verification_code.code
+
+
+class RevokedToken(models.Model):
+    """
+    Token revoked before its expiry, see libs.revocation.
+    """
+    token_id = models.CharField(max_length=64, unique=True)
+    user_id = models.IntegerField(db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.token_id
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Moderator)
+@receiver(post_delete, sender=Moderator)
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def update_version_on_user_change(sender, instance, **kwargs):
+    from libs.table_versions import bump_rows
+    bump_rows(User, [instance.pk])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Moderator)
+@receiver(post_delete, sender=Moderator)
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def invalidate_authentication_on_user_change(sender, instance, **kwargs):
+    from django.db import transaction
+    from libs.authentication import invalidate_user
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+@receiver(m2m_changed, sender=User.clinic.through)
+@receiver(m2m_changed, sender=Doctor.services.through)
+def update_version_on_user_relations_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    from libs.table_versions import bump_rows, bump_table
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_rows(User, [instance.pk])
+    elif pk_set:
+        bump_rows(User, pk_set)
+    else:
+        # cleared from the other side, the users are unknown by now
+        bump_table(instance.__class__)
+
+
+@receiver(m2m_changed, sender=User.clinic.through)
+def update_clinic_membership_on_change(sender, instance, action, reverse, pk_set, **kwargs):
+    from libs.clinic_membership import invalidate_users
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_users([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_users(instance.user.values_list('id', flat=True))
+    else:
+        invalidate_users(pk_set)
+
+
+@receiver(pre_delete, sender=User)
+@receiver(pre_delete, sender=Moderator)
+@receiver(pre_delete, sender=Doctor)
+@receiver(pre_delete, sender=Patient)
+def update_clinic_membership_on_user_delete(sender, instance, **kwargs):
+    from libs.clinic_membership import invalidate_users
+    invalidate_users([instance.pk])
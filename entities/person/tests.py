@@ -0,0 +1,91 @@
+from datetime import date, datetime, time, timedelta
+
+from django.core.exceptions import ValidationError
+from django.forms import modelform_factory
+from django.test import TestCase
+
+from entities.person.models import DoctorHoliday, DoctorSetting
+from libs.fixtures import ClinicFixtureMixin
+from libs.leave import LeaveIndex
+from libs.schedule import WeeklySchedule
+
+
+class DoctorSettingTest(ClinicFixtureMixin, TestCase):
+    """
+    Breaks are validated and kept out of the working hours shown in the form.
+    """
+    def test_breaks_validation(self):
+        setting = DoctorSetting(physician=self.doctor, clinic=self.clinic, breaks="0:13:00-14:00,4:12:00-12:30")
+        setting.full_clean()
+        for breaks in ("13:00-14:00", "0:14:00-13:00", "7:13:00-14:00", "0:13:00"):
+            setting.breaks = breaks
+            with self.assertRaises(ValidationError):
+                setting.full_clean()
+
+    def test_timings_with_switch(self):
+        setting = DoctorSetting.objects.create(physician=self.doctor, clinic=self.clinic, monday_start=time(9),
+                                               monday_end=time(17), breaks="0:09:00-10:00,0:16:00-17:00")
+        timings = setting.get_timings_with_switch()
+        self.assertEqual(timings['monday'], {"switch": True, "start": "09:00", "end": "17:00"})
+        self.assertEqual(timings['tuesday'], {"switch": False, "start": "00:00", "end": "00:00"})
+        self.assertEqual(timings['breaks'], "0:09:00-10:00,0:16:00-17:00")
+        self.assertEqual(setting.schedule.get_ranges(0), ((10 * 60, 16 * 60),))
+
+    def test_weekly_schedule(self):
+        setting = DoctorSetting(physician=self.doctor, clinic=self.clinic, monday_start=time(9), monday_end=time(17),
+                                tuesday_start=time(9), tuesday_end=time(9), breaks="0:12:00-13:00,0:15:00-15:30")
+        schedule = setting.schedule
+        self.assertEqual(schedule.get_ranges(0), ((9 * 60, 12 * 60), (13 * 60, 15 * 60), (15 * 60 + 30, 17 * 60)))
+        self.assertEqual(schedule.get_day_timings(0), (time(9), time(17)))
+        self.assertFalse(schedule.is_working(1))
+        self.assertEqual(schedule.get_day_timings(6), (None, None))
+
+        setting.breaks = "0:12:00-13:00"
+        setting.wednesday_start, setting.wednesday_end = time(10), time(11)
+        setting.save()
+        self.assertEqual(schedule.diff(setting.schedule), [0, 2])
+        self.assertEqual(setting.schedule, WeeklySchedule.from_setting(setting))
+
+
+class LeaveTest(ClinicFixtureMixin, TestCase):
+    """
+    Leaves are whole days unless timed, and merged into an index per doctor.
+    """
+    DAY = date(2030, 1, 7)
+
+    def at(self, hour, minute=0, second=0, days=0):
+        return datetime.combine(self.DAY + timedelta(days=days), time(hour, minute, second))
+
+    def make_leave(self, start, end):
+        return DoctorHoliday(physician=self.doctor, day=start.date(), start_datetime=start, end_datetime=end)
+
+    def test_whole_day_without_times(self):
+        form = modelform_factory(DoctorHoliday, fields='__all__')({'physician': self.doctor.id, 'day': self.DAY,
+                                                                    'notes': 'Off'})
+        self.assertTrue(form.is_valid(), form.errors)
+        leave = form.save()
+        self.assertEqual((leave.start_datetime, leave.end_datetime), (self.at(0), self.at(23, 59, 59)))
+
+    def test_leave_index(self):
+        leaves = LeaveIndex([
+            self.make_leave(self.at(14), self.at(23, 59, 59)),
+            self.make_leave(self.at(0, days=1), self.at(23, 59, 59, days=2)),
+            self.make_leave(self.at(9, days=4), self.at(10, days=4)),
+        ])
+        # the first two follow each other within a second
+        self.assertEqual(len(leaves.intervals), 2)
+        self.assertFalse(leaves.is_day_off(self.DAY))
+        self.assertTrue(leaves.is_day_off(self.DAY + timedelta(days=1)))
+        self.assertTrue(leaves.is_day_off(self.DAY + timedelta(days=2)))
+        self.assertFalse(leaves.is_day_off(self.DAY + timedelta(days=4)))
+
+        self.assertTrue(leaves.is_off(self.at(14)))
+        self.assertFalse(leaves.is_off(self.at(13, 59, 59)))
+        self.assertTrue(leaves.overlaps(self.at(13), self.at(14)))
+        self.assertFalse(leaves.overlaps(self.at(10, 0, 1, days=4), self.at(11, days=4)))
+        self.assertEqual(leaves.get_intervals(self.at(8, days=4), self.at(12, days=4)),
+                         [(self.at(9, days=4), self.at(10, days=4))])
+        self.assertEqual(leaves.get_intervals(self.at(12, days=2), self.at(9, 30, days=4)), [
+            (self.at(12, days=2), self.at(23, 59, 59, days=2)),
+            (self.at(9, days=4), self.at(9, 30, days=4)),
+        ])
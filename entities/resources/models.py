@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
 
@@ -36,3 +38,16 @@ class AppointmentReason(models.Model):
 
     def __str__(self):
         return self.name
+
+
+@receiver(post_save, sender=Specialization)
+@receiver(post_delete, sender=Specialization)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Occupation)
+@receiver(post_delete, sender=Occupation)
+@receiver(post_save, sender=AppointmentReason)
+@receiver(post_delete, sender=AppointmentReason)
+def update_version_on_change(sender, **kwargs):
+    from libs.table_versions import bump_table
+    bump_table(sender)
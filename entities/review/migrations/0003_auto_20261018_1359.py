@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 13:59
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('person', '0015_doctorholiday_range'),
+        ('clinic', '0007_auto_20180315_1431'),
+        ('review', '0002_auto_20171113_1831'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='review',
+            index_together=set([('doctor', 'created_at', 'id'), ('creator', 'created_at', 'id'), ('clinic', 'created_at', 'id')]),
+        ),
+    ]
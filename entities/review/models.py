@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import pre_save, post_save, pre_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 from entities.clinic.models import Clinic
 from entities.person.models import Patient, Doctor
@@ -26,6 +28,34 @@ class Review(models.Model):
     doctor = models.ForeignKey(Doctor, related_name='reviews', blank=True, null=True)
     clinic = models.ForeignKey(Clinic, related_name='reviews', blank=True, null=True)
 
+    class Meta:
+        index_together = (
+            ('doctor', 'created_at', 'id'),
+            ('clinic', 'created_at', 'id'),
+            ('creator', 'created_at', 'id'),
+        )
+
     def __str__(self):
         return str(self.rating)
 
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = Review.objects.filter(pk=instance.pk).\
+            values_list('doctor_id', 'clinic_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def update_counters_on_review_saved(sender, instance, **kwargs):
+    from libs.counters import count_reviews
+    count_reviews([(getattr(instance, '_previous_rating', None), (instance.doctor_id, instance.clinic_id, instance.rating))])
+
+
+@receiver(pre_delete, sender=Review)
+def update_counters_on_review_removed(sender, instance, **kwargs):
+    from libs.counters import count_reviews
+    previous = Review.objects.filter(pk=instance.pk).values_list('doctor_id', 'clinic_id', 'rating').first()
+    if previous:
+        count_reviews([(previous, None)])
@@ -1,10 +1,220 @@
+"""
+JWT authentication of the API.
+
+Tokens carry the id, role and token version of their user as claims. A token is checked
+against the state of its user, the token version and whether the user is active, kept
+in the shared cache, so requests are authenticated without loading the user:
+request.user is a TokenUser answering the id, the role and the role checks from the
+claims and loading the user only when anything else is read. User.revoke_tokens()
+bumps the token version and invalidates every token issued before.
+
+Tokens are verified and decoded once per process, then kept with the column values of
+their user once loaded in a per-process LRU cache keyed by the token for
+AUTH_CACHE_TIMEOUT seconds, at most until the token expires. Every request gets a user
+instance of its own. Saving or deleting a user drops its entries in this process and
+its state in the shared cache once committed, so other processes see revocations and
+deactivations at once and the columns of the user once their entries time out.
+
+Tokens issued before the claims only carry the phone, their user is loaded by it.
+Revoked tokens are rejected, see libs.revocation.
+
+- AUTH_CACHE_ENABLED: Cache the users of tokens
+- AUTH_CACHE_SIZE: Max No. of tokens cached per process
+- AUTH_CACHE_TIMEOUT: No. of seconds a token's user is cached
+- AUTH_STATE_ALIAS: Alias of the cache in CACHES keeping the states of users, shared between processes
+- AUTH_STATE_TIMEOUT: No. of seconds the state of a user is cached
+"""
+import threading
+import time
+from collections import OrderedDict
+
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router
+from django.utils.deprecation import CallableFalse, CallableTrue
+from django.utils.functional import SimpleLazyObject
 from rest_framework import authentication
 from rest_framework import exceptions
+
 from libs.jwt_helper import JWTHelper
+from libs.revocation import get_token_id, is_revoked
+from quicklic_backend import settings
 
 User = get_user_model()
 
+AUTH_CACHE_ENABLED = getattr(settings, 'AUTH_CACHE_ENABLED', True)
+AUTH_CACHE_SIZE = getattr(settings, 'AUTH_CACHE_SIZE', 1024)
+AUTH_CACHE_TIMEOUT = getattr(settings, 'AUTH_CACHE_TIMEOUT', 60)
+AUTH_STATE_ALIAS = getattr(settings, 'AUTH_STATE_ALIAS', 'default')
+AUTH_STATE_TIMEOUT = getattr(settings, 'AUTH_STATE_TIMEOUT', 300)
+
+
+class PrincipalCache(object):
+    """
+    Thread safe LRU cache of {token: [expiry, user id, claims, column values or None]}.
+    """
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, token):
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self.entries[token]
+                return None
+            self.entries.move_to_end(token)
+            return entry
+
+    def set(self, token, user_id, claims, values=None):
+        entry = [min(time.time() + self.timeout, claims.get('exp', 0)), user_id, claims, values]
+        with self.lock:
+            self.entries.pop(token, None)
+            self.entries[token] = entry
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, user_id):
+        with self.lock:
+            for token in [token for token, entry in self.entries.items() if entry[1] == user_id]:
+                del self.entries[token]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+principal_cache = PrincipalCache(AUTH_CACHE_SIZE, AUTH_CACHE_TIMEOUT)
+
+
+def _get_state_cache():
+    return caches[AUTH_STATE_ALIAS]
+
+
+def _state_key(user_id):
+    return "auth:state:{}".format(user_id)
+
+
+def get_user_state(user_id):
+    """
+    return (token version, is active) of the user, (None, False) if there is none.
+    """
+    cache = _get_state_cache()
+    key = _state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        row = User.objects.filter(pk=user_id).values_list('token_version', 'is_active').first()
+        state = tuple(row) if row else (None, False)
+        cache.add(key, state, AUTH_STATE_TIMEOUT)
+    return state
+
+
+def invalidate_user(user_id):
+    principal_cache.invalidate(user_id)
+    _get_state_cache().delete(_state_key(user_id))
+
+
+def _get_values(user):
+    return [getattr(user, field.attname) for field in User._meta.concrete_fields]
+
+
+def _from_values(values):
+    field_names = [field.attname for field in User._meta.concrete_fields]
+    return User.from_db(router.db_for_read(User), field_names, values)
+
+
+class TokenUser(SimpleLazyObject):
+    """
+    User of a token, with the id, the role and the role checks answered from the claims,
+    the user is loaded when anything else is read.
+    """
+    is_active = True
+    is_authenticated = CallableTrue
+    is_anonymous = CallableFalse
+
+    def __init__(self, user_id, role, loader):
+        self.__dict__['_claims'] = (user_id, role)
+        super(TokenUser, self).__init__(loader)
+
+    @property
+    def id(self):
+        return self._claims[0]
+
+    pk = id
+
+    @property
+    def role(self):
+        return self._claims[1]
+
+    def is_doctor(self):
+        return self.role == User.Role.DOCTOR
+
+    def is_patient(self):
+        return self.role == User.Role.PATIENT
+
+    def is_admin(self):
+        return self.role == User.Role.ADMIN
+
+
+def _load_user(entry):
+    """
+    return user of the cache entry, from its column values once loaded.
+    """
+    if entry[3] is None:
+        user = User.objects.filter(pk=entry[1]).first()
+        if user is None:
+            raise exceptions.AuthenticationFailed('No such user')
+        entry[3] = _get_values(user)
+        return user
+    return _from_values(entry[3])
+
+
+def _get_phone_user(token, claims):
+    user = User.objects.filter(phone=claims.get('phone')).first()
+    if user is None:
+        raise exceptions.AuthenticationFailed('No such user')
+    if not user.is_active:
+        raise exceptions.AuthenticationFailed('User inactive or deleted')
+    if AUTH_CACHE_ENABLED:
+        principal_cache.set(token, user.pk, claims, _get_values(user))
+    return user
+
+
+def get_token_user(token):
+    """
+    return user of the token, raises AuthenticationFailed if there is none.
+    """
+    entry = principal_cache.get(token) if AUTH_CACHE_ENABLED else None
+    if entry is None:
+        claims, message = JWTHelper.read_token(token)
+        if claims is None:
+            raise exceptions.AuthenticationFailed(message)
+    else:
+        claims = entry[2]
+    if is_revoked(get_token_id(token, claims)):
+        raise exceptions.AuthenticationFailed('Token Revoked')
+
+    if entry is None:
+        if 'id' not in claims:
+            return _get_phone_user(token, claims)
+        entry = principal_cache.set(token, claims['id'], claims) if AUTH_CACHE_ENABLED else \
+            [None, claims['id'], claims, None]
+    elif 'id' not in claims:
+        return _from_values(entry[3])
+
+    user_id = entry[1]
+    version, is_active = get_user_state(user_id)
+    if version != claims.get('ver'):
+        raise exceptions.AuthenticationFailed('Token Revoked')
+    if not is_active:
+        raise exceptions.AuthenticationFailed('User inactive or deleted')
+    return TokenUser(user_id, claims.get('role'), lambda: _load_user(entry))
+
 
 class UserAuthentication(authentication.BaseAuthentication):
     def authenticate(self, request):
@@ -12,13 +222,5 @@ class UserAuthentication(authentication.BaseAuthentication):
             token = request.META.get('HTTP_AUTHORIZATION').replace("Bearer ", "")
             if not token:
                 raise exceptions.AuthenticationFailed('No token provided')
-            is_valid, message = JWTHelper.is_token_valid(token)
-            if is_valid:
-                phone = JWTHelper.decode_token(token)
-                try:
-                    user = User.objects.get(phone=phone)
-                except User.DoesNotExist:
-                    raise exceptions.AuthenticationFailed('No such user')
-                return user, None
-            raise exceptions.AuthenticationFailed(message)
-        raise exceptions.AuthenticationFailed('No token provided')
\ No newline at end of file
+            return get_token_user(token), token
+        raise exceptions.AuthenticationFailed('No token provided')
@@ -0,0 +1,186 @@
+"""
+Availability engine for doctor appointment slots.
+
+The engine takes a doctor's clinic setting, holidays and appointments and
+answers which slots of a day are still free. Appointments are turned into a sorted
+index of merged busy intervals once, after that every day is resolved with a single
+linear sweep over its slots, so a day costs O(slots + appointments).
+"""
+import heapq
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from libs.leave import LeaveIndex
+from libs.utils import get_interval_between_time
+
+
+def build_busy_index(intervals):
+    """
+    Merge (start, end) intervals into a sorted list of disjoint busy intervals.
+
+    Intervals are treated as closed, two intervals touching each other on a
+    boundary are merged as well.
+    """
+    busy = []
+    for start, end in sorted(intervals):
+        if busy and start <= busy[-1][1]:
+            if end > busy[-1][1]:
+                busy[-1][1] = end
+        else:
+            busy.append([start, end])
+    return busy
+
+
+def mark_slots(slots, busy):
+    """
+    Sweep sorted slots against the sorted busy index and mark overlapping slots
+    as unavailable. Both lists are walked once.
+    """
+    index = 0
+    for slot in slots:
+        while index < len(busy) and busy[index][1] < slot['start']:
+            index += 1
+        if index < len(busy) and busy[index][0] <= slot['end']:
+            slot['available'] = False
+    return slots
+
+
+def build_engines(settings, holidays, appointments):
+    """
+    Create an engine for every setting, holidays and appointments are grouped by doctor
+    so they can be read with a single query each for all the doctors.
+    """
+    holidays_by_doctor = {}
+    for holiday in holidays:
+        holidays_by_doctor.setdefault(holiday.physician_id, []).append(holiday)
+
+    appointments_by_doctor = {}
+    for appointment in appointments:
+        appointments_by_doctor.setdefault(appointment.doctor_id, []).append(appointment)
+
+    # a doctor has one schedule per clinic, the first setting wins
+    settings_by_key = OrderedDict()
+    for setting in settings:
+        settings_by_key.setdefault((setting.physician_id, setting.clinic_id), setting)
+
+    return [
+        AvailabilityEngine(
+            setting,
+            holidays_by_doctor.get(setting.physician_id, []),
+            appointments_by_doctor.get(setting.physician_id, []),
+        ) for setting in settings_by_key.values()
+    ]
+
+
+def find_earliest_slots(engines, start_day, end_day, limit, not_before=None):
+    """
+    return the earliest `limit` available slots across all engines as
+    (start, doctor_id, clinic_id, slot) tuples.
+
+    Every engine yields its free slots lazily in order and the streams are merged on a
+    heap, so days are only computed as far as needed to fill the limit.
+    """
+    streams = [engine.iter_available_slots(start_day, end_day, not_before) for engine in engines]
+    earliest = []
+    # ties are taken in the order of the engines, the slot dicts are never compared
+    for item in heapq.merge(*streams, key=lambda item: item[:3]):
+        earliest.append(item)
+        if len(earliest) >= limit:
+            break
+    return earliest
+
+
+class AvailabilityEngine:
+    """
+    Computes appointment slots of a doctor for a clinic.
+
+    - setting: DoctorSetting of the doctor for the clinic, its schedule can have multiple ranges a day
+    - holidays: iterable of DoctorHoliday, days fully on leave have no slots and slots
+      overlapping a partial day leave are unavailable
+    - appointments: iterable of Appointment, canceled ones should be excluded by the caller
+
+    Holidays and appointments are only read when the first working day is asked for.
+    """
+
+    def __init__(self, setting, holidays, appointments):
+        self.setting = setting
+        self.holidays = holidays
+        self.appointments = appointments
+        self._leaves = None
+        self._busy_index = None
+
+    def _build_index(self):
+        self._leaves = LeaveIndex(self.holidays)
+
+        appointments_by_day = {}
+        for appointment in self.appointments:
+            day = appointment.start_datetime.date()
+            appointments_by_day.setdefault(day, []).append(
+                (appointment.start_datetime, appointment.end_datetime)
+            )
+        self._busy_index = {day: build_busy_index(intervals) for day, intervals in appointments_by_day.items()}
+
+    def is_holiday(self, day):
+        if self._leaves is None:
+            self._build_index()
+        return self._leaves.is_day_off(day)
+
+    def get_working_slots(self, day):
+        """
+        return slots of the working hours of the given date marked against the
+        appointments and partial day leaves, days fully on leave are not taken into account.
+        """
+        time_ranges = self.setting.schedule.get_time_ranges(day.weekday())
+        if not time_ranges:
+            return []
+
+        if self._busy_index is None:
+            self._build_index()
+
+        slots = []
+        for start_time, end_time in time_ranges:
+            # a slot has to end within its range to be bookable, see libs.booking
+            range_end = datetime.combine(day, end_time)
+            slots.extend(slot for slot in get_interval_between_time(start_time, end_time, self.setting.slot_time,
+                                                                    str(day)) if slot['end'] < range_end)
+        mark_slots(slots, self._busy_index.get(day, []))
+        if self._leaves and slots:
+            mark_slots(slots, self._leaves.get_intervals(slots[0]['start'], slots[-1]['end']))
+        return slots
+
+    def get_day_slots(self, day):
+        """
+        return slots of the given date with their availability.
+        """
+        if not self.setting.schedule.is_working(day.weekday()):
+            return []
+
+        if self.is_holiday(day):
+            return []
+
+        return self.get_working_slots(day)
+
+    def get_range_slots(self, start_day, end_day):
+        """
+        return slots for every date between start_day and end_day, both inclusive.
+        """
+        days = []
+        day = start_day
+        while day <= end_day:
+            days.append({
+                "date": day,
+                "slots": self.get_day_slots(day),
+            })
+            day += timedelta(days=1)
+        return days
+
+    def iter_available_slots(self, start_day, end_day, not_before=None):
+        """
+        yield (start, doctor_id, clinic_id, slot) for available slots in chronological order.
+        """
+        day = start_day
+        while day <= end_day:
+            for slot in self.get_day_slots(day):
+                if slot['available'] and (not_before is None or slot['start'] >= not_before):
+                    yield slot['start'], self.setting.physician_id, self.setting.clinic_id, slot
+            day += timedelta(days=1)
@@ -0,0 +1,131 @@
+"""
+Versioned cache for appointment slot availability.
+
+Slots are cached per (doctor, clinic, date). Entries are never deleted, instead the
+key embeds two version counters that are bumped by anything changing availability:
+
+- doctor version: DoctorSetting changes
+- day version: Appointment and DoctorHoliday changes of the doctor for the date
+
+Versions are bumped once the change is committed, a request reading the versions
+before that could otherwise cache the rows of before the change under the new key.
+
+- AVAILABILITY_CACHE_ENABLED: Cache slot availability
+- AVAILABILITY_CACHE_ALIAS: Alias of the cache in CACHES to use
+- AVAILABILITY_CACHE_TIMEOUT: No. of seconds entries live
+"""
+import time
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.db import transaction
+
+from quicklic_backend import settings
+
+AVAILABILITY_CACHE_ENABLED = getattr(settings, 'AVAILABILITY_CACHE_ENABLED', True)
+AVAILABILITY_CACHE_ALIAS = getattr(settings, 'AVAILABILITY_CACHE_ALIAS', 'default')
+AVAILABILITY_CACHE_TIMEOUT = getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 300)
+
+
+def _get_cache():
+    return caches[AVAILABILITY_CACHE_ALIAS]
+
+
+def _doctor_version_key(doctor_id):
+    return "availability:version:{}".format(doctor_id)
+
+
+def _day_version_key(doctor_id, day):
+    return "availability:version:{}:{}".format(doctor_id, day)
+
+
+def _entry_key(doctor_id, clinic_id, day, doctor_version, day_version):
+    return "availability:{}:{}:{}:{}:{}".format(doctor_id, clinic_id, day, doctor_version, day_version)
+
+
+def _new_version():
+    """
+    Versions start from the current time so a counter evicted from the cache never
+    restarts at a value older entries were stored with.
+    """
+    return int(time.time() * 1000)
+
+
+def _bump(keys):
+    transaction.on_commit(lambda: _incr_versions(keys))
+
+
+def _incr_versions(keys):
+    cache = _get_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _new_version(), None)
+
+
+def _get_versions(keys):
+    cache = _get_cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, _new_version(), None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def get_cached_days(doctor_id, clinic_id, days):
+    """
+    return cached slots as {date: slots} and the entry keys of all the days.
+
+    The entry keys have to be read before computing the missing days and passed to
+    set_cached_days, a change in between then only leaves an unreachable entry behind.
+    """
+    if not AVAILABILITY_CACHE_ENABLED:
+        return {}, {}
+
+    doctor_key = _doctor_version_key(doctor_id)
+    day_keys = {day: _day_version_key(doctor_id, day) for day in days}
+    versions = _get_versions([doctor_key] + list(day_keys.values()))
+
+    entry_keys = {
+        day: _entry_key(doctor_id, clinic_id, day, versions.get(doctor_key), versions.get(day_key))
+        for day, day_key in day_keys.items()
+    }
+    entries = _get_cache().get_many(list(entry_keys.values()))
+    cached = {day: entries[key] for day, key in entry_keys.items() if key in entries}
+    return cached, entry_keys
+
+
+def set_cached_days(entry_keys, slots_by_day):
+    if not AVAILABILITY_CACHE_ENABLED:
+        return
+
+    _get_cache().set_many(
+        {entry_keys[day]: slots for day, slots in slots_by_day.items() if day in entry_keys},
+        AVAILABILITY_CACHE_TIMEOUT
+    )
+
+
+def invalidate_doctor(doctor_id):
+    if AVAILABILITY_CACHE_ENABLED:
+        _bump([_doctor_version_key(doctor_id)])
+
+
+def invalidate_days(doctor_id, days):
+    if AVAILABILITY_CACHE_ENABLED:
+        _bump([_day_version_key(doctor_id, day) for day in set(days)])
+
+
+def invalidate_windows(doctor_id, windows):
+    """
+    windows: (start, end) datetime tuples, every date they touch is invalidated.
+    """
+    days = []
+    for start, end in windows:
+        day = start.date()
+        while day <= end.date():
+            days.append(day)
+            day += timedelta(days=1)
+    invalidate_days(doctor_id, days)
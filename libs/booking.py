@@ -0,0 +1,214 @@
+"""
+Booking pipeline for appointments.
+
+A booking runs in one short transaction holding a per doctor lock:
+
+1. lock the doctor, postgres advisory lock or the doctor row on other databases
+2. validate the time against the doctor's schedule for the clinic and leaves
+3. check no other appointment of the doctor overlaps the time
+4. insert the appointment and derive its qid from the primary key
+
+A batch of appointments, e.g. a weekly series, is validated and inserted the same way
+with a constant number of queries.
+
+Concurrent bookings of the same doctor wait on the lock, so the overlap check always
+sees committed appointments and exactly one of them gets a slot. Bookings of different
+doctors do not block each other. Push notifications are sent after commit.
+"""
+import uuid
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, Concat
+
+from entities.appointment.models import Appointment
+from entities.person.models import Doctor, DoctorSetting
+from libs.custom_exceptions import DoctorUnavailableException, SlotAlreadyBookedException, InvalidDateTimeException
+from libs.availability import build_busy_index, mark_slots
+from libs.availability_cache import invalidate_windows
+from libs.counters import count_status_changes
+from libs.leave import LeaveIndex, get_leaves
+from libs.schedule import to_minutes
+from libs.slot_inventory import on_appointment_changed
+
+BOOKING_LOCK_NAMESPACE = 1
+QID_CODE_OFFSET = 10000
+
+
+def lock_doctor(doctor_id):
+    """
+    Block until no other booking of the doctor is in progress, released on commit.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [BOOKING_LOCK_NAMESPACE, doctor_id])
+    else:
+        list(Doctor.objects.select_for_update().filter(pk=doctor_id).values_list('id', flat=True))
+
+
+def get_qid(patient_id, doctor_id, appointment_id):
+    """
+    qid is unique as long as the appointment id is, the offset keeps the codes clear of
+    the 4 digit random codes of older appointments.
+    """
+    return "{}-{}-{}".format(patient_id, doctor_id, appointment_id + QID_CODE_OFFSET)
+
+
+def validate_slots(doctor_id, clinic_id, windows, exclude_id=None):
+    """
+    Check every (start, end) window is within one of the doctor's working hours at the
+    clinic and free, the windows must not overlap each other either.
+
+    All the windows are checked with a query each for the setting, leaves and
+    appointments. Should be called with the doctor locked, raises
+    DoctorUnavailableException or SlotAlreadyBookedException.
+    """
+    windows = sorted(windows)
+    for start, end in windows:
+        if end <= start:
+            raise InvalidDateTimeException()
+
+    setting = DoctorSetting.objects.filter(physician_id=doctor_id, clinic_id=clinic_id).first()
+    if not setting:
+        raise DoctorUnavailableException()
+
+    for start, end in windows:
+        # the end in minutes since the midnight of the start, past 1440 on the next day
+        start_minutes = to_minutes(start.time())
+        end_minutes = start_minutes + (end - start).total_seconds() / 60
+        if not any(range_start <= start_minutes and end_minutes <= range_end for range_start, range_end in
+                   setting.schedule.get_ranges(start.weekday())):
+            raise DoctorUnavailableException()
+
+    leaves = LeaveIndex(get_leaves([doctor_id], windows[0][0], max(end for start, end in windows)))
+    if any(leaves.overlaps(start, end) for start, end in windows):
+        raise DoctorUnavailableException()
+
+    for (previous_start, previous_end), (start, end) in zip(windows, windows[1:]):
+        if start <= previous_end:
+            raise SlotAlreadyBookedException()
+
+    appointments = Appointment.objects.filter(
+        doctor_id=doctor_id,
+        start_datetime__lte=windows[-1][1],
+        end_datetime__gte=windows[0][0],
+    ).exclude(status=Appointment.Status.CANCEL)
+    if exclude_id:
+        appointments = appointments.exclude(pk=exclude_id)
+    if len(windows) == 1:
+        if appointments.exists():
+            raise SlotAlreadyBookedException()
+        return
+
+    slots = [{"start": start, "end": end, "available": True} for start, end in windows]
+    mark_slots(slots, build_busy_index(appointments.values_list('start_datetime', 'end_datetime')))
+    if not all(slot['available'] for slot in slots):
+        raise SlotAlreadyBookedException()
+
+
+def validate_slot(doctor_id, clinic_id, start, end, exclude_id=None):
+    validate_slots(doctor_id, clinic_id, [(start, end)], exclude_id)
+
+
+def expand_recurrence(start, end, days, count=None, until=None, limit=None):
+    """
+    return (start, end) windows repeating every `days` days, `count` times or up to
+    and including the `until` date. At most `limit` + 1 windows are returned so the
+    caller can tell the limit was exceeded.
+    """
+    windows = []
+    step = timedelta(days=days)
+    while (count is None or len(windows) < count) and (until is None or start.date() <= until):
+        windows.append((start, end))
+        if limit is not None and len(windows) > limit:
+            break
+        start, end = start + step, end + step
+    return windows
+
+
+def book_appointment(on_commit=None, **fields):
+    """
+    Create an appointment with the fields after reserving its slot.
+
+    on_commit: optional callable receiving the appointment, run after the transaction commits.
+    """
+    with transaction.atomic():
+        lock_doctor(fields['doctor'].id)
+        validate_slot(fields['doctor'].id, fields['clinic'].id, fields['start_datetime'], fields['end_datetime'])
+
+        appointment = Appointment(**fields)
+        # placeholder for the unique column until the id is known
+        appointment.qid = uuid.uuid4().hex
+        appointment.save()
+
+        appointment.qid = get_qid(appointment.patient_id, appointment.doctor_id, appointment.id)
+        Appointment.objects.filter(pk=appointment.pk).update(qid=appointment.qid)
+
+        if on_commit:
+            transaction.on_commit(lambda: on_commit(appointment))
+    return appointment
+
+
+def book_appointments(windows, on_commit=None, **fields):
+    """
+    Create an appointment with the fields for every (start, end) window after reserving
+    all of them, either all or none are booked.
+
+    The appointments are inserted with a single bulk insert and get their qids with a
+    single update, so a batch costs the same number of queries whatever its size.
+    on_commit: optional callable receiving the appointments, run after the transaction commits.
+    """
+    with transaction.atomic():
+        lock_doctor(fields['doctor'].id)
+        validate_slots(fields['doctor'].id, fields['clinic'].id, windows)
+
+        batch = uuid.uuid4().hex
+        Appointment.objects.bulk_create([
+            Appointment(qid="{}-{}".format(batch, index), start_datetime=start, end_datetime=end, **fields)
+            for index, (start, end) in enumerate(windows)
+        ])
+
+        ids = list(Appointment.objects.filter(qid__startswith=batch).values_list('id', flat=True))
+        Appointment.objects.filter(id__in=ids).update(qid=Concat(
+            Cast('patient_id', CharField(max_length=255)), Value('-'),
+            Cast('doctor_id', CharField(max_length=255)), Value('-'),
+            Cast(F('id') + QID_CODE_OFFSET, CharField(max_length=255)),
+            output_field=CharField(max_length=255),
+        ))
+
+        # bulk_create skips the post_save receivers keeping availability and counters in sync
+        on_appointment_changed(fields['doctor'].id, windows)
+        invalidate_windows(fields['doctor'].id, windows)
+        status = fields.get('status', Appointment.Status.PENDING)
+        count_status_changes([(None, (fields['doctor'].id, fields['clinic'].id, status))] * len(ids))
+
+        appointments = list(Appointment.objects.filter(id__in=ids).\
+            select_related('patient', 'doctor', 'clinic', 'reason').order_by('start_datetime'))
+        if on_commit:
+            transaction.on_commit(lambda: on_commit(appointments))
+    return appointments
+
+
+def reschedule_appointment(appointment, on_commit=None, **fields):
+    """
+    Update the appointment with the fields, the slot is reserved again when the time,
+    doctor or clinic changes.
+    """
+    with transaction.atomic():
+        moved = False
+        for field, value in fields.items():
+            if field in ('start_datetime', 'end_datetime', 'doctor', 'clinic') and getattr(appointment, field) != value:
+                moved = True
+            setattr(appointment, field, value)
+
+        if moved:
+            lock_doctor(appointment.doctor_id)
+            validate_slot(appointment.doctor_id, appointment.clinic_id,
+                          appointment.start_datetime, appointment.end_datetime, exclude_id=appointment.pk)
+
+        appointment.save()
+
+        if on_commit:
+            transaction.on_commit(lambda: on_commit(appointment))
+    return appointment
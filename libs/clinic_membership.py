@@ -0,0 +1,87 @@
+"""
+Clinic membership index over User.clinic.
+
+The clinic ids of every user are cached as a sorted tuple per user, so access checks
+and co-membership questions are answered from the cache without queries, a miss
+loads all the missing users with one query. Entries are dropped by the m2m_changed
+and pre_delete receivers of the person and clinic models, once right away and again
+when the change commits.
+
+- CLINIC_MEMBERSHIP_ENABLED: Cache clinic memberships
+- CLINIC_MEMBERSHIP_ALIAS: Alias of the cache in CACHES to use, shared between processes
+- CLINIC_MEMBERSHIP_TIMEOUT: No. of seconds entries live
+"""
+from django.core.cache import caches
+from django.db import transaction
+
+from quicklic_backend import settings
+
+CLINIC_MEMBERSHIP_ENABLED = getattr(settings, 'CLINIC_MEMBERSHIP_ENABLED', True)
+CLINIC_MEMBERSHIP_ALIAS = getattr(settings, 'CLINIC_MEMBERSHIP_ALIAS', 'default')
+CLINIC_MEMBERSHIP_TIMEOUT = getattr(settings, 'CLINIC_MEMBERSHIP_TIMEOUT', 3600)
+
+
+def _get_cache():
+    return caches[CLINIC_MEMBERSHIP_ALIAS]
+
+
+def _key(user_id):
+    return "clinics:{}".format(user_id)
+
+
+def _load(user_ids):
+    from entities.person.models import User
+
+    clinic_ids = {user_id: [] for user_id in user_ids}
+    rows = User.clinic.through.objects.filter(user_id__in=user_ids).values_list('user_id', 'clinic_id')
+    for user_id, clinic_id in rows:
+        clinic_ids[user_id].append(clinic_id)
+    return {user_id: tuple(sorted(ids)) for user_id, ids in clinic_ids.items()}
+
+
+def get_clinic_ids_of_users(user_ids):
+    """
+    return {user id: frozenset of clinic ids} of the users.
+    """
+    user_ids = set(int(user_id) for user_id in user_ids)
+    if not CLINIC_MEMBERSHIP_ENABLED:
+        return {user_id: frozenset(ids) for user_id, ids in _load(user_ids).items()}
+
+    cache = _get_cache()
+    keys = {_key(user_id): user_id for user_id in user_ids}
+    entries = {keys[key]: ids for key, ids in cache.get_many(list(keys)).items()}
+    missing = user_ids - set(entries)
+    if missing:
+        loaded = _load(missing)
+        for user_id, ids in loaded.items():
+            cache.add(_key(user_id), ids, CLINIC_MEMBERSHIP_TIMEOUT)
+        entries.update(loaded)
+    return {user_id: frozenset(ids) for user_id, ids in entries.items()}
+
+
+def get_clinic_ids(user_id):
+    """
+    return frozenset of the clinic ids of the user.
+    """
+    return get_clinic_ids_of_users([user_id])[int(user_id)]
+
+
+def get_common_clinic_ids(user_id, other_user_id):
+    """
+    return frozenset of the ids of the clinics both users belong to.
+    """
+    clinic_ids = get_clinic_ids_of_users([user_id, other_user_id])
+    return clinic_ids[int(user_id)] & clinic_ids[int(other_user_id)]
+
+
+def share_clinic(user_id, other_user_id):
+    return bool(get_common_clinic_ids(user_id, other_user_id))
+
+
+def invalidate_users(user_ids):
+    keys = [_key(user_id) for user_id in set(user_ids)]
+    if not CLINIC_MEMBERSHIP_ENABLED or not keys:
+        return
+
+    _get_cache().delete_many(keys)
+    transaction.on_commit(lambda: _get_cache().delete_many(keys))
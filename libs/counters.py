@@ -0,0 +1,139 @@
+"""
+Denormalized per doctor and per clinic activity counters, DoctorCounter and ClinicCounter.
+
+Appointment status changes and reviews are counted as deltas, applied with one
+UPDATE ... SET count = count + delta per doctor and clinic in the transaction of the
+change. Appointments and reviews saved through the models are counted by receivers,
+bulk inserts and .update() skip those and go through count_status_changes or
+update_status. The rebuild_counters command recounts everything from scratch.
+
+To count the change, saving an Appointment or a Review reads its stored values first,
+one SELECT per save. Appointments saved with update_fields skip it unless one of the
+fields involved is among them.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from entities.appointment.models import Appointment, DoctorCounter, ClinicCounter
+from entities.review.models import Review
+from libs.table_versions import bump_rows, bump_table
+
+STATUS_FIELDS = {
+    Appointment.Status.CONFIRM: 'confirm_count',
+    Appointment.Status.PENDING: 'pending_count',
+    Appointment.Status.NOSHOW: 'noshow_count',
+    Appointment.Status.CANCEL: 'cancel_count',
+    Appointment.Status.DISCARD: 'discard_count',
+    Appointment.Status.DONE: 'done_count',
+}
+
+
+def _new_deltas():
+    return {
+        DoctorCounter: defaultdict(lambda: defaultdict(int)),
+        ClinicCounter: defaultdict(lambda: defaultdict(int)),
+    }
+
+
+def _apply(deltas):
+    with transaction.atomic():
+        for model, counters in deltas.items():
+            key = model._meta.pk.attname
+            for pk, fields in sorted(counters.items()):
+                fields = {field: F(field) + delta for field, delta in fields.items() if delta}
+                if not fields:
+                    continue
+                if not model.objects.filter(**{key: pk}).update(**fields):
+                    model.objects.get_or_create(**{key: pk})
+                    model.objects.filter(**{key: pk}).update(**fields)
+            bump_rows(model, counters)
+
+
+def count_status_changes(changes):
+    """
+    changes: (previous, current) tuples of (doctor_id, clinic_id, status), None when
+    the appointment did not exist before or does not anymore.
+    """
+    deltas = _new_deltas()
+    for previous, current in changes:
+        for appointment, sign in ((previous, -1), (current, 1)):
+            if appointment is None:
+                continue
+            doctor_id, clinic_id, status = appointment
+            deltas[DoctorCounter][doctor_id][STATUS_FIELDS[status]] += sign
+            deltas[ClinicCounter][clinic_id][STATUS_FIELDS[status]] += sign
+    _apply(deltas)
+
+
+def update_status(appointments, status):
+    """
+    Set the status of the appointments queryset with a single update and count the change.
+    return: No. of updated appointments
+    """
+    with transaction.atomic():
+        rows = list(appointments.exclude(status=status).select_for_update().
+                    values_list('id', 'doctor_id', 'clinic_id', 'status'))
+        if not rows:
+            return 0
+        Appointment.objects.filter(id__in=[row[0] for row in rows]).update(status=status, updated_at=timezone.now())
+        count_status_changes([(row[1:], (row[1], row[2], status)) for row in rows])
+    return len(rows)
+
+
+def count_reviews(changes):
+    """
+    changes: (previous, current) tuples of (doctor_id, clinic_id, rating), None when
+    the review did not exist before or does not anymore.
+    """
+    deltas = _new_deltas()
+    for previous, current in changes:
+        for review, sign in ((previous, -1), (current, 1)):
+            if review is None:
+                continue
+            doctor_id, clinic_id, rating = review
+            for model, pk in ((DoctorCounter, doctor_id), (ClinicCounter, clinic_id)):
+                if pk:
+                    deltas[model][pk]['review_count'] += sign
+                    deltas[model][pk]['rating_sum'] += sign * rating
+    _apply(deltas)
+
+
+def get_counter(model, pk):
+    """
+    return the counter row, an empty unsaved one when nothing was counted yet.
+    """
+    key = model._meta.pk.attname
+    return model.objects.filter(**{key: pk}).first() or model(**{key: pk})
+
+
+def rebuild_counters():
+    """
+    Replace all the counters with ones counted by grouped queries.
+    return: (No. of doctor counters, No. of clinic counters)
+    """
+    counters = {DoctorCounter: {}, ClinicCounter: {}}
+    for model, key in ((DoctorCounter, 'doctor_id'), (ClinicCounter, 'clinic_id')):
+        model_counters = counters[model]
+        key_field = model._meta.pk.attname
+
+        statuses = Appointment.objects.order_by().values_list(key, 'status').annotate(count=Count('id'))
+        for pk, status, count in statuses:
+            counter = model_counters.setdefault(pk, model(**{key_field: pk}))
+            setattr(counter, STATUS_FIELDS[status], count)
+
+        reviews = Review.objects.filter(**{key + '__isnull': False}).order_by().values_list(key).\
+            annotate(count=Count('id'), rating_sum=Sum('rating'))
+        for pk, count, rating_sum in reviews:
+            counter = model_counters.setdefault(pk, model(**{key_field: pk}))
+            counter.review_count = count
+            counter.rating_sum = rating_sum
+
+    with transaction.atomic():
+        for model, model_counters in counters.items():
+            model.objects.all().delete()
+            model.objects.bulk_create(model_counters.values())
+        bump_table(DoctorCounter, ClinicCounter)
+    return len(counters[DoctorCounter]), len(counters[ClinicCounter])
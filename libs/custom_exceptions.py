@@ -92,3 +92,12 @@ class InvalidDateTimeException(APIException):
 class NotificationDoesNotExistsException(APIException):
     status_code = 404
     default_detail = "Notification Does Not Exists"
+
+
+class SlotAlreadyBookedException(AlreadyExistsException):
+    default_detail = "Slot Already Booked"
+
+
+class SyncTokenExpiredException(APIException):
+    status_code = 410
+    default_detail = "Sync Token Expired"
@@ -0,0 +1,118 @@
+"""
+Clinic wide day grid of every doctor and slot.
+
+A day is split into one minute buckets and the clinic's doctors are the rows of two
+boolean matrices, working (doctor x minute) from the settings and busy (doctor x minute)
+from the appointments. Both are filled from +1/-1 boundary marks and a cumulative sum,
+slots of all doctors are generated as flat arrays and checked against the busy prefix
+sums at once, so there are no per doctor or per slot Python loops.
+
+A slot is booked when an appointment overlaps it at any second, same as AvailabilityEngine.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from libs.schedule import MINUTES_IN_DAY
+
+
+def _fill(rows, starts, ends, shape):
+    """
+    return bool matrix with [start, end) of every row marked.
+    """
+    marks = np.zeros((shape[0], shape[1] + 1), dtype=np.int32)
+    np.add.at(marks, (rows, starts), 1)
+    np.add.at(marks, (rows, ends), -1)
+    return np.cumsum(marks, axis=1)[:, :-1] > 0
+
+
+class DayGrid:
+    """
+    - settings: DoctorSetting rows of the clinic, one row of the grid each
+    - holidays: doctor ids on holiday that day
+    - appointments: (doctor_id, start, end) busy tuples of the day, canceled ones excluded by the caller
+    """
+
+    def __init__(self, day, settings, holidays, appointments):
+        self.day = day
+        self.settings = list(settings)
+        self.holidays = set(holidays)
+        self.appointments = appointments
+
+        self.rows = {setting.physician_id: row for row, setting in enumerate(self.settings)}
+        self.slot_times = np.array([setting.slot_time for setting in self.settings], dtype=np.int32)
+        # appointments can run past midnight
+        self.width = MINUTES_IN_DAY + int(self.slot_times.max() if len(self.settings) else 0)
+
+        self.ranges = self._build_ranges()
+        self.working = _fill(self.ranges[0], self.ranges[1], self.ranges[2], (len(self.settings), self.width))
+        self.busy = self._build_busy()
+
+    def _build_ranges(self):
+        """
+        return (rows, starts, ends) arrays of the working ranges, doctors on holiday have none.
+        """
+        rows, starts, ends = [], [], []
+        weekday = self.day.weekday()
+        for row, setting in enumerate(self.settings):
+            if setting.physician_id in self.holidays:
+                continue
+            for start, end in setting.schedule.get_ranges(weekday):
+                rows.append(row)
+                starts.append(start)
+                ends.append(end)
+        return (
+            np.array(rows, dtype=np.int32),
+            np.array(starts, dtype=np.int32),
+            np.array(ends, dtype=np.int32),
+        )
+
+    def _build_busy(self):
+        day_start = datetime.combine(self.day, datetime.min.time())
+        rows, starts, ends = [], [], []
+        for doctor_id, start, end in self.appointments:
+            if doctor_id not in self.rows:
+                continue
+            rows.append(self.rows[doctor_id])
+            starts.append((start - day_start).total_seconds() // 60)
+            # the bucket the end falls in is busy as well
+            ends.append((end - day_start).total_seconds() // 60 + 1)
+        starts = np.clip(np.array(starts, dtype=np.int32), 0, self.width)
+        ends = np.clip(np.array(ends, dtype=np.int32), 0, self.width)
+        return _fill(np.array(rows, dtype=np.int32), starts, ends, (len(self.settings), self.width))
+
+    def get_slots(self):
+        """
+        return (rows, starts, lengths, booked) arrays of all the slots in the grid,
+        starts in minutes since midnight.
+        """
+        rows, range_starts, range_ends = self.ranges
+        steps = self.slot_times[rows]
+        # only whole slots, a slot has to end within its range
+        counts = (range_ends - range_starts) // steps
+
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        slot_rows = np.repeat(rows, counts)
+        lengths = np.repeat(steps, counts)
+        starts = np.repeat(range_starts, counts) + offsets * lengths
+        ends = np.minimum(starts + lengths, self.width)
+
+        busy_sums = np.zeros((len(self.settings), self.width + 1), dtype=np.int32)
+        np.cumsum(self.busy, axis=1, out=busy_sums[:, 1:])
+        booked = busy_sums[slot_rows, ends] - busy_sums[slot_rows, starts] > 0
+        return slot_rows, starts, lengths, booked
+
+    def get_doctor_slots(self):
+        """
+        return {doctor_id: [slots]} with slots like AvailabilityEngine's.
+        """
+        day_start = datetime.combine(self.day, datetime.min.time())
+        doctor_slots = {setting.physician_id: [] for setting in self.settings}
+        for row, start, length, booked in zip(*(array.tolist() for array in self.get_slots())):
+            slot_start = day_start + timedelta(minutes=start)
+            doctor_slots[self.settings[row].physician_id].append({
+                "start": slot_start,
+                "end": slot_start + timedelta(minutes=length, seconds=-1),
+                "available": not booked,
+            })
+        return doctor_slots
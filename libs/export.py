@@ -0,0 +1,148 @@
+"""
+Streaming CSV and JSON lines exports of appointments, visits and reviews.
+
+Rows are read as values with QuerySet.iterator(), from a server side cursor fetched in
+chunks on PostgreSQL, and written out one by one, so memory stays flat whatever the
+size of the export.
+
+Reviews are of a doctor or of a clinic, the reviews of a doctor belong to the clinics of
+the doctor. The creators of anonymous reviews are left out.
+"""
+import csv
+import json
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from entities.appointment.models import Appointment, Visit
+from entities.person.models import User
+from entities.review.models import Review
+
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = {
+    CSV: 'text/csv',
+    JSONL: 'application/x-ndjson',
+}
+
+# kind: (model, date lookup the range filters, ordering, [(column, lookup)])
+EXPORTS = {
+    'appointments': (Appointment, 'start_datetime', ('start_datetime', 'id'), [
+        ('id', 'id'),
+        ('qid', 'qid'),
+        ('clinic_id', 'clinic_id'),
+        ('clinic', 'clinic__name'),
+        ('doctor_id', 'doctor_id'),
+        ('doctor_first_name', 'doctor__first_name'),
+        ('doctor_last_name', 'doctor__last_name'),
+        ('patient_id', 'patient_id'),
+        ('patient_first_name', 'patient__first_name'),
+        ('patient_last_name', 'patient__last_name'),
+        ('patient_phone', 'patient__phone'),
+        ('reason', 'reason__name'),
+        ('status', 'status'),
+        ('start_datetime', 'start_datetime'),
+        ('end_datetime', 'end_datetime'),
+        ('notes', 'notes'),
+        ('created_at', 'created_at'),
+    ]),
+    'visits': (Visit, 'appointment__start_datetime', ('appointment__start_datetime', 'id'), [
+        ('id', 'id'),
+        ('appointment_id', 'appointment_id'),
+        ('appointment_qid', 'appointment__qid'),
+        ('start_datetime', 'appointment__start_datetime'),
+        ('clinic_id', 'clinic_id'),
+        ('clinic', 'clinic__name'),
+        ('doctor_id', 'doctor_id'),
+        ('doctor_first_name', 'doctor__first_name'),
+        ('doctor_last_name', 'doctor__last_name'),
+        ('patient_id', 'patient_id'),
+        ('patient_first_name', 'patient__first_name'),
+        ('patient_last_name', 'patient__last_name'),
+        ('followup_required', 'followup_required'),
+        ('followup_date', 'followup_date'),
+        ('prescription', 'prescription'),
+        ('comments', 'comments'),
+        ('created_at', 'created_at'),
+    ]),
+    'reviews': (Review, 'created_at', ('created_at', 'id'), [
+        ('id', 'id'),
+        ('type', 'type'),
+        ('clinic_id', 'clinic_id'),
+        ('clinic', 'clinic__name'),
+        ('doctor_id', 'doctor_id'),
+        ('doctor_first_name', 'doctor__first_name'),
+        ('doctor_last_name', 'doctor__last_name'),
+        ('creator_id', 'visible_creator_id'),
+        ('rating', 'rating'),
+        ('comment', 'comment'),
+        ('is_anonymous', 'is_anonymous'),
+        ('created_at', 'created_at'),
+    ]),
+}
+
+# kind: {annotation: expression}, columns not read from a field
+ANNOTATIONS = {
+    'reviews': {
+        'visible_creator_id': Case(When(is_anonymous=True, then=Value(None)), default=F('creator_id'),
+                                   output_field=IntegerField()),
+    },
+}
+
+
+def _filter_clinics(kind, queryset, clinic_ids):
+    if kind == 'reviews':
+        doctor_ids = User.clinic.through.objects.filter(clinic_id__in=clinic_ids).values('user_id')
+        return queryset.filter(Q(clinic_id__in=clinic_ids) | Q(doctor_id__in=doctor_ids))
+    return queryset.filter(clinic_id__in=clinic_ids)
+
+
+def get_export_queryset(kind, clinic_ids=None, doctor_id=None, start_date=None, end_date=None):
+    """
+    return values_list queryset of the export's rows.
+    clinic_ids: Only rows of these clinics, all clinics when None
+    start_date, end_date: Only rows of the days in between, inclusive
+    """
+    model, date_lookup, ordering, columns = EXPORTS[kind]
+    queryset = model.objects.annotate(**ANNOTATIONS.get(kind, {}))
+    if clinic_ids is not None:
+        queryset = _filter_clinics(kind, queryset, clinic_ids)
+    if doctor_id:
+        queryset = queryset.filter(doctor_id=doctor_id)
+    if start_date:
+        queryset = queryset.filter(**{date_lookup + '__gte': datetime.combine(start_date, time.min)})
+    if end_date:
+        queryset = queryset.filter(**{date_lookup + '__lt': datetime.combine(end_date + timedelta(days=1), time.min)})
+    return queryset.order_by(*ordering).values_list(*[lookup for column, lookup in columns])
+
+
+def _format(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class _Echo(object):
+    """
+    File like object returning what is written, for csv.writer to format single rows.
+    """
+    def write(self, value):
+        return value
+
+
+def stream_export(kind, queryset, export_format=CSV):
+    """
+    Yield the export of the queryset's rows as lines of the format.
+    """
+    names = [column for column, lookup in EXPORTS[kind][3]]
+    if export_format == JSONL:
+        for row in queryset.iterator():
+            yield json.dumps(OrderedDict(zip(names, row)), cls=DjangoJSONEncoder) + "\n"
+        return
+
+    writer = csv.writer(_Echo())
+    yield writer.writerow(names)
+    for row in queryset.iterator():
+        yield writer.writerow([_format(value) for value in row])
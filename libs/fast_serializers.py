@@ -0,0 +1,278 @@
+"""
+Serialize read only lists straight from values_list() rows, without model instances
+and DRF field binding.
+
+A serializer class is compiled once into the columns of a single values_list() query
+and a list of steps building its representation, in the order and with the conversions
+of its fields. Single relations are joined into the same query, many relations and
+relations to serializers with `query_annotations` are fetched with one query each, as
+in libs.query_plan. The output is the same as the serializer's for every row.
+
+Method fields are compiled from the serializer's `values_fields`, {field name: model
+field or annotation giving the same value}, e.g. {'avatar': 'avatar'} for a method
+returning the absolute url of the avatar file. A serializer with fields that can't be
+compiled raises ImproperlyConfigured when compiled.
+
+- FAST_SERIALIZERS_ENABLED: Serve the lists of FastListMixin views through compiled serializers
+"""
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import FileField
+from django.utils import six
+from rest_framework import ISO_8601
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+from rest_framework.settings import api_settings
+
+from quicklic_backend import settings
+
+FAST_SERIALIZERS_ENABLED = getattr(settings, 'FAST_SERIALIZERS_ENABLED', True)
+
+VALUE, JOIN, FETCH_ONE, FETCH_MANY = range(4)
+
+_compiled = {}
+
+
+def _format_datetime(value):
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _get_converter(field):
+    """
+    return function converting a column value of the field to its representation.
+    """
+    if isinstance(field, serializers.ChoiceField):
+        return field.to_representation
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.CharField):
+        return six.text_type
+    if isinstance(field, serializers.BooleanField):
+        return bool
+    if isinstance(field, serializers.DateTimeField) and \
+            getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601:
+        return lambda value: _format_datetime(value) if value else None
+    return field.to_representation
+
+
+def _file_url_converter(model_field):
+    """
+    return factory of the context's function converting a file name to its absolute url.
+    """
+    storage = model_field.storage
+
+    def factory(context):
+        request = context.get('request')
+
+        def convert(name):
+            if not name:
+                return None
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+        return convert
+    return factory
+
+
+class _Plan(object):
+    """
+    values_list() columns of one query and the steps building a row's representation,
+    the first column is the key the rows are fetched by.
+    """
+    def __init__(self, model, key):
+        self.model = model
+        self.key = key
+        self.columns = []
+        self.annotations = {}
+        self.steps = []
+        self.add_column(key)
+
+    def add_column(self, lookup):
+        if lookup not in self.columns:
+            self.columns.append(lookup)
+        return self.columns.index(lookup)
+
+
+def _get_model_field(model, source):
+    try:
+        return model._meta.get_field(source)
+    except FieldDoesNotExist:
+        return None
+
+
+def _compile_fields(serializer_class, model, plan, prefix, pk_lookup):
+    """
+    return steps of the serializer's fields read from the columns of the plan under prefix.
+    """
+    serializer = serializer_class()
+    related_serializers = getattr(serializer, 'related_serializers', {})
+    values_fields = getattr(serializer, 'values_fields', {})
+    if not prefix:
+        # joined serializers have none, they are fetched on their own otherwise
+        for annotations in getattr(serializer, 'query_annotations', {}).values():
+            plan.annotations.update(annotations)
+
+    steps = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        source = field.source
+        if isinstance(field, serializers.SerializerMethodField):
+            if name not in values_fields:
+                raise ImproperlyConfigured("{}.{} is missing from values_fields".format(serializer_class.__name__, name))
+            lookup = values_fields[name]
+            model_field = _get_model_field(model, lookup)
+            factory = _file_url_converter(model_field) if isinstance(model_field, FileField) else None
+            steps.append((VALUE, name, plan.add_column(prefix + lookup), factory, None))
+        elif not source or '.' in source or source == '*':
+            raise ImproperlyConfigured("{}.{} can't be compiled".format(serializer_class.__name__, name))
+        elif name in related_serializers or isinstance(field, serializers.BaseSerializer):
+            if name in related_serializers:
+                child_class = related_serializers[name]
+            elif isinstance(field, serializers.ListSerializer):
+                child_class = field.child.__class__
+            else:
+                child_class = field.__class__
+            model_field = _get_model_field(model, source)
+            steps.append(_compile_relation(name, model_field, child_class, plan, prefix, pk_lookup))
+        elif isinstance(field, ManyRelatedField):
+            raise ImproperlyConfigured("{}.{} can't be compiled".format(serializer_class.__name__, name))
+        elif isinstance(field, RelatedField):
+            steps.append((VALUE, name, plan.add_column(prefix + source), None, None))
+        else:
+            model_field = _get_model_field(model, source)
+            if model_field is None:
+                raise ImproperlyConfigured("{}.{} can't be compiled".format(serializer_class.__name__, name))
+            if isinstance(model_field, FileField):
+                steps.append((VALUE, name, plan.add_column(prefix + source), _file_url_converter(model_field), None))
+            else:
+                steps.append((VALUE, name, plan.add_column(prefix + source), None, _get_converter(field)))
+    return steps
+
+
+def _compile_relation(name, model_field, child_class, plan, prefix, pk_lookup):
+    related_model = model_field.related_model
+    if model_field.many_to_many or model_field.one_to_many:
+        if model_field.concrete:
+            query_name = model_field.related_query_name()
+        else:
+            query_name = model_field.field.name
+        return FETCH_MANY, name, plan.add_column(pk_lookup), compile_serializer(child_class, query_name), None
+
+    key_lookup = prefix + model_field.name if model_field.concrete else prefix + model_field.name + '__pk'
+    if getattr(child_class, 'query_annotations', {}):
+        return FETCH_ONE, name, plan.add_column(key_lookup), compile_serializer(child_class), None
+
+    child_steps = _compile_fields(child_class, related_model, plan, prefix + model_field.name + '__', key_lookup)
+    return JOIN, name, plan.add_column(key_lookup), child_steps, None
+
+
+def compile_serializer(serializer_class, key='pk'):
+    """
+    return _Plan of the serializer's rows fetched by the key lookup.
+    """
+    cache_key = (serializer_class, key)
+    if cache_key not in _compiled:
+        model = serializer_class.Meta.model
+        plan = _Plan(model, key)
+        plan.steps = _compile_fields(serializer_class, model, plan, '', 'pk')
+        _compiled[cache_key] = plan
+    return _compiled[cache_key]
+
+
+def _bind(steps, context):
+    """
+    return the steps with the context's converters.
+    """
+    bound = []
+    for kind, name, index, arg, converter in steps:
+        if kind == VALUE:
+            bound.append((kind, name, index, arg(context) if arg else converter, None))
+        elif kind == JOIN:
+            bound.append((kind, name, index, _bind(arg, context), None))
+        else:
+            bound.append((kind, name, index, arg, None))
+    return bound
+
+
+def _collect_fetches(steps, fetches):
+    for kind, name, index, arg, converter in steps:
+        if kind == JOIN:
+            _collect_fetches(arg, fetches)
+        elif kind in (FETCH_ONE, FETCH_MANY):
+            fetches.append((kind, index, arg))
+    return fetches
+
+
+def _build(steps, row, fetched):
+    data = OrderedDict()
+    for kind, name, index, arg, converter in steps:
+        value = row[index]
+        if kind == VALUE:
+            data[name] = None if value is None else (arg(value) if arg else value)
+        elif value is None:
+            data[name] = None
+        elif kind == JOIN:
+            data[name] = _build(arg, row, fetched)
+        elif kind == FETCH_ONE:
+            data[name] = fetched[id(arg)].get(value)
+        else:
+            data[name] = fetched[id(arg)].get(value, [])
+    return data
+
+
+def _execute(plan, queryset, context):
+    """
+    return [(key, representation)] of the queryset's rows in order.
+    """
+    if plan.annotations:
+        queryset = queryset.annotate(**plan.annotations)
+    rows = list(queryset.values_list(*plan.columns))
+    steps = _bind(plan.steps, context)
+
+    # relations to the same plan, e.g. the clinics of the doctor and of the patient, share a query
+    keys = OrderedDict()
+    for kind, index, child_plan in _collect_fetches(plan.steps, []):
+        plan_keys = keys.setdefault(id(child_plan), (kind, child_plan, set()))[2]
+        plan_keys.update(row[index] for row in rows if row[index] is not None)
+
+    fetched = {}
+    for plan_id, (kind, child_plan, plan_keys) in keys.items():
+        lookups = fetched[plan_id] = {}
+        if not plan_keys:
+            continue
+        child_queryset = child_plan.model._default_manager.filter(**{child_plan.key + '__in': plan_keys})
+        for key, data in _execute(child_plan, child_queryset, context):
+            if kind == FETCH_MANY:
+                lookups.setdefault(key, []).append(data)
+            else:
+                lookups[key] = data
+    return [(row[0], _build(steps, row, fetched)) for row in rows]
+
+
+def get_values_representation(serializer_class, queryset, context):
+    """
+    return representations of the queryset's rows, the same as
+    serializer_class(queryset, many=True, context=context).data.
+    """
+    return [data for key, data in _execute(compile_serializer(serializer_class), queryset, context)]
+
+
+def get_pks_representation(serializer_class, pks, context):
+    """
+    return representations of the rows of the pks in their order.
+    """
+    model = serializer_class.Meta.model
+    rows = dict(_execute(compile_serializer(serializer_class), model._default_manager.filter(pk__in=pks), context))
+    return [rows[pk] for pk in pks if pk in rows]
+
+
+def is_compilable(serializer_class):
+    try:
+        compile_serializer(serializer_class)
+    except ImproperlyConfigured:
+        return False
+    return True
@@ -0,0 +1,99 @@
+"""
+Fixtures shared by the tests of the apps.
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.cache import caches
+from rest_framework.test import APIClient
+
+from entities.appointment.models import Appointment, Visit
+from entities.clinic.models import City, Country, Clinic
+from entities.person.models import Doctor, DoctorSetting, Patient
+from entities.resources.models import AppointmentReason, Occupation, Service, Specialization
+from libs.authentication import AUTH_STATE_ALIAS, principal_cache
+from libs.booking import book_appointment
+from libs.jwt_helper import JWTHelper
+from libs.revocation import REVOCATION_ALIAS, reset_filter
+
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+class ClinicFixtureMixin(object):
+    """
+    A clinic with a doctor, whose client self.client is, and appointments from self.start,
+    tomorrow at 10:00.
+    """
+    def setUp(self):
+        # tokens of the same phone issued within a second are the same in every test, and user
+        # states and the revocation version are dropped once committed, never in a TestCase
+        principal_cache.clear()
+        caches[AUTH_STATE_ALIAS].clear()
+        caches[REVOCATION_ALIAS].clear()
+        reset_filter()
+        self.city = City.objects.create(name="Lahore")
+        self.country = Country.objects.create(name="Pakistan")
+        self.clinic = Clinic.objects.create(code="100001", name="Clinic", phone="1", location="Gulberg",
+                                            city=self.city, country=self.country, rating=0)
+        # thumbnails are created on save from an uploaded image
+        Clinic.objects.filter(pk=self.clinic.pk).update(image="uploads/clinics/clinic.png")
+
+        self.doctor = Doctor.objects.create(phone="+920000000000", first_name="Doc", rating=0, city=self.city,
+                                            country=self.country,
+                                            specialization=Specialization.objects.create(name="Cardiology"))
+        self.doctor.services.add(Service.objects.create(name="ECG"), Service.objects.create(name="Echo"))
+        self.doctor.clinic.add(self.clinic)
+        self.reason = AppointmentReason.objects.create(name="Checkup")
+
+        self.client = self.get_client(self.doctor)
+        self.start = datetime.combine(datetime.now().date() + timedelta(days=1), time(10))
+
+    def get_client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer {}".format(JWTHelper.encode_token(user)))
+        return client
+
+    def create_patient(self, **kwargs):
+        patient = Patient.objects.create(phone="+92111111{:04d}".format(Patient.objects.count()),
+                                         first_name="Patient", city=self.city, country=self.country, **kwargs)
+        patient.clinic.add(self.clinic)
+        return patient
+
+    def create_setting(self):
+        """
+        return setting of the doctor at the clinic, 9:00 to 17:00 every day in 10 minute slots
+        with a break from 13:00 to 14:00 on the day of self.start.
+        """
+        timings = {}
+        for day in DAYS:
+            timings["{}_start".format(day)] = time(9)
+            timings["{}_end".format(day)] = time(17)
+        return DoctorSetting.objects.create(physician=self.doctor, clinic=self.clinic, slot_time=10,
+                                            breaks="{}:13:00-14:00".format(self.start.weekday()), **timings)
+
+    def create_appointments(self, count, status, patient=None):
+        """
+        Appointments of 10 minutes one after the other from self.start, with a visit each
+        and a new patient each unless one is given.
+        """
+        for index in range(Appointment.objects.count(), Appointment.objects.count() + count):
+            appointment_patient = patient or \
+                self.create_patient(occupation=Occupation.objects.create(name="Job {}".format(index)))
+            appointment = Appointment.objects.create(
+                qid="{}-{}-{}".format(appointment_patient.id, self.doctor.id, index), patient=appointment_patient,
+                doctor=self.doctor, clinic=self.clinic, reason=self.reason, status=status,
+                start_datetime=self.start + timedelta(minutes=10 * index),
+                end_datetime=self.start + timedelta(minutes=10 * index + 9),
+            )
+            Visit.objects.create(appointment=appointment, patient=appointment_patient, doctor=self.doctor,
+                                 clinic=self.clinic)
+
+    def book_at(self, patient, start, minutes=10):
+        return book_appointment(
+            patient=patient,
+            doctor=self.doctor,
+            clinic=self.clinic,
+            reason=self.reason,
+            status=Appointment.Status.PENDING,
+            start_datetime=start,
+            end_datetime=start + timedelta(minutes=minutes, seconds=-1),
+        )
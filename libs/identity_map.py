@@ -0,0 +1,47 @@
+"""
+Request scoped identity map of the objects a request works on.
+
+Permission classes load the objects of the url with get_request_object and the view
+gets the same instances back, so each object is fetched once per request. Views tune
+the query to what they read from the objects with `select_related_objects`,
+{model: select_related lookups}. A loaded object reuses the instances of the map for
+its foreign keys, e.g. a visit gets the appointment the permissions loaded before it.
+"""
+
+
+def get_identity_map(request):
+    """
+    return {(model, pk): instance or None} of the request.
+    """
+    identity_map = getattr(request, 'identity_map', None)
+    if identity_map is None:
+        identity_map = request.identity_map = {}
+    return identity_map
+
+
+def _link(instance, identity_map):
+    for field in instance._meta.concrete_fields:
+        if not field.is_relation or field.remote_field.parent_link or hasattr(instance, field.get_cache_name()):
+            continue
+        related = identity_map.get((field.related_model, getattr(instance, field.attname)))
+        if related is not None:
+            setattr(instance, field.name, related)
+
+
+def get_request_object(request, view, model, pk):
+    """
+    return instance of the model with the pk, fetched once per request, None if there is none.
+    """
+    try:
+        key = (model, int(pk))
+    except (TypeError, ValueError):
+        return None
+
+    identity_map = get_identity_map(request)
+    if key not in identity_map:
+        select_related = getattr(view, 'select_related_objects', {}).get(model, ())
+        instance = model._default_manager.select_related(*select_related).filter(pk=key[1]).first()
+        if instance is not None:
+            _link(instance, identity_map)
+        identity_map[key] = instance
+    return identity_map[key]
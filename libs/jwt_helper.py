@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from datetime import datetime, timedelta
 from quicklic_backend import settings
+import uuid
+
 import jwt
 
 User = get_user_model()
@@ -21,17 +23,35 @@ class JWTHelper:
     @staticmethod
     def encode_token(user):
         """
-        Token created against phone of the user.
+        Token created against phone of the user, with the id, role and token version of
+        the user and an id of its own as claims.
         """
         if user:
             data = {
                 "exp": datetime.utcnow() + timedelta(days=JWTHelper.JWT_TOKEN_EXPIRY),
                 "phone": user.phone,
+                "id": user.id,
+                "role": user.role,
+                "ver": user.token_version,
+                "jti": uuid.uuid4().hex,
             }
             token = jwt.encode(data, 'secret', algorithm=JWTHelper.JWT_ALGORITHM)
             return str(token, JWTHelper.JWT_UTF)
         raise User.DoesNotExist
 
+    @staticmethod
+    def read_token(token):
+        """
+        Verify and decode the token once.
+        return: (payload, message), payload is None if the token is not valid
+        """
+        try:
+            return jwt.decode(token, 'secret', algorithms=JWTHelper.JWT_ALGORITHM), "Valid"
+        except jwt.ExpiredSignatureError:
+            return None, "Token Expired"
+        except jwt.InvalidTokenError:
+            return None, "Token is Invalid"
+
     @staticmethod
     def is_token_valid(token):
         """
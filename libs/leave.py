@@ -0,0 +1,96 @@
+"""
+Index of doctors' leaves (DoctorHoliday ranges).
+
+Leaves overlapping a date range are read with one query, per doctor they are merged
+into sorted disjoint intervals so "is doctor X off at time T" is a binary search and a
+whole day off is told apart from part of a day.
+"""
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+
+from entities.person.models import DoctorHoliday
+
+ONE_SECOND = timedelta(seconds=1)
+
+
+def get_day_bounds(day):
+    return datetime.combine(day, time.min), datetime.combine(day, time(23, 59, 59))
+
+
+def get_leaves(doctor_ids, start, end):
+    """
+    return DoctorHoliday queryset of the doctors overlapping start and end, dates
+    are taken as whole days. Leaves of all the doctors when doctor_ids is None.
+    """
+    if not isinstance(start, datetime):
+        start = get_day_bounds(start)[0]
+    if not isinstance(end, datetime):
+        end = get_day_bounds(end)[1]
+    leaves = DoctorHoliday.objects.filter(start_datetime__lte=end, end_datetime__gte=start)
+    if doctor_ids is not None:
+        leaves = leaves.filter(physician_id__in=doctor_ids)
+    return leaves
+
+
+def build_leave_indexes(leaves):
+    """
+    return {doctor_id: LeaveIndex} of the leaves.
+    """
+    leaves_by_doctor = {}
+    for leave in leaves:
+        leaves_by_doctor.setdefault(leave.physician_id, []).append(leave)
+    return {doctor_id: LeaveIndex(doctor_leaves) for doctor_id, doctor_leaves in leaves_by_doctor.items()}
+
+
+class LeaveIndex:
+    """
+    Sorted disjoint (start, end) intervals of a doctor's leaves, both inclusive.
+    Leaves following each other within a second are merged.
+    """
+
+    def __init__(self, leaves):
+        intervals = []
+        for start, end in sorted((leave.start_datetime, leave.end_datetime) for leave in leaves):
+            if intervals and start <= intervals[-1][1] + ONE_SECOND:
+                intervals[-1][1] = max(intervals[-1][1], end)
+            else:
+                intervals.append([start, end])
+        self.intervals = intervals
+        self.starts = [start for start, end in intervals]
+
+    def _find(self, moment):
+        index = bisect_right(self.starts, moment) - 1
+        if index >= 0 and self.intervals[index][1] >= moment:
+            return self.intervals[index]
+        return None
+
+    def is_off(self, moment):
+        return self._find(moment) is not None
+
+    def is_day_off(self, day):
+        """
+        return True when the whole day is off.
+        """
+        day_start, day_end = get_day_bounds(day)
+        interval = self._find(day_start)
+        return interval is not None and interval[1] >= day_end
+
+    def overlaps(self, start, end):
+        index = bisect_right(self.starts, end) - 1
+        return index >= 0 and self.intervals[index][1] >= start
+
+    def get_intervals(self, start, end):
+        """
+        return leave intervals overlapping start and end, clipped to them.
+        """
+        index = max(bisect_right(self.starts, start) - 1, 0)
+        intervals = []
+        for interval_start, interval_end in self.intervals[index:]:
+            if interval_start > end:
+                break
+            if interval_end >= start:
+                intervals.append((max(interval_start, start), min(interval_end, end)))
+        return intervals
+
+    def __bool__(self):
+        return bool(self.intervals)
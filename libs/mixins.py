@@ -1,7 +1,139 @@
+from collections import OrderedDict
+
 from django.db import transaction
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from libs.fast_serializers import FAST_SERIALIZERS_ENABLED, get_pks_representation, get_values_representation
+from libs.identity_map import get_request_object
+from libs.query_plan import optimize_queryset, parse_shape
+from libs.side_loading import get_compact_representation, get_compact_shape
+from libs.table_versions import get_etag, get_last_modified, get_versions, table_key
 
 
 class AtomicMixin(object):
     def dispatch(self, request, *args, **kwargs):
         with transaction.atomic():
             return super(AtomicMixin, self).dispatch(request, *args, **kwargs)
+
+
+class IdentityMapMixin(object):
+    """
+    Serve get_object() from the request's identity map, the instance the permissions
+    loaded, see libs.identity_map.
+    """
+    def get_object(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = get_request_object(self.request, self, self.get_queryset().model, self.kwargs[lookup_url_kwarg])
+        if obj is None:
+            raise Http404
+
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class QueryPlanMixin(object):
+    """
+    Load everything the serializer reads along with the queryset and serve the shape
+    asked for with ?fields= and ?expand=, see libs.query_plan.
+    """
+    def get_shape(self):
+        return parse_shape(self.request.query_params.get('fields'), self.request.query_params.get('expand'))
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('shape', self.get_shape())
+        return super(QueryPlanMixin, self).get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super(QueryPlanMixin, self).filter_queryset(queryset)
+        return optimize_queryset(queryset, self.get_serializer_class(), self.get_shape())
+
+
+class FastListMixin(QueryPlanMixin):
+    """
+    Serve GET lists in the full shape with the serializer compiled by libs.fast_serializers,
+    the page is read as values and serialized without model instances.
+    """
+    def use_fast_path(self):
+        return FAST_SERIALIZERS_ENABLED and self.request.method == 'GET' and self.get_shape() is None
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_path():
+            return super(FastListMixin, self).list(request, *args, **kwargs)
+
+        serializer_class = self.get_serializer_class()
+        # the compiled serializer plans its own queries
+        queryset = super(QueryPlanMixin, self).filter_queryset(self.get_queryset())
+        context = self.get_serializer_context()
+        if self.paginator is None:
+            return Response(get_values_representation(serializer_class, queryset, context))
+
+        opts = queryset.model._meta
+        keys = [opts.pk.attname] + [opts.get_field(name.lstrip('-')).attname for name in getattr(self, 'ordering', ())]
+        page = self.paginate_queryset(queryset.values(*OrderedDict.fromkeys(keys)))
+        pks = [row[opts.pk.attname] for row in page]
+        return self.get_paginated_response(get_pks_representation(serializer_class, pks, context))
+
+
+class CompactListMixin(FastListMixin):
+    """
+    Serve ?compact=true lists with relations side loaded once in an `included` map,
+    see libs.side_loading.
+    """
+    def is_compact(self):
+        return self.request.query_params.get('compact', '').lower() in ('1', 'true')
+
+    def get_shape(self):
+        shape = super(CompactListMixin, self).get_shape()
+        if self.request.method == 'GET' and self.is_compact():
+            serializer_class = self.get_serializer_class()
+            return get_compact_shape(serializer_class, serializer_class.included_serializers, shape)
+        return shape
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_compact():
+            return super(CompactListMixin, self).list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        data = get_compact_representation(self.get_serializer_class(), list(queryset if page is None else page),
+                                          self.get_serializer_context(), super(CompactListMixin, self).get_shape())
+        if page is None:
+            return Response(data)
+
+        response = self.get_paginated_response(data['results'])
+        response.data['included'] = data['included']
+        return response
+
+
+class ConditionalGetMixin(object):
+    """
+    Tag GET responses with an ETag and Last-Modified made of the version counters of
+    get_version_keys(), the tables of `version_models` by default, see libs.table_versions.
+    A request whose If-None-Match or If-Modified-Since still matches is answered 304
+    before the queryset is read.
+    """
+    version_models = ()
+    cache_control = {'private': True, 'no_cache': True}
+
+    def get_version_keys(self):
+        return [table_key(model) for model in self.version_models]
+
+    def get(self, request, *args, **kwargs):
+        versions = get_versions(self.get_version_keys())
+        etag = quote_etag(get_etag(request, versions))
+        last_modified = get_last_modified(versions)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super(ConditionalGetMixin, self).get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, **self.cache_control)
+        return response
@@ -0,0 +1,133 @@
+"""
+Keyset (cursor) pagination for high volume lists.
+
+A page is read with WHERE (ordering columns) after (the cursor's values) ORDER BY ... LIMIT,
+so every page costs the same index range scan whatever its depth, unlike OFFSET. The view's
+`ordering` has to end with a unique column (id) so ties are stable.
+
+- cursor: opaque position of the page, from the next and previous links
+- count=false: Skip the total count query
+- page: Clients still sending page numbers are served by PageNumberPagination
+
+Pages of values() querysets need the attnames of the ordering columns among their keys.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class _Row(object):
+    """
+    Attribute access to a values() row, for the model fields to read.
+    """
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+
+def _reverse_ordering(ordering):
+    return [name[1:] if name.startswith('-') else '-' + name for name in ordering]
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_query_param = 'page'
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.fallback = None
+        if self.page_query_param in request.query_params:
+            self.fallback = PageNumberPagination()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.cursor_query_param)
+        self.ordering = list(getattr(view, 'ordering', self.ordering))
+        self.fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+        self.count = queryset.count() if self.should_count(request) else None
+
+        reverse, position = self.decode_cursor(request)
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = position is not None, has_more
+        self.page = results
+        return results
+
+    def should_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() not in ('0', 'false')
+
+    def get_keyset_filter(self, ordering, position):
+        """
+        return Q of the rows after the position in the ordering.
+        """
+        keyset_filter = Q()
+        for index, name in enumerate(ordering):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition = Q(**{"{}__{}".format(name.lstrip('-'), lookup): position[index]})
+            for field, value in zip(self.fields[:index], position[:index]):
+                condition &= Q(**{field.name: value})
+            keyset_filter |= condition
+        return keyset_filter
+
+    def decode_cursor(self, request):
+        """
+        return (reverse, position) of the cursor, (False, None) for the first page.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            reverse, values = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if len(values) != len(self.fields):
+                raise ValueError(encoded)
+            return bool(reverse), [field.to_python(value) for field, value in zip(self.fields, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        if isinstance(instance, dict):
+            instance = _Row(instance)
+        values = [field.value_to_string(instance) for field in self.fields]
+        encoded = urlsafe_b64encode(json.dumps([int(reverse), values]).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], True)
+
+    def get_paginated_response(self, data):
+        if self.fallback:
+            return self.fallback.get_paginated_response(data)
+
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
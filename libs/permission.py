@@ -1,11 +1,10 @@
-from django.contrib.auth import get_user_model
 from rest_framework import permissions
 
-from entities.appointment.models import Appointment
+from entities.appointment.models import Appointment, Visit
 from entities.notification.models import Notification
 from entities.person.models import Doctor
-
-User = get_user_model()
+from libs.clinic_membership import get_clinic_ids, share_clinic
+from libs.identity_map import get_request_object
 
 
 class UserAccessPermission(permissions.BasePermission):
@@ -18,99 +17,73 @@ class UserAccessPermission(permissions.BasePermission):
 class IsOwner(permissions.BasePermission):
 
     def has_permission(self, request, view):
-        try:
-            user = User.objects.get(pk=view.kwargs['pk'])
-            if request.user == user:
-                return True
-            return False
-        except User.DoesNotExist:
-            return False
+        return str(request.user.pk) == str(view.kwargs['pk'])
 
 
 class PatientPermission(UserAccessPermission):
 
     def has_permission(self, request, view):
-        return super(PatientPermission, self).has_permission(request, view) and hasattr(request.user, 'patient')
+        return super(PatientPermission, self).has_permission(request, view) and request.user.is_patient()
 
 
 class DoctorPermission(UserAccessPermission):
 
     def has_permission(self, request, view):
-        return super(DoctorPermission, self).has_permission(request, view) and hasattr(request.user, 'doctor')
+        return super(DoctorPermission, self).has_permission(request, view) and request.user.is_doctor()
 
 
 class PatientDoctorPermission(UserAccessPermission):
 
     def has_permission(self, request, view):
         return super(PatientDoctorPermission, self).has_permission(request, view) and \
-               (hasattr(request.user, 'patient') or hasattr(request.user, 'doctor'))
+               (request.user.is_patient() or request.user.is_doctor())
+
+
+class ClinicMemberPermission(PatientDoctorPermission):
+
+    def has_permission(self, request, view):
+        return super(ClinicMemberPermission, self).has_permission(request, view) and \
+               int(view.kwargs['pk']) in get_clinic_ids(request.user.id)
 
 
 class PatientOwnerPermission(IsOwner):
     def has_permission(self, request, view):
         return super(PatientOwnerPermission, self).has_permission(request, view) \
-               and hasattr(request.user, 'patient')
+               and request.user.is_patient()
 
 
 class DoctorOwnerPermission(IsOwner):
     def has_permission(self, request, view):
         return super(DoctorOwnerPermission, self).has_permission(request, view) \
-               and hasattr(request.user, 'doctor')
+               and request.user.is_doctor()
 
 
 class AppointmentOwnerPermission(permissions.BasePermission):
     def has_permission(self, request, view):
-        try:
-            appointment = Appointment.objects.get(pk=view.kwargs['appointment_id'])
-            if request.user.id == appointment.doctor.id or request.user.id == appointment.patient.id:
-                return True
-            return False
-        except Appointment.DoesNotExist:
-            return False
+        appointment = get_request_object(request, view, Appointment, view.kwargs['appointment_id'])
+        return appointment is not None and request.user.id in (appointment.doctor_id, appointment.patient_id)
 
 
 class PKAppointmentOwnerPermission(permissions.BasePermission):
     def has_permission(self, request, view):
-        try:
-            appointment = Appointment.objects.get(pk=view.kwargs['pk'])
-            if request.user.id == appointment.doctor.id or request.user.id == appointment.patient.id:
-                return True
-            return False
-        except Appointment.DoesNotExist:
-            return False
+        appointment = get_request_object(request, view, Appointment, view.kwargs['pk'])
+        return appointment is not None and request.user.id in (appointment.doctor_id, appointment.patient_id)
 
 
 class PatientBelongsDoctorPermission(permissions.BasePermission):
     def has_permission(self, request, view):
-        try:
-            doctor = Doctor.objects.get(pk=view.kwargs['pk'])
-            patient_clinics = request.user.patient.clinic.all().values_list('id', flat=True)
-            doctor_clinics = doctor.clinic.all().values_list('id', flat=True)
-            if any(patient_clinic in doctor_clinics for patient_clinic in patient_clinics):
-                return True
-            return False
-        except Doctor.DoesNotExist:
+        if not request.user.is_patient() or not share_clinic(request.user.id, view.kwargs['pk']):
             return False
+        return get_request_object(request, view, Doctor, view.kwargs['pk']) is not None
 
 
 class AppointmentVisitPermission(permissions.BasePermission):
     def has_permission(self, request, view):
-        try:
-            appointment = Appointment.objects.get(pk=view.kwargs['appointment_id'])
-            if hasattr(appointment, 'visit'):
-                if appointment.visit.id == int(view.kwargs['pk']):
-                    return True
-            return False
-        except Appointment.DoesNotExist:
-            return False
+        visit = get_request_object(request, view, Visit, view.kwargs['pk'])
+        return visit is not None and visit.appointment_id == int(view.kwargs['appointment_id'])
 
 
 class PKNotificationOwnerPermission(permissions.BasePermission):
     def has_permission(self, request, view):
-        try:
-            notification = Notification.objects.get(pk=view.kwargs['pk'])
-            if request.user.id == notification.user.id:
-                return True
-            return False
-        except Notification.DoesNotExist:
-            return False
\ No newline at end of file
+        notification = get_request_object(request, view, Notification, view.kwargs['pk'])
+        return notification is not None and request.user.id == notification.user_id
@@ -0,0 +1,301 @@
+"""
+Derive select_related, prefetch_related and annotations from a serializer tree.
+
+The tree is made of the serializer's declared nested serializers and relation fields,
+the serializers it nests by hand in to_representation listed in `related_serializers`
+and the annotations its method fields read listed in `query_annotations`:
+
+    class AppointmentSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
+        related_serializers = {'doctor': DoctorSerializer}
+
+    class DoctorSerializer(RelatedRepresentationMixin, serializers.ModelSerializer):
+        query_annotations = {'patients_seen': {'patients_seen_count': ...}}
+
+Single relations are joined with select_related, many relations and relations to
+serializers with annotations are prefetched with their own planned queryset, so a
+page costs one query per prefetched relation whatever its size.
+
+The tree can be cut down to a shape, parsed from ?fields= and ?expand=:
+
+    ?fields=id,status,doctor.first_name&expand=clinic
+
+gives id, status, doctor with first_name only, clinic in full and nothing else. A relation
+asked for in fields without being expanded is given as its id(s). Without fields the whole
+tree is served as before. Relations left out of the shape are neither serialized nor fetched.
+
+Plans of whole trees are kept for the life of the process, plans of shapes, as many as
+the clients ask for, in an LRU cache.
+
+- QUERY_PLAN_CACHE_SIZE: Max No. of plans of shapes kept per process
+"""
+import threading
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.db.models import Prefetch
+from rest_framework.fields import SkipField
+from rest_framework.relations import ManyRelatedField, PKOnlyObject
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from quicklic_backend import settings
+
+QUERY_PLAN_CACHE_SIZE = getattr(settings, 'QUERY_PLAN_CACHE_SIZE', 256)
+
+_plans = {}
+_shaped_plans = OrderedDict()
+_shaped_plans_lock = threading.Lock()
+
+
+def _get_cached_plan(key):
+    if key[1] is None:
+        return _plans.get(key)
+    with _shaped_plans_lock:
+        plan = _shaped_plans.get(key)
+        if plan is not None:
+            _shaped_plans.move_to_end(key)
+        return plan
+
+
+def _set_cached_plan(key, plan):
+    if key[1] is None:
+        _plans[key] = plan
+        return
+    with _shaped_plans_lock:
+        _shaped_plans[key] = plan
+        while len(_shaped_plans) > QUERY_PLAN_CACHE_SIZE:
+            _shaped_plans.popitem(last=False)
+
+
+def _get_parent_shape(shape, names):
+    """
+    return shape the last of the names goes in, None when there is nothing to add.
+    """
+    if not names:
+        return None
+    node = shape
+    for name in names[:-1]:
+        child = node.get(name, False)
+        if child is None:
+            return None
+        if child is False:
+            child = node[name] = {}
+        node = child
+    return node
+
+
+def parse_shape(fields=None, expand=None):
+    """
+    return shape of the comma separated field and expand paths, None for every field.
+
+    A shape is {field name: None expanded in full, a shape expanded with those fields
+    or False not expanded}.
+    """
+    if not fields:
+        return None
+
+    shape = {}
+    for path in fields.split(','):
+        names = [name for name in path.strip().split('.') if name]
+        node = _get_parent_shape(shape, names)
+        if node is not None:
+            node.setdefault(names[-1], False)
+
+    for path in (expand or '').split(','):
+        names = [name for name in path.strip().split('.') if name]
+        node = _get_parent_shape(shape, names)
+        if node is not None and node.get(names[-1], False) is False:
+            node[names[-1]] = None
+    return shape
+
+
+def get_field_shape(shape, name):
+    """
+    return (included, shape) of the field in the shape.
+    """
+    if shape is None:
+        return True, None
+    if name not in shape:
+        return False, None
+    return True, shape[name]
+
+
+def _freeze(shape):
+    if not isinstance(shape, dict):
+        return shape
+    return tuple(sorted((name, _freeze(child)) for name, child in shape.items()))
+
+
+def _is_relation(serializer, field):
+    return field.field_name in serializer.related_serializers or isinstance(field, BaseSerializer)
+
+
+def get_pk_representation(instance, source):
+    model_field = instance._meta.get_field(source)
+    if model_field.many_to_many or model_field.one_to_many:
+        return [related.pk for related in getattr(instance, source).all()]
+    if model_field.concrete:
+        return instance.serializable_value(source)
+    try:
+        return getattr(instance, source).pk
+    except ObjectDoesNotExist:
+        return None
+
+
+class RelatedRepresentationMixin(object):
+    """
+    Replace relations in the representation with the serializers of `related_serializers`
+    and serve only the fields of `shape`, see parse_shape.
+    """
+    related_serializers = {}
+    query_annotations = {}
+
+    def __init__(self, *args, **kwargs):
+        self.shape = kwargs.pop('shape', None)
+        super(RelatedRepresentationMixin, self).__init__(*args, **kwargs)
+
+    def get_related_representation(self, instance, name, shape):
+        serializer_class = self.related_serializers[name]
+        value = getattr(instance, name)
+        if hasattr(value, 'all'):
+            return serializer_class(value.all(), many=True, context=self.context, shape=shape).data
+        if value:
+            return serializer_class(value, context=self.context, shape=shape).data
+        return None
+
+    def to_representation(self, instance):
+        data = OrderedDict()
+        for field in self._readable_fields:
+            included, shape = get_field_shape(self.shape, field.field_name)
+            if not included:
+                continue
+
+            if _is_relation(self, field):
+                if shape is False:
+                    data[field.field_name] = get_pk_representation(instance, field.source)
+                    continue
+                if field.field_name in self.related_serializers:
+                    data[field.field_name] = self.get_related_representation(instance, field.field_name, shape)
+                    continue
+                nested = field.child if isinstance(field, ListSerializer) else field
+                nested.shape = shape
+
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            data[field.field_name] = None if check_for_none is None else field.to_representation(attribute)
+        return data
+
+
+def _get_relations(serializer_class, shape):
+    """
+    return {source: (nested serializer class or None, its shape)} of the fields in the shape.
+    """
+    related_serializers = getattr(serializer_class, 'related_serializers', {})
+    relations = {}
+    for name, field in serializer_class().fields.items():
+        included, field_shape = get_field_shape(shape, name)
+        if field.write_only or not included or not field.source or '.' in field.source or field.source == '*':
+            continue
+        if name in related_serializers:
+            child_class = related_serializers[name]
+        elif isinstance(field, ListSerializer):
+            child_class = field.child.__class__
+        elif isinstance(field, BaseSerializer):
+            child_class = field.__class__
+        elif isinstance(field, ManyRelatedField):
+            child_class = None
+        else:
+            continue
+        relations[field.source] = (None, None) if field_shape is False else (child_class, field_shape)
+    return relations
+
+
+def get_query_plan(serializer_class, shape=None):
+    """
+    return (select_related, prefetches, annotations) of the serializer, prefetches are
+    (lookup, related model, plan of the related serializer or None) tuples.
+    """
+    key = (serializer_class, _freeze(shape))
+    plan = _get_cached_plan(key)
+    if plan is not None:
+        return plan
+
+    model = serializer_class.Meta.model
+    select_related = []
+    prefetches = []
+    for source, (child_class, child_shape) in _get_relations(serializer_class, shape).items():
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            continue
+        if not model_field.is_relation:
+            continue
+
+        many = model_field.many_to_many or model_field.one_to_many
+        if not child_class and model_field.concrete and not many:
+            # the id is on the row already
+            continue
+
+        child_plan = get_query_plan(child_class, child_shape) if child_class else None
+        if many or (child_plan and child_plan[2]):
+            prefetches.append((source, model_field.related_model, child_plan))
+        else:
+            select_related.append(source)
+            if child_plan:
+                child_select, child_prefetches, child_annotations = child_plan
+                select_related.extend("{}__{}".format(source, lookup) for lookup in child_select)
+                prefetches.extend(("{}__{}".format(source, lookup), related_model, plan)
+                                  for lookup, related_model, plan in child_prefetches)
+
+    annotations = {}
+    for name, field_annotations in getattr(serializer_class, 'query_annotations', {}).items():
+        if get_field_shape(shape, name)[0]:
+            annotations.update(field_annotations)
+
+    plan = (select_related, prefetches, annotations)
+    _set_cached_plan(key, plan)
+    return plan
+
+
+def _get_prefetches(lookup, related_model, plan):
+    """
+    return Prefetch objects of the lookup and its nested prefetches.
+
+    Nested prefetches are separate lookups rather than part of the related queryset, so
+    they still apply when the relation is already cached, e.g. the doctor of
+    doctor.appointments.all().
+    """
+    related_queryset = related_model._default_manager.all()
+    if not plan:
+        return [Prefetch(lookup, queryset=related_queryset)]
+
+    select_related, prefetches, annotations = plan
+    if select_related:
+        related_queryset = related_queryset.select_related(*select_related)
+    if annotations:
+        related_queryset = related_queryset.annotate(**annotations)
+
+    lookups = [Prefetch(lookup, queryset=related_queryset)]
+    for child_lookup, child_model, child_plan in prefetches:
+        lookups.extend(_get_prefetches("{}__{}".format(lookup, child_lookup), child_model, child_plan))
+    return lookups
+
+
+def apply_query_plan(queryset, plan):
+    select_related, prefetches, annotations = plan
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    for lookup, related_model, child_plan in prefetches:
+        queryset = queryset.prefetch_related(*_get_prefetches(lookup, related_model, child_plan))
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+    return queryset
+
+
+def optimize_queryset(queryset, serializer_class, shape=None):
+    """
+    return the queryset loading everything the serializer reads for the shape.
+    """
+    return apply_query_plan(queryset, get_query_plan(serializer_class, shape))
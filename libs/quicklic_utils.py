@@ -1,5 +1,8 @@
 from entities.appointment.models import Appointment
 from entities.notification.models import Notification
+from libs.availability_cache import invalidate_days, invalidate_windows
+from libs.counters import update_status
+from libs.slot_inventory import on_appointment_changed
 from libs.utils import get_start_datetime_from_date_string, get_end_datetime_from_date_string
 
 
@@ -8,6 +11,32 @@ def cancel_appointments_of_day_and_send_notify(date_to_cancel, doctor_id):
     date_end = get_end_datetime_from_date_string(str(date_to_cancel))
 
     appointments = Appointment.objects.filter(start_datetime__gte=date_start, end_datetime__lte=date_end, doctor_id=doctor_id)
-    appointments.update(status=Appointment.Status.DISCARD)
+    update_status(appointments, Appointment.Status.DISCARD)
+    on_appointment_changed(doctor_id, [(date_start, date_end)])
+    invalidate_days(doctor_id, [date_to_cancel])
+
+    Notification.create_batch_notification_for_discard(appointments=appointments)
+
+
+def discard_appointments_and_send_notify(doctor_id, start, end):
+    """
+    Discard pending and confirmed appointments of the doctor overlapping start and end
+    with a single update, their patients are notified with a single push.
+    """
+    appointments = list(Appointment.objects.filter(
+        doctor_id=doctor_id,
+        start_datetime__lte=end,
+        end_datetime__gte=start,
+        status__in=[Appointment.Status.PENDING, Appointment.Status.CONFIRM],
+    ).select_related('patient', 'doctor', 'clinic'))
+    if not appointments:
+        return
+
+    update_status(Appointment.objects.filter(id__in=[appointment.id for appointment in appointments]),
+                  Appointment.Status.DISCARD)
+    for appointment in appointments:
+        appointment.status = Appointment.Status.DISCARD
+    on_appointment_changed(doctor_id, [(start, end)])
+    invalidate_windows(doctor_id, [(start, end)])
 
     Notification.create_batch_notification_for_discard(appointments=appointments)
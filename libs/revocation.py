@@ -0,0 +1,143 @@
+"""
+Revocation of tokens before they expire.
+
+Revoked tokens are kept by id in RevokedToken until they expire. Every process holds a
+Bloom filter of the ids, so nearly every request is cleared without a query and only
+the ids the filter probably holds are looked up in the table. A process rebuilds its
+filter when the revocation version in the shared cache changed, bumped by every
+revocation once committed, and every REVOCATION_REBUILD_SECONDS to drop expired ids.
+
+- REVOCATION_ALIAS: Alias of the cache in CACHES keeping the version, shared between processes
+- REVOCATION_REBUILD_SECONDS: Max age of the filter of a process
+- REVOCATION_FILTER_CAPACITY: Min No. of ids a filter is sized for
+- REVOCATION_FILTER_ERROR_RATE: False positive rate of a filter holding its capacity
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime
+
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from entities.person.models import RevokedToken
+from quicklic_backend import settings
+
+REVOCATION_ALIAS = getattr(settings, 'REVOCATION_ALIAS', 'default')
+REVOCATION_REBUILD_SECONDS = getattr(settings, 'REVOCATION_REBUILD_SECONDS', 3600)
+REVOCATION_FILTER_CAPACITY = getattr(settings, 'REVOCATION_FILTER_CAPACITY', 10000)
+REVOCATION_FILTER_ERROR_RATE = getattr(settings, 'REVOCATION_FILTER_ERROR_RATE', 0.001)
+
+VERSION_KEY = "revocation:version"
+
+
+class BloomFilter(object):
+    """
+    Bloom filter of strings sized for the capacity at the error rate, positions are
+    derived from the two halves of the md5 of a value.
+    """
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(float(self.size) / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.md5(value.encode('utf-8')).hexdigest()
+        first, second = int(digest[:16], 16), int(digest[16:], 16) | 1
+        return [(first + index * second) % self.size for index in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+_filter = {'version': None, 'built_at': 0, 'filter': None}
+_lock = threading.Lock()
+
+
+def _get_cache():
+    return caches[REVOCATION_ALIAS]
+
+
+def _get_version():
+    cache = _get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _bump_version():
+    cache = _get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+
+
+def _build_filter():
+    token_ids = list(RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('token_id', flat=True))
+    bloom_filter = BloomFilter(max(REVOCATION_FILTER_CAPACITY, 2 * len(token_ids)), REVOCATION_FILTER_ERROR_RATE)
+    for token_id in token_ids:
+        bloom_filter.add(token_id)
+    return bloom_filter
+
+
+def get_filter():
+    """
+    return the process' filter, rebuilt first if it's out of date.
+    """
+    # the version is read before the ids, a revocation in between leaves the filter out of date
+    version = _get_version()
+    with _lock:
+        if _filter['version'] != version or time.time() - _filter['built_at'] > REVOCATION_REBUILD_SECONDS:
+            _filter.update(filter=_build_filter(), version=version, built_at=time.time())
+        return _filter['filter']
+
+
+def reset_filter():
+    """
+    Drop the process' filter, it's rebuilt on the next check.
+    """
+    with _lock:
+        _filter.update(filter=None, version=None, built_at=0)
+
+
+def get_token_id(token, claims):
+    """
+    return id of the token, the digest of tokens issued without one.
+    """
+    return claims.get('jti') or hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def is_revoked(token_id):
+    if token_id not in get_filter():
+        return False
+    return RevokedToken.objects.filter(token_id=token_id).exists()
+
+
+def revoke_token(token, claims, user_id):
+    """
+    Revoke the token until it expires.
+    """
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(token_id=get_token_id(token, claims), user_id=user_id,
+                                        expires_at=datetime.fromtimestamp(claims['exp']))
+    except IntegrityError:
+        return
+    transaction.on_commit(_bump_version)
+
+
+def prune_revoked_tokens():
+    """
+    Delete the revoked tokens that expired by now.
+    return: No. of deleted tokens
+    """
+    return RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()[0]
@@ -0,0 +1,37 @@
+"""
+Role resolution of the request's user.
+
+User.role tells which of Doctor, Patient or Moderator a user is, so role checks need
+no query and the user's Doctor, Patient or Moderator instance is loaded once per
+request with a single query, instead of probing the child tables with hasattr().
+"""
+from entities.person.models import Doctor, Moderator, Patient, User
+
+ROLE_MODELS = {
+    User.Role.DOCTOR: Doctor,
+    User.Role.PATIENT: Patient,
+    User.Role.ADMIN: Moderator,
+}
+
+
+def get_role_instance(user):
+    """
+    return Doctor, Patient or Moderator instance of the user, None without a role.
+    """
+    model = ROLE_MODELS.get(getattr(user, 'role', None))
+    if model is None:
+        return None
+    if issubclass(type(user), model):
+        return user
+    return model._default_manager.filter(pk=user.pk).first()
+
+
+def get_principal(request):
+    """
+    return Doctor, Patient or Moderator instance of the request's user, attached to the
+    request as `principal` the first time.
+    """
+    principal = getattr(request, 'principal', None)
+    if principal is None or principal.pk != request.user.pk:
+        principal = request.principal = get_role_instance(request.user)
+    return principal
@@ -0,0 +1,135 @@
+"""
+Compact weekly schedule of a doctor setting.
+
+Working hours are kept as minutes since midnight in a single flat array of
+(start, end) pairs, an offsets array points to the pairs of every weekday so a day
+is looked up in O(1). A day can have multiple ranges, e.g. with a lunch break.
+
+MONDAY 0, TUESDAY 1, WEDNESDAY 2, THURSDAY 3, FRIDAY 4, SATURDAY 5, SUNDAY 6
+"""
+from array import array
+from datetime import time
+
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+MINUTES_IN_DAY = 24 * 60
+
+
+def to_minutes(value):
+    """
+    convert time or "HH:MM" string to minutes since midnight.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        hour, minute = value.split(":")[:2]
+        value = time(int(hour), int(minute))
+    return value.hour * 60 + value.minute
+
+
+def to_time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+def format_minutes(minutes):
+    return "{:02d}:{:02d}".format(minutes // 60, minutes % 60)
+
+
+def parse_breaks(value):
+    """
+    parse breaks like "0:13:00-14:00,4:13:00-14:30" into {day_number: [(start, end)]}.
+
+    raises ValueError for malformed breaks.
+    """
+    breaks = {}
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        day, timings = item.split(":", 1)
+        start, end = timings.split("-")
+        day, start, end = int(day), to_minutes(start.strip()), to_minutes(end.strip())
+        if day not in range(len(DAYS)) or not 0 <= start < end < MINUTES_IN_DAY:
+            raise ValueError("Invalid break {}".format(item))
+        breaks.setdefault(day, []).append((start, end))
+    return breaks
+
+
+def _subtract(start, end, breaks):
+    ranges = []
+    for break_start, break_end in sorted(breaks):
+        if break_end <= start or break_start >= end:
+            continue
+        if break_start > start:
+            ranges.append((start, break_start))
+        start = max(start, break_end)
+    if start < end:
+        ranges.append((start, end))
+    return ranges
+
+
+class WeeklySchedule:
+    """
+    Immutable weekly schedule, build it with WeeklySchedule.from_setting.
+    """
+    __slots__ = ('_minutes', '_offsets', '_breaks')
+
+    def __init__(self, day_ranges, breaks=""):
+        minutes = array('H')
+        offsets = array('H', [0])
+        for ranges in day_ranges:
+            for start, end in ranges:
+                minutes.append(start)
+                minutes.append(end)
+            offsets.append(len(minutes))
+        self._minutes = minutes
+        self._offsets = offsets
+        self._breaks = breaks
+
+    @classmethod
+    def from_setting(cls, setting):
+        breaks = parse_breaks(setting.breaks)
+        day_ranges = []
+        for day_number, day in enumerate(DAYS):
+            start = to_minutes(getattr(setting, "{}_start".format(day)))
+            end = to_minutes(getattr(setting, "{}_end".format(day)))
+            if start is None or end is None or start >= end:
+                day_ranges.append([])
+            else:
+                day_ranges.append(_subtract(start, end, breaks.get(day_number, [])))
+        return cls(day_ranges, setting.breaks or "")
+
+    def get_ranges(self, day_number):
+        """
+        return ((start, end), ...) in minutes since midnight for the day.
+        """
+        minutes = self._minutes[self._offsets[day_number]:self._offsets[day_number + 1]]
+        return tuple(zip(minutes[::2], minutes[1::2]))
+
+    def get_time_ranges(self, day_number):
+        return [(to_time(start), to_time(end)) for start, end in self.get_ranges(day_number)]
+
+    def is_working(self, day_number):
+        return self._offsets[day_number] != self._offsets[day_number + 1]
+
+    def get_day_timings(self, day_number):
+        """
+        return first start and last end time of the day, (None, None) when off.
+        """
+        if not self.is_working(day_number):
+            return None, None
+        return to_time(self._minutes[self._offsets[day_number]]), \
+            to_time(self._minutes[self._offsets[day_number + 1] - 1])
+
+    def get_breaks(self):
+        return self._breaks
+
+    def diff(self, other):
+        """
+        return day numbers of which the ranges differ from the other schedule.
+        """
+        return [day_number for day_number in range(len(DAYS))
+                if self.get_ranges(day_number) != other.get_ranges(day_number)]
+
+    def __eq__(self, other):
+        return isinstance(other, WeeklySchedule) and self._minutes == other._minutes \
+            and self._offsets == other._offsets
@@ -0,0 +1,81 @@
+"""
+Compact list representation with side loaded relations.
+
+Rows carry the ids of the relations named in the serializer's `included_serializers`
+and every distinct related object is serialized once, by that serializer, in an
+`included` map of {field name: {id: data}}:
+
+    {
+        "results": [{"id": 1, "doctor": 3, "clinic": 2, ...}],
+        "included": {"doctor": {"3": {...}}, "clinic": {"2": {...}}}
+    }
+
+Relations in `related_serializers` which are not side loaded, e.g. the appointment of
+a visit, stay inline with their own side loaded relations given as ids as well.
+"""
+from collections import OrderedDict
+
+from libs.query_plan import get_field_shape, get_pk_representation, optimize_queryset
+
+
+def get_compact_shape(serializer_class, included_serializers, shape=None):
+    """
+    return shape serving the side loaded relations of the serializer as ids.
+    """
+    serializer = serializer_class()
+    related_serializers = getattr(serializer, 'related_serializers', {})
+    compact = {}
+    for name, field in serializer.fields.items():
+        included, field_shape = get_field_shape(shape, name)
+        if field.write_only or not included:
+            continue
+        if name in included_serializers:
+            compact[name] = False
+        elif name in related_serializers and field_shape is not False:
+            compact[name] = get_compact_shape(related_serializers[name], included_serializers, field_shape)
+        else:
+            compact[name] = field_shape
+    return compact
+
+
+def _collect(serializer_class, instances, included_serializers, shape, collected):
+    """
+    Add the ids of the side loaded objects of the instances to collected {name: (shape, ids)}.
+    """
+    for name, related_class in getattr(serializer_class, 'related_serializers', {}).items():
+        included, field_shape = get_field_shape(shape, name)
+        if not included or field_shape is False and name not in included_serializers:
+            continue
+
+        if name in included_serializers:
+            ids = collected.setdefault(name, (field_shape or None, OrderedDict()))[1]
+            for instance in instances:
+                value = get_pk_representation(instance, name)
+                for pk in (value if isinstance(value, list) else [value]):
+                    if pk is not None:
+                        ids[pk] = True
+        else:
+            values = [getattr(instance, name) for instance in instances]
+            _collect(related_class, [value for value in values if value], included_serializers, field_shape, collected)
+
+
+def get_compact_representation(serializer_class, instances, context, shape=None):
+    """
+    return {"results": rows, "included": {name: {id: data}}} of the instances, which
+    should be loaded for get_compact_shape. Every side loaded relation costs one query.
+    """
+    included_serializers = serializer_class.included_serializers
+    rows = serializer_class(instances, many=True, context=context,
+                            shape=get_compact_shape(serializer_class, included_serializers, shape)).data
+
+    collected = OrderedDict()
+    _collect(serializer_class, instances, included_serializers, shape, collected)
+
+    included = OrderedDict()
+    for name, (included_shape, ids) in collected.items():
+        included_class = included_serializers[name]
+        objects = list(optimize_queryset(included_class.Meta.model._default_manager.filter(pk__in=list(ids)),
+                                         included_class, included_shape).order_by('pk'))
+        data = included_class(objects, many=True, context=context, shape=included_shape).data
+        included[name] = OrderedDict((str(obj.pk), item) for obj, item in zip(objects, data))
+    return {"results": rows, "included": included}
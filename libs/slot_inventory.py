@@ -0,0 +1,256 @@
+"""
+Slot inventory keeps the materialized DoctorSlot table in sync.
+
+- SLOT_INVENTORY_ENABLED: Maintain the inventory and serve slot reads from it
+- SLOT_INVENTORY_HORIZON: No. of days, starting today, the inventory is built for
+
+The horizon is built in bulk with the build_slot_inventory command, which should be
+run daily to roll it forward. After that appointments, leaves and settings update
+only the slots they touch. Slots of days fully on leave are HOLIDAY, slots overlapping
+a partial day leave are BOOKED.
+"""
+from datetime import datetime, timedelta
+
+from django.db import transaction
+
+from entities.appointment.models import Appointment, DoctorSlot
+from entities.person.models import DoctorSetting
+from libs.availability import build_engines, build_busy_index, mark_slots
+from libs.leave import get_leaves
+from libs.utils import get_start_datetime_from_date_string, get_end_datetime_from_date_string
+from quicklic_backend import settings
+
+SLOT_INVENTORY_ENABLED = getattr(settings, 'SLOT_INVENTORY_ENABLED', False)
+SLOT_INVENTORY_HORIZON = getattr(settings, 'SLOT_INVENTORY_HORIZON', 30)
+
+
+def get_horizon():
+    start_day = datetime.now().date()
+    return start_day, start_day + timedelta(days=SLOT_INVENTORY_HORIZON - 1)
+
+
+def is_within_horizon(start_day, end_day):
+    horizon_start, horizon_end = get_horizon()
+    return horizon_start <= start_day and end_day <= horizon_end
+
+
+def _generate_slots(engine, start_day, end_day):
+    slots = []
+    day = start_day
+    while day <= end_day:
+        is_holiday = engine.is_holiday(day)
+        for slot in engine.get_working_slots(day):
+            if is_holiday:
+                state = DoctorSlot.State.HOLIDAY
+            elif slot['available']:
+                state = DoctorSlot.State.AVAILABLE
+            else:
+                state = DoctorSlot.State.BOOKED
+
+            slots.append(DoctorSlot(
+                doctor_id=engine.setting.physician_id,
+                clinic_id=engine.setting.clinic_id,
+                start_datetime=slot['start'],
+                end_datetime=slot['end'],
+                state=state,
+            ))
+        day += timedelta(days=1)
+    return slots
+
+
+def _busy_appointments(doctor_ids, start_day, end_day):
+    return Appointment.objects.filter(
+        doctor_id__in=doctor_ids,
+        start_datetime__gte=get_start_datetime_from_date_string(str(start_day)),
+        end_datetime__lte=get_end_datetime_from_date_string(str(end_day)),
+    ).exclude(status=Appointment.Status.CANCEL).order_by('start_datetime')
+
+
+@transaction.atomic
+def build_inventory(settings_queryset, start_day, end_day):
+    """
+    (Re)build slots of the given settings between start_day and end_day.
+
+    Leaves and appointments of all the doctors are read with a single query each.
+    Returns the number of slots created.
+    """
+    settings_list = list(settings_queryset)
+    doctor_ids = set(setting.physician_id for setting in settings_list)
+
+    engines = build_engines(
+        settings_list,
+        get_leaves(doctor_ids, start_day, end_day),
+        _busy_appointments(doctor_ids, start_day, end_day),
+    )
+
+    slots = []
+    for engine in engines:
+        DoctorSlot.objects.filter(
+            doctor_id=engine.setting.physician_id,
+            clinic_id=engine.setting.clinic_id,
+            start_datetime__gte=get_start_datetime_from_date_string(str(start_day)),
+            start_datetime__lte=get_end_datetime_from_date_string(str(end_day)),
+        ).delete()
+        slots.extend(_generate_slots(engine, start_day, end_day))
+
+    DoctorSlot.objects.bulk_create(slots, batch_size=1000)
+    return len(slots)
+
+
+def rebuild_setting_inventory(setting):
+    start_day, end_day = get_horizon()
+    build_inventory([setting], start_day, end_day)
+
+
+def refresh_doctor_slots(doctor_id, start, end):
+    """
+    Recompute BOOKED/AVAILABLE state of the doctor's slots overlapping start and end
+    from appointments and partial day leaves.
+    """
+    slots = list(DoctorSlot.objects.filter(
+        doctor_id=doctor_id,
+        start_datetime__lte=end,
+        end_datetime__gte=start,
+    ).exclude(state=DoctorSlot.State.HOLIDAY).order_by('start_datetime').values('id', 'start_datetime', 'end_datetime'))
+    if not slots:
+        return
+
+    appointments = Appointment.objects.filter(
+        doctor_id=doctor_id,
+        start_datetime__lte=slots[-1]['end_datetime'],
+        end_datetime__gte=slots[0]['start_datetime'],
+    ).exclude(status=Appointment.Status.CANCEL).values_list('start_datetime', 'end_datetime')
+    leaves = get_leaves([doctor_id], slots[0]['start_datetime'], slots[-1]['end_datetime']).\
+        values_list('start_datetime', 'end_datetime')
+
+    intervals = [{
+        "id": slot['id'],
+        "start": slot['start_datetime'],
+        "end": slot['end_datetime'],
+        "available": True,
+    } for slot in slots]
+    mark_slots(intervals, build_busy_index(list(appointments) + list(leaves)))
+
+    available_ids = [interval['id'] for interval in intervals if interval['available']]
+    booked_ids = [interval['id'] for interval in intervals if not interval['available']]
+    if available_ids:
+        DoctorSlot.objects.filter(id__in=available_ids).update(state=DoctorSlot.State.AVAILABLE)
+    if booked_ids:
+        DoctorSlot.objects.filter(id__in=booked_ids).update(state=DoctorSlot.State.BOOKED)
+
+
+def refresh_doctor_day(doctor_id, day):
+    refresh_doctor_slots(
+        doctor_id,
+        get_start_datetime_from_date_string(str(day)),
+        get_end_datetime_from_date_string(str(day)),
+    )
+
+
+def refresh_doctor_leave(doctor_id, windows):
+    """
+    Rebuild the doctor's slots of the days the (start, end) leave windows touch within
+    the horizon, the leaves are read as they are in the database.
+    """
+    horizon_start, horizon_end = get_horizon()
+    for start, end in windows:
+        start_day, end_day = max(start.date(), horizon_start), min(end.date(), horizon_end)
+        if start_day <= end_day:
+            build_inventory(DoctorSetting.objects.filter(physician_id=doctor_id), start_day, end_day)
+
+
+def get_inventory_slots(doctor_id, clinic_id, start_day, end_day):
+    """
+    return {date: [slots]} for the range with a single range scan on the inventory.
+
+    Dates on holiday are not returned.
+    """
+    slots = DoctorSlot.objects.filter(
+        doctor_id=doctor_id,
+        clinic_id=clinic_id,
+        start_datetime__gte=get_start_datetime_from_date_string(str(start_day)),
+        start_datetime__lte=get_end_datetime_from_date_string(str(end_day)),
+    ).exclude(state=DoctorSlot.State.HOLIDAY).order_by('start_datetime')
+
+    days = {}
+    for start, end, state in slots.values_list('start_datetime', 'end_datetime', 'state'):
+        days.setdefault(start.date(), []).append({
+            "start": start,
+            "end": end,
+            "available": state == DoctorSlot.State.AVAILABLE,
+        })
+    return days
+
+
+def find_inconsistent_slots(doctor_ids=None):
+    """
+    Compare inventory states with live appointments and leaves within the horizon.
+
+    returns list of (slot, expected_state)
+    """
+    start_day, end_day = get_horizon()
+    slots = DoctorSlot.objects.filter(
+        start_datetime__gte=get_start_datetime_from_date_string(str(start_day)),
+        start_datetime__lte=get_end_datetime_from_date_string(str(end_day)),
+    ).exclude(state=DoctorSlot.State.HOLIDAY)
+    appointments = Appointment.objects.filter(
+        start_datetime__gte=get_start_datetime_from_date_string(str(start_day)),
+        end_datetime__lte=get_end_datetime_from_date_string(str(end_day)),
+    ).exclude(status=Appointment.Status.CANCEL)
+    leaves = get_leaves(doctor_ids or None, start_day, end_day)
+
+    if doctor_ids:
+        slots = slots.filter(doctor_id__in=doctor_ids)
+        appointments = appointments.filter(doctor_id__in=doctor_ids)
+
+    busy_by_doctor = {}
+    for doctor_id, start, end in appointments.values_list('doctor_id', 'start_datetime', 'end_datetime'):
+        busy_by_doctor.setdefault(doctor_id, []).append((start, end))
+    for doctor_id, start, end in leaves.values_list('physician_id', 'start_datetime', 'end_datetime'):
+        busy_by_doctor.setdefault(doctor_id, []).append((start, end))
+    busy_by_doctor = {doctor_id: build_busy_index(busy) for doctor_id, busy in busy_by_doctor.items()}
+
+    slots_by_doctor = {}
+    for slot in slots.order_by('doctor_id', 'start_datetime'):
+        slots_by_doctor.setdefault(slot.doctor_id, []).append(slot)
+
+    inconsistent = []
+    for doctor_id, doctor_slots in slots_by_doctor.items():
+        intervals = [{
+            "slot": slot,
+            "start": slot.start_datetime,
+            "end": slot.end_datetime,
+            "available": True,
+        } for slot in doctor_slots]
+        mark_slots(intervals, busy_by_doctor.get(doctor_id, []))
+
+        for interval in intervals:
+            expected = DoctorSlot.State.AVAILABLE if interval['available'] else DoctorSlot.State.BOOKED
+            if interval['slot'].state != expected:
+                inconsistent.append((interval['slot'], expected))
+    return inconsistent
+
+
+def on_appointment_changed(doctor_id, windows):
+    """
+    windows: (start, end) tuples the appointment occupied before and after the change.
+    """
+    if not SLOT_INVENTORY_ENABLED:
+        return
+    for start, end in windows:
+        refresh_doctor_slots(doctor_id, start, end)
+
+
+def on_setting_changed(setting):
+    if not SLOT_INVENTORY_ENABLED:
+        return
+    rebuild_setting_inventory(setting)
+
+
+def on_leave_changed(doctor_id, windows):
+    """
+    windows: (start, end) tuples the leave covered before and after the change.
+    """
+    if not SLOT_INVENTORY_ENABLED:
+        return
+    refresh_doctor_leave(doctor_id, windows)
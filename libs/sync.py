@@ -0,0 +1,114 @@
+"""
+Delta sync of a user's appointments, visits and notifications.
+
+Rows carry an indexed updated_at, deletions leave a Tombstone per user who could see
+the row, as do appointments moved away from their doctor or patient. A sync token is the
+time of the sync that issued it, the next sync returns the rows changed and the ids
+deleted after it:
+
+    GET /sync/              -> {"token": ...}, taken before loading the lists in full
+    GET /sync/?since=token  -> {"token": ..., "appointments": [...], "visits": [...],
+                                "notifications": [...], "deleted": {"appointments": [ids], ...}}
+
+Rows are saved before their transaction commits, so every sync looks SYNC_OVERLAP_SECONDS
+further back than its token and may return a row again. Tombstones are pruned after
+SYNC_TOMBSTONE_DAYS by the prune_tombstones command, older tokens get a 410 and the
+client should load the lists in full again.
+
+- SYNC_OVERLAP_SECONDS: How far before the token changes are looked for
+- SYNC_TOMBSTONE_DAYS: How long deletions are kept, the lifetime of a token
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from entities.appointment.models import Appointment, Visit, Tombstone
+from entities.notification.models import Notification
+from libs.custom_exceptions import InvalidInputDataException, SyncTokenExpiredException
+from libs.query_plan import optimize_queryset
+from quicklic_backend import settings
+
+SYNC_OVERLAP_SECONDS = getattr(settings, 'SYNC_OVERLAP_SECONDS', 30)
+SYNC_TOMBSTONE_DAYS = getattr(settings, 'SYNC_TOMBSTONE_DAYS', 30)
+
+KINDS = (
+    ('appointments', Tombstone.Kind.APPOINTMENT),
+    ('visits', Tombstone.Kind.VISIT),
+    ('notifications', Tombstone.Kind.NOTIFICATION),
+)
+
+
+def encode_token(moment):
+    return str(int(time.mktime(moment.timetuple()) * 1000 + moment.microsecond // 1000))
+
+
+def decode_token(token):
+    try:
+        moment = datetime.fromtimestamp(int(token) / 1000.0)
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise InvalidInputDataException("Invalid sync token: {}".format(token))
+    if moment < timezone.now() - timedelta(days=SYNC_TOMBSTONE_DAYS):
+        raise SyncTokenExpiredException()
+    return moment
+
+
+def record_deletion(kind, object_id, user_ids):
+    Tombstone.objects.bulk_create([
+        Tombstone(kind=kind, object_id=object_id, user_id=user_id) for user_id in set(user_ids) if user_id
+    ])
+
+
+def prune_tombstones():
+    """
+    Delete the tombstones no valid token can ask for anymore.
+    return: No. of deleted tombstones
+    """
+    limit = timezone.now() - timedelta(days=SYNC_TOMBSTONE_DAYS)
+    return Tombstone.objects.filter(deleted_at__lt=limit).delete()[0]
+
+
+def get_changed_querysets(user, since):
+    """
+    return {kind name: queryset} of the user's rows changed since the moment.
+    """
+    since = since - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+    owned = Q(doctor_id=user.id) | Q(patient_id=user.id)
+    return {
+        'appointments': Appointment.objects.filter(owned, updated_at__gte=since).order_by('id'),
+        'visits': Visit.objects.filter(owned, updated_at__gte=since).order_by('id'),
+        'notifications': Notification.objects.filter(user_id=user.id, updated_at__gte=since).order_by('id'),
+    }
+
+
+def get_deleted_ids(user, since):
+    """
+    return {kind name: ids} of the user's rows deleted since the moment.
+    """
+    since = since - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+    deleted = {name: [] for name, kind in KINDS}
+    names = {kind: name for name, kind in KINDS}
+    tombstones = Tombstone.objects.filter(user_id=user.id, deleted_at__gte=since).order_by('id').\
+        values_list('kind', 'object_id')
+    for kind, object_id in tombstones:
+        deleted[names[kind]].append(object_id)
+    return deleted
+
+
+def get_changes(user, token, serializer_classes, context):
+    """
+    return the sync payload of the user since the token, a token only without one.
+    serializer_classes: {kind name: serializer class}
+    """
+    now = timezone.now()
+    changes = {'token': encode_token(now)}
+    if not token:
+        return changes
+
+    since = decode_token(token)
+    for name, queryset in get_changed_querysets(user, since).items():
+        serializer_class = serializer_classes[name]
+        changes[name] = serializer_class(optimize_queryset(queryset, serializer_class), many=True, context=context).data
+    changes['deleted'] = get_deleted_ids(user, since)
+    return changes
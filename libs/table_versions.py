@@ -0,0 +1,91 @@
+"""
+Version counters of tables and rows for conditional GETs.
+
+A version is the millisecond timestamp of the last change, bumped by the receivers of
+the models, so ETags are made of a few cache reads instead of hashing the payload and
+the newest version doubles as Last-Modified once its second is over. Versions are bumped once the change is
+committed, so a request can't pair new versions with old rows. A counter missing from
+the cache starts from the current time, which can only turn a 304 into a 200.
+
+- TABLE_VERSIONS_ALIAS: Alias of the cache in CACHES to use, shared between processes
+"""
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+from quicklic_backend import settings
+
+TABLE_VERSIONS_ALIAS = getattr(settings, 'TABLE_VERSIONS_ALIAS', 'default')
+
+
+def _get_cache():
+    return caches[TABLE_VERSIONS_ALIAS]
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def table_key(model):
+    return "version:{}".format(model._meta.label_lower)
+
+
+def row_key(model, pk):
+    return "version:{}:{}".format(model._meta.label_lower, pk)
+
+
+def _bump(keys):
+    if keys:
+        transaction.on_commit(lambda: _set_versions(keys))
+
+
+def _set_versions(keys):
+    cache = _get_cache()
+    versions = cache.get_many(keys)
+    now = _now()
+    cache.set_many({key: max(now, versions.get(key, 0) + 1) for key in keys}, None)
+
+
+def bump_table(*models):
+    _bump([table_key(model) for model in models])
+
+
+def bump_rows(model, pks):
+    _bump([row_key(model, pk) for pk in pks])
+
+
+def get_versions(keys):
+    """
+    return versions of the keys in order.
+    """
+    cache = _get_cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = _now()
+        for key in missing:
+            cache.add(key, now, None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def get_last_modified(versions):
+    """
+    return Last-Modified of the versions in seconds, None until its second is over.
+
+    Last-Modified is rounded up to the second, within the second a later change would
+    still match If-Modified-Since.
+    """
+    last_modified = (max(versions) + 999) // 1000
+    return last_modified if last_modified <= time.time() else None
+
+
+def get_etag(request, versions):
+    """
+    return ETag of the request's representation at the versions.
+    """
+    basis = "{}|{}|{}".format(request.build_absolute_uri(), request.META.get('HTTP_ACCEPT', ''),
+                              ":".join(str(version) for version in versions))
+    return hashlib.md5(basis.encode('utf-8')).hexdigest()
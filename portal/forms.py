@@ -1,3 +1,5 @@
+from datetime import datetime, time, timedelta
+
 from django import forms
 
 from entities.person.models import User, DoctorHoliday
@@ -15,12 +17,34 @@ class ProfileForm(forms.ModelForm):
 
 
 class DoctorHolidayForm(forms.ModelForm):
+    """
+    Leave from day to end_day, the whole days unless start_time or end_time are given.
+    """
+    end_day = forms.DateField(required=False, input_formats=['%d-%m-%Y'])
+    start_time = forms.TimeField(required=False, input_formats=['%H:%M'])
+    end_time = forms.TimeField(required=False, input_formats=['%H:%M'])
 
     def __init__(self, *args, **kwargs):
         super(DoctorHolidayForm, self).__init__(*args, **kwargs)
         self.fields['notes'].required = False
         self.fields['day'].input_formats = ['%d-%m-%Y']
 
+    def clean(self):
+        cleaned_data = super(DoctorHolidayForm, self).clean()
+        day = cleaned_data.get('day')
+        if day:
+            start = datetime.combine(day, cleaned_data.get('start_time') or time.min)
+            end_day = cleaned_data.get('end_day') or day
+            if cleaned_data.get('end_time'):
+                end = datetime.combine(end_day, cleaned_data['end_time']) - timedelta(seconds=1)
+            else:
+                end = datetime.combine(end_day, time(23, 59, 59))
+            if end < start:
+                raise forms.ValidationError("Leave has to end after it starts")
+            self.instance.start_datetime = start
+            self.instance.end_datetime = end
+        return cleaned_data
+
     class Meta:
         model = DoctorHoliday
         fields = ['physician', 'day', 'notes']
@@ -4,6 +4,7 @@ from entities.appointment.models import Appointment
 from entities.clinic.models import Clinic
 from entities.notification.models import Notification
 from entities.person.models import Patient, Doctor
+from libs.clinic_membership import get_clinic_ids
 
 
 def _get_appointments_of_doctor_for_last_n_days(doctor, n=7):
@@ -15,8 +16,7 @@ def _get_appointments_of_doctor_for_last_n_days(doctor, n=7):
 
 
 def _get_appointments_of_admin_for_last_n_days(admin, n=7):
-    clinics = admin.clinic.all()
-    clinic_ids = clinics.values_list('id', flat=True).distinct()
+    clinic_ids = get_clinic_ids(admin.id)
     return Appointment.objects.filter(
         start_datetime__gte=datetime.now()-timedelta(days=n),
         end_datetime__lt=datetime.now(),
@@ -103,7 +103,7 @@ def get_key_factors_for_doctor(doctor):
 
     data = {
         "patient_seen": appointments.filter(status=Appointment.Status.DONE).count(),
-        "clinic_count": doctor.clinic.count(),
+        "clinic_count": len(get_clinic_ids(doctor.id)),
         "rating": doctor.rating,
         "dcr": (completed_appointments*100)/appointment_count if appointment_count > 0 else 0,
         "top_clinic_name": get_top_clinic_name_for_doctor(doctor, appointments),
@@ -112,7 +112,7 @@ def get_key_factors_for_doctor(doctor):
 
 
 def get_doctor_future_holidays(doctor):
-    return doctor.holidays.filter(day__gte=datetime.now().date(), day__lte=(datetime.now()+timedelta(days=14)).date()).order_by('day')
+    return doctor.holidays.filter(end_datetime__gte=datetime.now(), start_datetime__lte=datetime.now()+timedelta(days=14)).order_by('start_datetime')
 
 
 def get_top_clinic_name_for_doctor(doctor, appointments):
@@ -125,19 +125,19 @@ def get_top_clinic_name_for_doctor(doctor, appointments):
 
 
 def get_patients_for_doctor(doctor):
-    clinic_ids = doctor.clinic.all().values_list("id", flat=True)
+    clinic_ids = get_clinic_ids(doctor.id)
     patients = Patient.objects.filter(clinic__id__in=clinic_ids, is_active=True).distinct().order_by('first_name')
     return patients
 
 
 def get_patients_for_admin(admin):
-    clinic_ids = admin.clinic.all().values_list("id", flat=True)
+    clinic_ids = get_clinic_ids(admin.id)
     patients = Patient.objects.filter(clinic__id__in=clinic_ids, is_active=True).distinct().order_by('first_name')
     return patients
 
 
 def get_doctors_for_admin(admin):
-    clinic_ids = admin.clinic.all().values_list("id", flat=True)
+    clinic_ids = get_clinic_ids(admin.id)
     doctors = Doctor.objects.filter(clinic__id__in=clinic_ids, is_active=True).distinct().order_by('first_name')
     return doctors
 
@@ -146,12 +146,12 @@ def send_announcement_to_all_patients(person, message):
     """
     person can be doctor or admin
     """
-    clinic_ids = person.clinic.all().values_list("id", flat=True)
+    clinic_ids = get_clinic_ids(person.id)
     patients = Patient.objects.filter(clinic__id__in=clinic_ids, is_active=True).distinct()
     Notification.create_batch_announcement(patients, message)
 
 
 def send_announcement_to_all_doctors(admin, message):
-    clinic_ids = admin.clinic.all().values_list("id", flat=True)
+    clinic_ids = get_clinic_ids(admin.id)
     doctors = Doctor.objects.filter(clinic__id__in=clinic_ids, is_active=True).distinct()
     Notification.create_batch_announcement(doctors, message)
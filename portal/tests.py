@@ -0,0 +1,38 @@
+from django.test import TestCase
+
+from entities.appointment.models import Appointment
+from entities.person.models import Patient
+from entities.review.models import Review
+from libs.export import EXPORTS, get_export_queryset
+from libs.fixtures import ClinicFixtureMixin
+
+
+class ReviewExportTest(ClinicFixtureMixin, TestCase):
+    """
+    Review exports of clinics hold the reviews of their doctors, without the creators of
+    anonymous reviews.
+    """
+    def setUp(self):
+        super(ReviewExportTest, self).setUp()
+        self.create_appointments(1, Appointment.Status.DONE)
+        patient = Patient.objects.get()
+        self.doctor_review = Review.objects.create(creator=patient, doctor=self.doctor, rating=4,
+                                                   type=Review.Type.DOCTOR)
+        self.clinic_review = Review.objects.create(creator=patient, clinic=self.clinic, rating=5,
+                                                   type=Review.Type.CLINIC, is_anonymous=True)
+
+    def get_rows(self, **kwargs):
+        names = [column for column, lookup in EXPORTS['reviews'][3]]
+        return [dict(zip(names, row)) for row in get_export_queryset('reviews', **kwargs)]
+
+    def test_clinic_reviews(self):
+        rows = self.get_rows(clinic_ids=[self.clinic.id])
+        self.assertEqual([row['id'] for row in rows], [self.doctor_review.id, self.clinic_review.id])
+        self.assertEqual(rows[0]['creator_id'], self.doctor_review.creator_id)
+        self.assertIsNone(rows[1]['creator_id'])
+
+        self.assertEqual(self.get_rows(clinic_ids=[]), [])
+
+    def test_doctor_reviews(self):
+        rows = self.get_rows(clinic_ids=[self.clinic.id], doctor_id=self.doctor.id)
+        self.assertEqual([row['id'] for row in rows], [self.doctor_review.id])
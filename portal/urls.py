@@ -16,4 +16,5 @@ urlpatterns = [
     url(r'^patients$', views.PatientsView.as_view(), name='patients'),
     url(r'^doctors$', views.DoctorsView.as_view(), name='doctors'),
     url(r'^announcements$', views.AnnouncementsView.as_view(), name='announcements'),
+    url(r'^export/(?P<kind>appointments|visits|reviews)$', views.ExportView.as_view(), name='export'),
 ]
\ No newline at end of file
@@ -1,6 +1,7 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db import transaction
-from django.http.response import HttpResponseRedirect
+from django.http.response import HttpResponseRedirect, HttpResponseBadRequest, HttpResponseForbidden, \
+    StreamingHttpResponse
 from django.views.generic import TemplateView
 from django.core.urlresolvers import reverse
 from django.contrib.auth import login, logout, authenticate
@@ -11,6 +12,11 @@ from rest_framework.views import APIView
 
 from entities.clinic.models import Clinic
 from entities.person.models import Doctor
+from libs.clinic_membership import get_clinic_ids
+from libs.export import CSV, FORMATS, get_export_queryset, stream_export
+from libs.roles import get_principal
+from libs.utils import get_date_from_date_string
+from libs.schedule import DAYS, parse_breaks
 from portal import constants
 from portal.forms import LoginForm, ProfileForm, DoctorHolidayForm
 from portal.statistics_helper import get_doctor_appointment_stats, get_admin_appointment_stats, \
@@ -37,7 +43,7 @@ class LoginView(TemplateView):
                 password=form.cleaned_data["password"],
             )
             if user is not None:
-                if hasattr(user, 'moderator') or hasattr(user, 'doctor'):
+                if user.is_admin() or user.is_doctor():
                     if user.is_active:
                         login(request, user)
                     else:
@@ -74,12 +80,12 @@ class PortalHomeView(TemplateView):
         context = super(PortalHomeView, self).get_context_data(**kwargs)
         if self.request.user.is_doctor():
             context['type'] = User.Role.DOCTOR
-            context['user'] = self.request.user.doctor
-            context['stats'] = get_doctor_appointment_stats(self.request.user.doctor)
+            context['user'] = get_principal(self.request)
+            context['stats'] = get_doctor_appointment_stats(get_principal(self.request))
         elif self.request.user.is_admin():
             context['type'] = User.Role.ADMIN
-            context['user'] = self.request.user.moderator
-            context['stats'] = get_admin_appointment_stats(self.request.user.moderator)
+            context['user'] = get_principal(self.request)
+            context['stats'] = get_admin_appointment_stats(get_principal(self.request))
         return context
 
 
@@ -97,10 +103,10 @@ class ProfileView(TemplateView):
 
         if self.request.user.is_doctor():
             context['type'] = User.Role.DOCTOR
-            context['user'] = self.request.user.doctor
+            context['user'] = get_principal(self.request)
         elif self.request.user.is_admin():
             context['type'] = User.Role.ADMIN
-            context['user'] = self.request.user.moderator
+            context['user'] = get_principal(self.request)
         return context
 
 
@@ -118,10 +124,10 @@ class ClinicsView(TemplateView):
 
         if self.request.user.is_doctor():
             context['type'] = User.Role.DOCTOR
-            context['user'] = self.request.user.doctor
+            context['user'] = get_principal(self.request)
         elif self.request.user.is_admin():
             context['type'] = User.Role.ADMIN
-            context['user'] = self.request.user.moderator
+            context['user'] = get_principal(self.request)
 
         context['clinics'] = self.request.user.clinic.all()
         return context
@@ -148,15 +154,15 @@ class ClinicView(TemplateView):
 
         if self.request.user.is_doctor():
             context['type'] = User.Role.DOCTOR
-            context['user'] = self.request.user.doctor
+            context['user'] = get_principal(self.request)
 
-            clinic_setting = self.request.user.doctor.settings.filter(clinic=clinic).first()
+            clinic_setting = get_principal(self.request).settings.filter(clinic=clinic).first()
             if clinic_setting:
                 context['doctor_timings'] = clinic_setting.get_timings_with_switch()
 
         elif self.request.user.is_admin():
             context['type'] = User.Role.ADMIN
-            context['user'] = self.request.user.moderator
+            context['user'] = get_principal(self.request)
         context['clinic'] = clinic
 
         return context
@@ -167,78 +173,33 @@ class DoctorSettingView(APIView):
     @transaction.atomic
     def post(self, request, clinic_id):
         data = request.POST
-        setting = self.request.user.doctor.settings.filter(clinic_id=clinic_id).first()
+        setting = get_principal(self.request).settings.filter(clinic_id=clinic_id).first()
 
         if not setting:
             messages.error(request, constants.OPERATION_UNSUCCESSFUL)
         else:
-            previous_timings = setting.get_timings_with_switch()
+            previous_schedule = setting.schedule
 
-            if "monday_check" in data:
-                setting.monday_start = data['monday_start']
-                setting.monday_end = data['monday_end']
-            else:
-                setting.monday_start = "00:00"
-                setting.monday_end = "00:00"
-
-            if "tuesday_check" in data:
-                setting.tuesday_start = data['tuesday_start']
-                setting.tuesday_end = data['tuesday_end']
-            else:
-                setting.tuesday_start = "00:00"
-                setting.tuesday_end = "00:00"
-
-            if "wednesday_check" in data:
-                setting.wednesday_start = data['wednesday_start']
-                setting.wednesday_end = data['wednesday_end']
-            else:
-                setting.wednesday_start = "00:00"
-                setting.wednesday_end = "00:00"
-
-            if "thursday_check" in data:
-                setting.thursday_start = data['thursday_start']
-                setting.thursday_end = data['thursday_end']
-            else:
-                setting.thursday_start = "00:00"
-                setting.thursday_end = "00:00"
-
-            if "friday_check" in data:
-                setting.friday_start = data['friday_start']
-                setting.friday_end = data['friday_end']
-            else:
-                setting.friday_start = "00:00"
-                setting.friday_end = "00:00"
-
-            if "saturday_check" in data:
-                setting.saturday_start = data['saturday_start']
-                setting.saturday_end = data['saturday_end']
-            else:
-                setting.saturday_start = "00:00"
-                setting.saturday_end = "00:00"
+            for day in DAYS:
+                if "{}_check".format(day) in data:
+                    setattr(setting, "{}_start".format(day), data["{}_start".format(day)])
+                    setattr(setting, "{}_end".format(day), data["{}_end".format(day)])
+                else:
+                    setattr(setting, "{}_start".format(day), "00:00")
+                    setattr(setting, "{}_end".format(day), "00:00")
 
-            if "sunday_check" in data:
-                setting.sunday_start = data['sunday_start']
-                setting.sunday_end = data['sunday_end']
-            else:
-                setting.sunday_start = "00:00"
-                setting.sunday_end = "00:00"
+            if "breaks" in data:
+                try:
+                    parse_breaks(data['breaks'])
+                except ValueError:
+                    messages.error(request, constants.OPERATION_UNSUCCESSFUL)
+                    return HttpResponseRedirect(reverse('portal:profile'))
+                setting.breaks = data['breaks']
 
             setting.save()
 
-            if previous_timings['monday']['start'] != setting.monday_start or previous_timings['monday']['end'] != setting.monday_end:
-                self.request.user.doctor.cancel_appointment_due_to_time_changed(0)
-            elif previous_timings['tuesday']['start'] != setting.tuesday_start or previous_timings['tuesday']['end'] != setting.tuesday_end:
-                self.request.user.doctor.cancel_appointment_due_to_time_changed(1)
-            elif previous_timings['wednesday']['start'] != setting.wednesday_start or previous_timings['wednesday']['end'] != setting.wednesday_end:
-                self.request.user.doctor.cancel_appointment_due_to_time_changed(2)
-            elif previous_timings['thursday']['start'] != setting.thursday_start or previous_timings['thursday']['end'] != setting.thursday_end:
-                self.request.user.doctor.cancel_appointment_due_to_time_changed(3)
-            elif previous_timings['friday']['start'] != setting.friday_start or previous_timings['friday']['end'] != setting.friday_end:
-                self.request.user.doctor.cancel_appointment_due_to_time_changed(4)
-            elif previous_timings['saturday']['start'] != setting.saturday_start or previous_timings['saturday']['end'] != setting.saturday_end:
-                self.request.user.doctor.cancel_appointment_due_to_time_changed(5)
-            elif previous_timings['sunday']['start'] != setting.sunday_start or previous_timings['sunday']['end'] != setting.sunday_end:
-                self.request.user.doctor.cancel_appointment_due_to_time_changed(6)
+            for day_number in previous_schedule.diff(setting.schedule):
+                get_principal(self.request).cancel_appointment_due_to_time_changed(day_number)
 
         return HttpResponseRedirect(reverse('portal:profile'))
 
@@ -260,7 +221,7 @@ class DoctorKeyFactorsView(TemplateView):
             doctor = Doctor.objects.get(pk=self.kwargs['pk'])
             if self.request.user.is_admin():
                 context['type'] = User.Role.ADMIN
-                context['user'] = self.request.user.moderator
+                context['user'] = get_principal(self.request)
             else:
                 context['type'] = User.Role.DOCTOR
                 context['user'] = doctor
@@ -290,7 +251,7 @@ class DoctorStatsView(TemplateView):
             doctor = Doctor.objects.get(pk=self.kwargs['pk'])
             if self.request.user.is_admin():
                 context['type'] = User.Role.ADMIN
-                context['user'] = self.request.user.moderator
+                context['user'] = get_principal(self.request)
             else:
                 context['type'] = User.Role.DOCTOR
                 context['user'] = doctor
@@ -318,8 +279,8 @@ class DoctorOperationsView(TemplateView):
 
         if self.request.user.is_doctor():
             context['type'] = User.Role.DOCTOR
-            context['user'] = self.request.user.doctor
-            context['holidays'] = get_doctor_future_holidays(self.request.user.doctor)
+            context['user'] = get_principal(self.request)
+            context['holidays'] = get_doctor_future_holidays(get_principal(self.request))
         else:
             context['type'] = User.Role.ADMIN
 
@@ -328,14 +289,18 @@ class DoctorOperationsView(TemplateView):
     @transaction.atomic
     def post(self, request):
         data = {
-            'physician': self.request.user.doctor.id,
+            'physician': get_principal(self.request).id,
             'day': request.POST['day'],
+            'end_day': request.POST.get('end_day'),
+            'start_time': request.POST.get('start_time'),
+            'end_time': request.POST.get('end_time'),
+            'notes': request.POST.get('notes', ''),
         }
 
         form = DoctorHolidayForm(data)
         if form.is_valid():
             holiday = form.save()
-            request.user.doctor.cancel_appointment_on_holiday(holiday.day)
+            get_principal(request).cancel_appointments_on_leave(holiday)
         else:
             messages.error(request, constants.OPERATION_UNSUCCESSFUL)
         return HttpResponseRedirect(reverse('portal:doctor_operations'))
@@ -355,12 +320,12 @@ class PatientsView(TemplateView):
 
         if self.request.user.is_doctor():
             context['type'] = User.Role.DOCTOR
-            context['user'] = self.request.user.doctor
-            context['patients'] = get_patients_for_doctor(self.request.user.doctor)
+            context['user'] = get_principal(self.request)
+            context['patients'] = get_patients_for_doctor(get_principal(self.request))
         elif self.request.user.is_admin():
             context['type'] = User.Role.ADMIN
-            context['user'] = self.request.user.moderator
-            context['patients'] = get_patients_for_admin(self.request.user.moderator)
+            context['user'] = get_principal(self.request)
+            context['patients'] = get_patients_for_admin(get_principal(self.request))
 
         return context
 
@@ -379,11 +344,11 @@ class DoctorsView(TemplateView):
 
         if self.request.user.is_doctor():
             context['type'] = User.Role.DOCTOR
-            context['user'] = self.request.user.doctor
+            context['user'] = get_principal(self.request)
         elif self.request.user.is_admin():
             context['type'] = User.Role.ADMIN
-            context['user'] = self.request.user.moderator
-            context['doctors'] = get_doctors_for_admin(self.request.user.moderator)
+            context['user'] = get_principal(self.request)
+            context['doctors'] = get_doctors_for_admin(get_principal(self.request))
 
         return context
 
@@ -405,12 +370,12 @@ class AnnouncementsView(TemplateView):
 
         if self.request.user.is_doctor():
             context['type'] = User.Role.DOCTOR
-            context['user'] = self.request.user.doctor
-            context['patients'] = get_patients_for_doctor(self.request.user.doctor)
+            context['user'] = get_principal(self.request)
+            context['patients'] = get_patients_for_doctor(get_principal(self.request))
         elif self.request.user.is_admin():
             context['type'] = User.Role.ADMIN
-            context['user'] = self.request.user.moderator
-            context['patients'] = get_patients_for_admin(self.request.user.moderator)
+            context['user'] = get_principal(self.request)
+            context['patients'] = get_patients_for_admin(get_principal(self.request))
 
         return context
 
@@ -421,16 +386,63 @@ class AnnouncementsView(TemplateView):
             send_to = request.POST['send_to']
 
             if int(send_to) == AnnouncementsView.SEND_TO_ALL_PATIENTS:
-                send_announcement_to_all_patients(request.user.doctor, message)
+                send_announcement_to_all_patients(get_principal(request), message)
 
         elif request.user.is_admin():
             message = request.POST['message']
             send_to = request.POST['send_to']
 
             if int(send_to) == AnnouncementsView.SEND_TO_ALL_PATIENTS:
-                send_announcement_to_all_patients(request.user.moderator, message)
+                send_announcement_to_all_patients(get_principal(request), message)
             elif int(send_to) == AnnouncementsView.SEND_TO_ALL_DOCTORS:
-                send_announcement_to_all_doctors(request.user.moderator, message)
+                send_announcement_to_all_doctors(get_principal(request), message)
 
         return HttpResponseRedirect(reverse('portal:home'))
 
+
+class ExportView(View):
+    """
+    Stream the appointments, visits or reviews of the user's clinics as csv or jsonl.
+
+        GET /portal/export/{appointments|visits|reviews}
+
+        **filters**
+            clinic_id: Filter with clinic
+            doctor_id: Filter with doctor, admins only
+            start_date: time filter
+            end_date: time filter
+            format: csv (default) or jsonl
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated():
+            return HttpResponseRedirect(reverse('portal:login'))
+
+        return super(ExportView, self).dispatch(request, *args, **kwargs)
+
+    def get(self, request, kind):
+        if not (request.user.is_admin() or request.user.is_doctor()):
+            return HttpResponseForbidden()
+
+        export_format = request.GET.get('format', CSV)
+        if export_format not in FORMATS:
+            return HttpResponseBadRequest("Invalid format")
+
+        clinic_ids = sorted(get_clinic_ids(request.user.id))
+        if request.GET.get('clinic_id'):
+            clinic_ids = [clinic_id for clinic_id in clinic_ids if str(clinic_id) == request.GET['clinic_id']]
+        doctor_id = request.user.id if request.user.is_doctor() else request.GET.get('doctor_id')
+        if doctor_id and not str(doctor_id).isdigit():
+            return HttpResponseBadRequest("Invalid doctor")
+
+        try:
+            start_date = get_date_from_date_string(request.GET['start_date']) if request.GET.get('start_date') else None
+            end_date = get_date_from_date_string(request.GET['end_date']) if request.GET.get('end_date') else None
+        except ValueError:
+            return HttpResponseBadRequest("Invalid date")
+
+        queryset = get_export_queryset(kind, clinic_ids, doctor_id, start_date, end_date)
+        response = StreamingHttpResponse(stream_export(kind, queryset, export_format),
+                                         content_type=FORMATS[export_format])
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(kind, export_format)
+        return response
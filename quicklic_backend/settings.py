@@ -116,6 +116,15 @@ REST_FRAMEWORK = {
 }
 
 
+# Cache
+# Local memory is per process, use a shared backend (memcached) in production.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.11/topics/i18n/
 
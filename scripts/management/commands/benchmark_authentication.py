@@ -0,0 +1,52 @@
+import timeit
+
+from django.core.management import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+
+from entities.person.models import User
+from libs.authentication import UserAuthentication, principal_cache
+from libs.jwt_helper import JWTHelper
+
+
+def authenticate_twice_decoded(request):
+    """
+    The authentication before tokens were decoded once, for comparison.
+    """
+    token = request.META.get('HTTP_AUTHORIZATION').replace("Bearer ", "")
+    is_valid, message = JWTHelper.is_token_valid(token)
+    if is_valid:
+        phone = JWTHelper.decode_token(token)
+        return User.objects.get(phone=phone), None
+
+
+class Command(BaseCommand):
+    help = "Measure the authentication overhead of an API request."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--phone', help="Phone of the user to authenticate, the first user by default.")
+        parser.add_argument('--repeat', type=int, default=1000, help="No. of requests authenticated per path.")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(phone=options['phone']) if options['phone'] else User.objects.order_by('id')
+        user = users.first()
+        if user is None:
+            raise CommandError("No User")
+
+        token = JWTHelper.encode_token(user)
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION="Bearer {}".format(token))
+        authentication = UserAuthentication()
+
+        def authenticate_uncached():
+            principal_cache.clear()
+            return authentication.authenticate(request)
+
+        paths = (
+            ("decoded twice", lambda: authenticate_twice_decoded(request)),
+            ("decoded once", authenticate_uncached),
+            ("cached", lambda: authentication.authenticate(request)),
+        )
+        for name, authenticate in paths:
+            authenticate()
+            seconds = timeit.timeit(authenticate, number=options['repeat'])
+            self.stdout.write("{}: {:.1f} us per request".format(name, seconds * 1000000 / options['repeat']))
+        self.stdout.write("Task Successful")
@@ -0,0 +1,61 @@
+import time
+from datetime import datetime, timedelta
+
+import jwt
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from entities.notification.models import Notification
+from libs.authentication import principal_cache
+from libs.jwt_helper import JWTHelper
+
+
+def encode_phone_token(user):
+    """
+    Token as issued before the claims, with the phone only.
+    """
+    data = {
+        "exp": datetime.utcnow() + timedelta(days=JWTHelper.JWT_TOKEN_EXPIRY),
+        "phone": user.phone,
+    }
+    return str(jwt.encode(data, 'secret', algorithm=JWTHelper.JWT_ALGORITHM), JWTHelper.JWT_UTF)
+
+
+class Command(BaseCommand):
+    help = "Compare requests/sec of GET /api/v1/notification/ with phone tokens and with claims tokens."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="No. of requests per token kind.")
+
+    def handle(self, *args, **options):
+        notification = Notification.objects.select_related('user').order_by('-id').first()
+        if notification is None:
+            raise CommandError("No Notification")
+        user = notification.user
+
+        runs = (
+            # tokens not in the per-process cache yet, as on every other worker
+            ("phone token, uncached", encode_phone_token(user), True),
+            ("claims token, uncached", JWTHelper.encode_token(user), True),
+            ("phone token, cached", encode_phone_token(user), False),
+            ("claims token, cached", JWTHelper.encode_token(user), False),
+        )
+        for name, token, uncached in runs:
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION="Bearer {}".format(token))
+            principal_cache.clear()
+            if client.get('/api/v1/notification/').status_code != 200:
+                raise CommandError("{}: Request failed".format(name))
+
+            with CaptureQueriesContext(connection) as queries:
+                started = time.time()
+                for _ in range(options['requests']):
+                    if uncached:
+                        principal_cache.clear()
+                    client.get('/api/v1/notification/')
+                seconds = time.time() - started
+            self.stdout.write("{}: {:.0f} requests/sec, {:.1f} queries per request".format(
+                name, options['requests'] / seconds, len(queries) / float(options['requests'])))
+        self.stdout.write("Task Successful")
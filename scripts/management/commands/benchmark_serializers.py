@@ -0,0 +1,55 @@
+import timeit
+
+from django.core.management import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from api.v1.serializers import AppointmentSerializer, BasicDoctorSerializer, BasicPatientSerializer, \
+    NotificationSerializer
+from libs.fast_serializers import get_values_representation
+from libs.query_plan import optimize_queryset
+
+SHAPES = {
+    'doctor': (BasicDoctorSerializer, 'id'),
+    'patient': (BasicPatientSerializer, 'id'),
+    'appointment': (AppointmentSerializer, '-start_datetime'),
+    'notification': (NotificationSerializer, '-id'),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare serializing pages with the serializers and with the compiled serializers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shape', choices=sorted(SHAPES), action='append', dest='shapes',
+                            help="Only benchmark this shape, can be repeated.")
+        parser.add_argument('--rows', type=int, default=20, help="No. of rows in a page.")
+        parser.add_argument('--repeat', type=int, default=50, help="No. of pages serialized per path.")
+
+    def handle(self, *args, **options):
+        context = {'request': APIRequestFactory().get('/')}
+        for name in options['shapes'] or sorted(SHAPES):
+            serializer_class, ordering = SHAPES[name]
+            queryset = serializer_class.Meta.model.objects.order_by(ordering)
+            pks = list(queryset.values_list('pk', flat=True)[:options['rows']])
+            if not pks:
+                self.stdout.write("{}: No Rows".format(name))
+                continue
+            page = queryset.filter(pk__in=pks)
+
+            def serialize():
+                instances = optimize_queryset(page, serializer_class)
+                return serializer_class(instances, many=True, context=context).data
+
+            def serialize_values():
+                return get_values_representation(serializer_class, page, context)
+
+            if JSONRenderer().render(serialize()) != JSONRenderer().render(serialize_values()):
+                raise CommandError("{}: Compiled serializer output differs".format(name))
+
+            serializer_time = timeit.timeit(serialize, number=options['repeat'])
+            values_time = timeit.timeit(serialize_values, number=options['repeat'])
+            self.stdout.write("{}: {} rows, serializer {:.2f} ms, compiled {:.2f} ms per page, {:.1f}x".format(
+                name, len(pks), serializer_time * 1000 / options['repeat'], values_time * 1000 / options['repeat'],
+                serializer_time / values_time))
+        self.stdout.write("Task Successful")
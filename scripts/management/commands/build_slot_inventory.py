@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+
+from entities.person.models import DoctorSetting
+from libs.slot_inventory import build_inventory, get_horizon
+
+
+class Command(BaseCommand):
+    help = "(Re)build the doctor slot inventory for the rolling horizon."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, action='append', dest='doctor_ids',
+                            help="Only rebuild slots of this doctor, can be repeated.")
+        parser.add_argument('--days', type=int, default=None,
+                            help="No. of days starting today, defaults to SLOT_INVENTORY_HORIZON.")
+
+    def handle(self, *args, **options):
+        start_day, end_day = get_horizon()
+        if options['days']:
+            end_day = start_day + timedelta(days=options['days'] - 1)
+
+        settings = DoctorSetting.objects.filter(physician__is_active=True).order_by('id')
+        if options['doctor_ids']:
+            settings = settings.filter(physician_id__in=options['doctor_ids'])
+
+        self.stdout.write("Building Slots from {} to {}".format(start_day, end_day))
+        count = build_inventory(settings, start_day, end_day)
+        self.stdout.write("{} Slots Created".format(count))
+
+        self.stdout.write("Task Successful")
@@ -0,0 +1,31 @@
+from django.core.management import BaseCommand
+
+from libs.export import CSV, EXPORTS, FORMATS, get_export_queryset, stream_export
+from libs.utils import get_date_from_date_string
+
+
+class Command(BaseCommand):
+    help = "Stream appointments, visits or reviews as csv or jsonl."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default=CSV, dest='export_format')
+        parser.add_argument('--clinic', type=int, action='append', dest='clinic_ids',
+                            help="Only export rows of this clinic, can be repeated.")
+        parser.add_argument('--doctor', type=int, dest='doctor_id', help="Only export rows of this doctor.")
+        parser.add_argument('--start-date', type=get_date_from_date_string, dest='start_date', help="YYYY-MM-DD")
+        parser.add_argument('--end-date', type=get_date_from_date_string, dest='end_date', help="YYYY-MM-DD")
+        parser.add_argument('--output', help="File to write to, stdout by default.")
+
+    def handle(self, *args, **options):
+        queryset = get_export_queryset(options['kind'], options['clinic_ids'], options['doctor_id'],
+                                       options['start_date'], options['end_date'])
+        output = open(options['output'], 'w') if options['output'] else self.stdout
+        try:
+            for line in stream_export(options['kind'], queryset, options['export_format']):
+                output.write(line)
+        finally:
+            if options['output']:
+                output.close()
+        if options['output']:
+            self.stdout.write("Task Successful")
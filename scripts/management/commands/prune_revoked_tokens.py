@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from libs.revocation import prune_revoked_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete revoked tokens that expired."
+
+    def handle(self, *args, **options):
+        self.stdout.write("Pruning Revoked Tokens")
+        count = prune_revoked_tokens()
+        self.stdout.write("{} Revoked Tokens Deleted".format(count))
+        self.stdout.write("Task Successful")
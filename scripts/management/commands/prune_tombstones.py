@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from libs.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete sync tombstones older than SYNC_TOMBSTONE_DAYS."
+
+    def handle(self, *args, **options):
+        self.stdout.write("Pruning Tombstones")
+        count = prune_tombstones()
+        self.stdout.write("{} Tombstones Deleted".format(count))
+        self.stdout.write("Task Successful")
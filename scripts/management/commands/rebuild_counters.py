@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from libs.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild doctor and clinic activity counters from appointments and reviews."
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding Counters")
+        doctor_count, clinic_count = rebuild_counters()
+        self.stdout.write("{} Doctor and {} Clinic Counters Built".format(doctor_count, clinic_count))
+        self.stdout.write("Task Successful")
@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand
+
+from entities.appointment.models import DoctorSlot
+from libs.slot_inventory import find_inconsistent_slots
+
+
+class Command(BaseCommand):
+    help = "Validate doctor slot inventory against live appointments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, action='append', dest='doctor_ids',
+                            help="Only validate slots of this doctor, can be repeated.")
+        parser.add_argument('--fix', action='store_true', default=False,
+                            help="Update inconsistent slots to their expected state.")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Checking Slots")
+        inconsistent = find_inconsistent_slots(options['doctor_ids'])
+
+        for slot, expected_state in inconsistent:
+            self.stdout.write("Doctor {} Slot {}: State {} expected {}".format(
+                slot.doctor_id, slot.start_datetime, slot.state, expected_state))
+
+        if options['fix']:
+            for state in (DoctorSlot.State.AVAILABLE, DoctorSlot.State.BOOKED):
+                slot_ids = [slot.id for slot, expected_state in inconsistent if expected_state == state]
+                DoctorSlot.objects.filter(id__in=slot_ids).update(state=state)
+            self.stdout.write("{} Slots Fixed".format(len(inconsistent)))
+        else:
+            self.stdout.write("{} Inconsistent Slots".format(len(inconsistent)))
+
+        self.stdout.write("Task Successful")